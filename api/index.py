@@ -0,0 +1,7 @@
+"""Vercel函数入口，转交给项目根目录的serverless模块"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serverless import app
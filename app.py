@@ -1,36 +1,91 @@
-from flask import Flask, render_template, request, jsonify, make_response, redirect, url_for, session
-import crawler
+from flask import Flask, render_template, request, jsonify, make_response, redirect, url_for, session, Response, stream_with_context
 import db
+import upstream
+import kline_store
+import quote_stream
 import os
 import requests
 import logging
 import hashlib
+import json
 import time
 import random
-from pypinyin import lazy_pinyin, FIRST_LETTER
-from apscheduler.schedulers.background import BackgroundScheduler
 import datetime
+import threading
+from markupsafe import escape
 
 app = Flask(__name__)
 
 # 设置secret_key以支持session
 app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
 
+# K线上游请求失败时是否返回模拟数据（压测时设置KLINE_MOCK_FALLBACK=0，让上游错误直接暴露）
+KLINE_MOCK_FALLBACK = os.environ.get('KLINE_MOCK_FALLBACK', '1') != '0'
+
+def render_stock_page(keyword=None, **extra):
+    """渲染首页：只输出表格第一页（默认最新一天，有关键词时为搜索结果），之后的分页、排序和筛选由/api/stocks完成"""
+    import stock_index
+
+    date_str = None
+    try:
+        if not keyword:
+            date_str = stock_index.latest_date()
+        page = stock_index.query_stocks(date_str, keyword=keyword) if date_str or keyword else {'total': 0, 'data': []}
+        stocks, total = page['data'], page['total']
+    except Exception as e:
+        logging.error(f"查询股票索引失败，改为直接读取股票表: {e}")
+        stocks = db.search_stocks_by_keyword(keyword) if keyword else db.get_latest_day_data()
+        total = len(stocks)
+        stocks = stocks[:stock_index.DEFAULT_PAGE_SIZE]
+        date_str = stocks[0]['date'] if stocks and not keyword else None
+
+    table = {'date': date_str or '', 'keyword': keyword or '', 'total': total, 'page_size': stock_index.DEFAULT_PAGE_SIZE}
+    return render_template('index.html', stocks=stocks, search_mode=bool(keyword), table=table, **extra)
+
+# 首页（最新一天）渲染结果的缓存，按数据版本判断是否过期；数据版本最多每INDEX_VERSION_CHECK_SECONDS秒读取一次
+INDEX_VERSION_CHECK_SECONDS = 5
+_index_cache = {'version': None, 'checked': 0, 'html': None}
+_index_cache_lock = threading.Lock()
+
+# 首页模板中插入一次性提示的位置
+FLASH_MARKER = '<!-- flash-message -->'
+
+def get_index_html():
+    """获取缓存的首页HTML，数据版本变化后重新渲染一次"""
+    now = time.time()
+    if _index_cache['html'] is not None and now - _index_cache['checked'] < INDEX_VERSION_CHECK_SECONDS:
+        return _index_cache['html']
+    with _index_cache_lock:
+        version = db.get_data_version()
+        if version is None:
+            return render_stock_page()
+        if _index_cache['html'] is None or _index_cache['version'] != version:
+            _index_cache['html'] = render_stock_page()
+            _index_cache['version'] = version
+            logging.info(f"重新渲染首页，数据版本{version}")
+        _index_cache['checked'] = now
+        return _index_cache['html']
+
 @app.route('/')
 def index():
-    # 默认只显示最新一天的数据
-    latest_data = db.get_latest_day_data()
-    
-    # 从session中获取消息（如果有的话）
+    # 默认只显示最新一天的数据，页面主体读取缓存
+    # 从session中获取消息（如果有的话），在缓存的页面中插入提示
     message = session.pop('message', None)
-    
-    return render_template('index.html', stocks=latest_data, search_mode=False, message=message)
+    html = get_index_html()
+    if message:
+        html = html.replace(FLASH_MARKER, f'<div class="flash-message">{escape(message)}</div>', 1)
+    return html
 
 @app.route('/crawl', methods=['POST'])
 def crawl_data():
+    import crawler
+
     # 触发数据抓取，强制更新最新数据，绕过时间检查
     result = crawler.crawl_stock_data(crawl_today_only=True, force_update=True, bypass_time_check=True)
     
+    # 抓取后立即重新检查数据版本，不等待首页缓存的检查间隔
+    _index_cache['checked'] = 0
+    
     # 将抓取结果存储在session中
     if result['status'] == 'success':
         session['message'] = f"数据抓取完成！共处理{len(result['dates_processed'])}个日期，获取了{result['total_data']}条数据。"
@@ -65,6 +120,8 @@ def search_stocks():
         
         # 如果没有结果，再尝试拼音搜索作为补充
         if not stock_names:
+            from pypinyin import lazy_pinyin, FIRST_LETTER
+            
             all_stock_info = db.get_all_stock_names_and_codes()
             matched_results = []
             
@@ -112,36 +169,10 @@ def search_results():
     
     if not keyword:
         # 如果没有关键词，返回最新一天的数据
-        latest_data = db.get_latest_day_data()
-        return render_template('index.html', stocks=latest_data, search_mode=False)
-    
-    # 首先使用基本的关键词搜索
-    search_results = db.search_stocks_by_keyword(keyword)
+        return render_stock_page()
     
-    # 如果没有结果，再尝试拼音搜索作为补充
-    if not search_results:
-        all_stock_info = db.get_all_stock_names_and_codes()
-        matched_codes = set()
-        
-        for name, code in all_stock_info:
-            # 转换为拼音
-            pinyin = ''.join(lazy_pinyin(name))
-            # 转换为拼音首字母缩写
-            pinyin_abbr = ''.join(lazy_pinyin(name, style=FIRST_LETTER))
-            
-            # 检查是否匹配
-            if (keyword.lower() in pinyin.lower() or 
-                keyword.lower() in pinyin_abbr.lower()):
-                matched_codes.add(code)
-        
-        # 如果有匹配的代码，搜索这些代码的所有数据
-        if matched_codes:
-            search_results = []
-            for code in matched_codes:
-                # 搜索该代码的所有数据
-                code_results = db.search_stocks_by_keyword(code)
-                search_results.extend(code_results)
-    return render_template('index.html', stocks=search_results, search_mode=True, search_keyword=keyword)
+    # 名称、代码、解读或题材匹配关键词，没有结果时按名称拼音匹配
+    return render_stock_page(keyword, search_keyword=keyword)
 
 @app.route('/get-data-by-date')
 def get_data_by_date():
@@ -191,7 +222,7 @@ def get_realtime_stock_data():
     
     try:
         # 构建API请求URL
-        api_url = f'https://stock.xueqiu.com/v5/stock/realtime/quotec.json?symbol={symbols}'
+        api_url = f'{upstream.XUEQIU_QUOTE_API_URL}?symbol={symbols}'
         
         # 设置请求头，模拟浏览器请求
         headers = {
@@ -211,6 +242,20 @@ def get_realtime_stock_data():
     except requests.exceptions.RequestException as e:
         return jsonify({'error': f'请求失败: {str(e)}'}), 500
 
+@app.route('/api/quote-stream')
+def quote_stream_api():
+    """实时行情推送接口（Server-Sent Events）
+    同一组股票代码的所有订阅者共享一个服务端轮询线程，交易时间外不轮询上游
+    """
+    secids = [s for s in request.args.get('secids', '').split(',') if s]
+    if not secids:
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    response = Response(stream_with_context(quote_stream.stream_quotes(secids)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 禁止反向代理缓冲推送内容
+    return response
+
 @app.route('/filter-by-plate')
 def filter_by_plate():
     # 获取请求参数中的题材名称
@@ -232,33 +277,24 @@ def get_time_sharing_data():
     code = request.args.get('code', '').strip()
     if not code:
         return jsonify({'error': '缺少股票代码参数'}), 400
+    # format=columnar时返回服务端解码后的按列数组，否则返回东方财富原始响应
+    columnar = request.args.get('format') == 'columnar'
     
     try:
         # 根据股票代码生成secid参数
-        if code[0] == '6':
-            market = '1'  # 沪市
-        elif code[0] == '0' or code[0] == '3':
-            market = '0'  # 深市
-        else:
-            return jsonify({'error': f'不支持的股票代码前缀: {code[0]}'}), 400
-        
-        secid = f"{market}.{code}"
-        
-        # 构建API请求URL
-        api_url = f'https://push2.eastmoney.com/api/qt/stock/trends2/get?fields1=f1,f2,f8,f10&fields2=f51,f53,f56,f58&secid={secid}&ndays=1&iscr=0&iscca=0'
-        
-        # 设置请求头，模拟浏览器请求
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Referer': 'https://quote.eastmoney.com/'
-        }
-        
-        # 发送请求获取数据
-        response = requests.get(api_url, headers=headers)
-        response.raise_for_status()  # 抛出HTTP错误
+        try:
+            secid = upstream.get_secid(code)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 优先使用内存缓存，相同secid的并发请求只发送一次上游请求
+        result = upstream.fetch_time_sharing(secid, columnar=columnar)
+        if columnar:
+            if result is None:
+                return jsonify({'error': '分时数据为空'}), 404
+            result = {'data': result}
         
         # 返回获取到的数据并设置缓存头
-        result = response.json()
         api_response = make_response(jsonify(result))
         api_response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
         return api_response
@@ -267,6 +303,29 @@ def get_time_sharing_data():
     except Exception as e:
         return jsonify({'error': f'处理失败: {str(e)}'}), 500
 
+@app.route('/api/time-sharing-batch')
+def get_time_sharing_batch():
+    """批量获取多只股票的分时数据
+    已缓存的股票直接返回，缺失的以有限并发向上游请求，每只股票返回紧凑的按列数组
+    """
+    codes = [c.strip() for c in request.args.get('codes', '').split(',') if c.strip()]
+    if not codes:
+        return jsonify({'error': '缺少股票代码参数'}), 400
+    if len(codes) > 200:
+        return jsonify({'error': '单次最多请求200只股票'}), 400
+    
+    try:
+        # 去重并保持顺序
+        codes = list(dict.fromkeys(codes))
+        results = upstream.fetch_time_sharing_batch(codes)
+        
+        api_response = make_response(jsonify({'data': results}))
+        api_response.headers['Cache-Control'] = 'public, max-age=30'  # 缓存30秒
+        return api_response
+    except Exception as e:
+        logging.error(f"批量获取分时数据失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
 @app.route('/api/profit-ratio-data')
 def get_profit_ratio_data_api():
     """
@@ -306,6 +365,8 @@ def get_profit_ratio_data_api():
 
 def scheduled_crawl():
     """定时执行股票数据抓取"""
+    import crawler
+
     logging.info("定时任务开始执行: 抓取股票数据")
     # 强制更新今天的数据，不绕过时间检查（保持原有定时任务逻辑）
     crawler.crawl_stock_data(crawl_today_only=True, force_update=True)
@@ -316,15 +377,18 @@ def api_crawl_stock_data():
     """API端点：抓取股票数据
     用于Vercel Cron Jobs或其他外部服务调用
     """
+    import crawler
+
     logging.info("API请求开始执行: 抓取股票数据")
     result = crawler.crawl_stock_data(crawl_today_only=True, force_update=True, bypass_time_check=True)
     logging.info("API请求执行完成: 股票数据抓取已完成")
     return jsonify(result)
 
 # 初始化定时任务调度器（仅在本地开发环境使用）
-# Vercel环境下使用Cron Jobs替代
+# Vercel环境下使用Cron Jobs替代，Serverless入口（serverless.py）设置SERVERLESS=1，不导入调度器
 try:
-    if os.environ.get('VERCEL_ENV') is None:  # 仅在本地环境启动
+    if os.environ.get('VERCEL_ENV') is None and os.environ.get('SERVERLESS') != '1':  # 仅在本地环境启动
+        from apscheduler.schedulers.background import BackgroundScheduler
         scheduler = BackgroundScheduler(timezone='Asia/Shanghai')
         # 添加定时任务：周一到周五15:10执行
         scheduler.add_job(scheduled_crawl, 'cron', hour=15, minute=10, second=0, day_of_week='0-4')
@@ -358,7 +422,7 @@ def proxy_eastmoney_stock_data():
         }
         
         # 使用用户指定的API URL
-        api_url = f"https://push2.eastmoney.com/api/qt/ulist.np/get"
+        api_url = upstream.QUOTE_API_URL
         api_url += f"?fields=f2,f3,f6,f12,f14"  # 添加f6字段以获取成交额
         api_url += f"&fltt=2"
         api_url += f"&secids={secids}"
@@ -423,12 +487,14 @@ def proxy_eastmoney_kline_data():
         fqt = request.args.get('fqt', '1')    # 默认前复权
         lmt = request.args.get('lmt', '250')  # 默认250条数据
         end = request.args.get('end')         # 结束日期
+        # format=columnar时按列返回数值数组，客户端无需逐行解析K线字符串
+        columnar = request.args.get('format') == 'columnar'
         
         if not secid or not end:
             return jsonify({'error': '缺少必要参数'}), 400
             
         # 构建东方财富网API URL
-        api_url = f"https://push2his.eastmoney.com/api/qt/stock/kline/get?"
+        api_url = f"{upstream.KLINE_API_URL}?"
         api_url += f"secid={secid}&klt={klt}&fqt={fqt}&lmt={lmt}&end={end}"
         api_url += "&iscca=1&fields1=f1,f2,f3,f4,f5&fields2=f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61,f62"
         api_url += "&ut=f057cbcbce2a86e2866ab8877db1d059&forcect=1"
@@ -441,12 +507,18 @@ def proxy_eastmoney_kline_data():
             'X-Requested-With': 'XMLHttpRequest'
         }
         
-        # 发送请求到东方财富网API
-        response = requests.get(api_url, headers=headers, timeout=10)
-        response.raise_for_status()
+        def fetch_kline():
+            # 日K线从本地K线库读取，只增量请求最后存储日期之后的数据
+            if klt == '101':
+                return kline_store.get_kline_payload(secid, fqt=fqt, lmt=lmt, end=end, columnar=columnar)
+            # 发送请求到东方财富网API
+            response = requests.get(api_url, headers=headers, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            return kline_store.to_columnar_payload(data) if columnar and data.get('data') else data
         
-        # 获取返回的数据
-        data = response.json()
+        # 相同参数的并发请求只发送一次上游请求，共享同一个解析结果
+        data = upstream.kline_flight.do((secid, klt, fqt, lmt, end, columnar), fetch_kline)
         
         # 设置CORS响应头
         response_headers = {
@@ -459,27 +531,416 @@ def proxy_eastmoney_kline_data():
         return jsonify(data), 200, response_headers
         
     except requests.RequestException as e:
-        # API请求失败，返回模拟数据作为后备
         print(f"东方财富网K线API请求失败: {str(e)}")
+        if not KLINE_MOCK_FALLBACK:
+            return jsonify({'error': f'请求失败: {str(e)}'}), 502
+        # API请求失败，返回模拟数据作为后备
         mock_data = generate_mock_kline_data(secid)
+        if columnar:
+            mock_data = kline_store.to_columnar_payload(mock_data)
         return jsonify(mock_data), 200, {'Access-Control-Allow-Origin': '*'}
     except Exception as e:
         print(f"代理K线数据处理异常: {str(e)}")
         return jsonify({'error': '服务器内部错误'}), 500
 
+@app.route('/api/chip-profile')
+def get_chip_profile():
+    """
+    获取股票某一天或一段日期的筹码分布（量化为整数权重，按天差分编码）
+
+    参数：code（股票代码）、date（YYYYMMDD，单日，默认最新）或start/end（日期区间）、bins（降采样后的最大区间数）
+    """
+    import chip_cache
+
+    code = request.args.get('code', '').strip()
+    if not code:
+        return jsonify({'error': '缺少股票代码参数'}), 400
+    try:
+        secid = upstream.get_secid(code)
+        bins = int(request.args.get('bins', 0)) or None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    start = request.args.get('start', '').strip() or None
+    end = (request.args.get('end') or request.args.get('date') or '').strip() or None
+    try:
+        frames = chip_cache.get_profile_frames(secid, start, end, bins)
+    except Exception as e:
+        logging.error(f"获取{code}的筹码分布失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+    if not frames:
+        return jsonify({'error': '筹码分布数据为空'}), 404
+
+    response = make_response(jsonify({
+        'code': code,
+        'scale': chip_cache.PROFILE_SCALE,
+        'frames': frames
+    }))
+    response.headers['Cache-Control'] = 'public, max-age=300'  # 缓存5分钟
+    return response
+
+@app.route('/api/chip-batch')
+def get_chip_batch():
+    """
+    批量计算某一天涨停列表中全部股票的筹码指标（获利比例、平均成本、集中度）
+
+    参数：date（YYYYMMDD，默认最新一天）、sort（排序字段，默认profit_ratio）、order（desc或asc）、
+    resolution（精度档位，见chip_kernel.CHIP_RESOLUTIONS，默认standard）
+    """
+    import chip_batch
+    from chip_kernel import CHIP_RESOLUTIONS
+
+    date_str = request.args.get('date', '').strip()
+    sort_key = request.args.get('sort', 'profit_ratio')
+    descending = request.args.get('order', 'desc') != 'asc'
+    if sort_key not in chip_batch.METRIC_FIELDS + ('current_price',):
+        return jsonify({'error': f'不支持的排序字段: {sort_key}'}), 400
+    resolution = request.args.get('resolution', chip_batch.DEFAULT_RESOLUTION)
+    if resolution not in CHIP_RESOLUTIONS:
+        return jsonify({'error': f'不支持的精度档位: {resolution}'}), 400
+
+    try:
+        result = chip_batch.analyze_date(date_str or None, resolution)
+    except Exception as e:
+        logging.error(f"批量计算筹码指标失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    result['data'].sort(key=lambda item: item[sort_key], reverse=descending)
+    response = make_response(jsonify(result))
+    response.headers['Cache-Control'] = 'public, max-age=300'  # 缓存5分钟
+    return response
+
+@app.route('/api/chip-intraday')
+def get_chip_intraday():
+    """
+    获取盘中筹码指标：用当天分时数据的分钟成交更新前一交易日的筹码分布
+
+    参数：codes（逗号分隔的股票代码，默认最新一天涨停列表中的全部股票）
+    """
+    import chip_intraday
+
+    codes = [c.strip() for c in request.args.get('codes', '').split(',') if c.strip()]
+    names = {}
+    if not codes:
+        names = {stock['code']: stock['name'] for stock in db.get_latest_day_data()}
+        codes = list(names)
+    if len(codes) > 200:
+        return jsonify({'error': '单次最多请求200只股票'}), 400
+    codes = list(dict.fromkeys(codes))
+
+    data = []
+    errors = {}
+    for code, metrics in chip_intraday.tracker.refresh(codes).items():
+        if 'error' in metrics:
+            errors[code] = metrics['error']
+            continue
+        data.append({
+            'code': code,
+            'name': names.get(code),
+            'time': metrics['time'],
+            'current_price': round(float(metrics['current_price']), 2),
+            'profit_ratio': round(metrics['profit_ratio'] * 100, 2),
+            'avg_cost': round(metrics['avg_cost'], 2),
+            'turnover': round(metrics['turnover'] * 100, 2),
+            'concentration_90': round(metrics['concentration_90'], 2)
+        })
+
+    response = make_response(jsonify({'data': data, 'errors': errors}))
+    response.headers['Cache-Control'] = 'public, max-age=30'  # 缓存30秒，与分时数据缓存一致
+    return response
+
+@app.route('/api/plate-heat')
+def get_plate_heat():
+    """
+    获取题材每日统计（涨停数量、排名、占当天列表的比例、连续上榜天数），读取写入数据时汇总的结果
+
+    参数：plates（逗号分隔的题材名称，默认区间内排名进入前top名的题材）、date（YYYYMMDD，单日，默认最新一天）
+    或start/end（日期区间）、top（默认20，0表示全部题材）
+    """
+    import plate_stats
+
+    plates = [p.strip() for p in request.args.get('plates', '').split(',') if p.strip()]
+    start = request.args.get('start', '').replace('-', '').strip() or None
+    end = (request.args.get('end') or request.args.get('date') or '').replace('-', '').strip() or None
+    try:
+        top = int(request.args.get('top', plate_stats.DEFAULT_TOP))
+    except ValueError:
+        return jsonify({'error': 'top参数必须是整数'}), 400
+
+    try:
+        result = plate_stats.get_plate_heat(plates, start, end, top)
+    except Exception as e:
+        logging.error(f"获取题材统计失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify(result))
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/board-ladder')
+def get_board_ladder():
+    """
+    获取连板天梯：每天的股票按板数分组，以及每个题材板数最高的龙头
+
+    参数：date（YYYYMMDD，单日，默认最新一天）或start/end（日期区间）、min_boards（最低板数，默认1）、plate（只看某个题材）
+    """
+    import stock_index
+
+    date_str = request.args.get('date', '').replace('-', '').strip() or None
+    start = request.args.get('start', '').replace('-', '').strip() or None
+    end = request.args.get('end', '').replace('-', '').strip() or None
+    plate = request.args.get('plate', '').strip() or None
+    try:
+        min_boards = int(request.args.get('min_boards', 1))
+    except ValueError:
+        return jsonify({'error': 'min_boards参数必须是整数'}), 400
+
+    try:
+        ladders = stock_index.get_ladder(date_str, start, end, min_boards, plate)
+    except Exception as e:
+        logging.error(f"获取连板天梯失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify({'data': ladders}))
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/stocks')
+def query_stocks_api():
+    """
+    分页查询首页表格的股票数据，筛选、排序和分页都在服务端的股票索引上完成
+
+    参数：date（YYYYMMDD，单日）或start/end（日期区间），不指定时查询所有日期；plate（题材包含该文字）、
+    keyword（名称、代码、解读或题材包含该文字，没有结果时按拼音匹配）、min_boards（最低板数）、latest（1表示每只股票只保留最新一天）、
+    sort（default、plate_count、popularity、boards、date、change）、order（desc或asc）、page、page_size（最大200）、
+    plate_counts（1表示同时返回符合条件的全部行的题材统计）
+    """
+    import stock_index
+
+    args = request.args
+    try:
+        page = stock_index.query_stocks(
+            date_str=args.get('date', '').replace('-', '').strip() or None,
+            start=args.get('start', '').replace('-', '').strip() or None,
+            end=args.get('end', '').replace('-', '').strip() or None,
+            plate=args.get('plate', '').strip() or None,
+            keyword=args.get('keyword', '').strip() or None,
+            min_boards=int(args.get('min_boards') or 0),
+            latest_only=args.get('latest') == '1',
+            sort=args.get('sort', 'default'),
+            order=args.get('order', 'desc'),
+            page=int(args.get('page', 1)),
+            page_size=int(args.get('page_size', stock_index.DEFAULT_PAGE_SIZE)),
+            with_plate_counts=args.get('plate_counts') == '1'
+        )
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    except Exception as e:
+        logging.error(f"查询股票数据失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify(page))
+    # 按实时涨跌幅排序的结果随行情变化，不缓存
+    response.headers['Cache-Control'] = 'no-cache' if args.get('sort') == 'change' else 'public, max-age=60'
+    return response
+
+@app.route('/api/plate-related')
+def get_plate_related():
+    """
+    获取与某个题材共现最多的题材（同一只股票同时属于两个题材计一次共现），读取写入数据时增量维护的窗口计数
+
+    参数：plate（题材名称，必填）、days（窗口交易日数，默认20，5、20、60直接读取维护的计数）、top（默认10）
+    """
+    import plate_stats
+
+    plate = request.args.get('plate', '').strip()
+    if not plate:
+        return jsonify({'error': '缺少plate参数'}), 400
+    try:
+        days = int(request.args.get('days', plate_stats.DEFAULT_COOCCURRENCE_WINDOW))
+        top = int(request.args.get('top', plate_stats.DEFAULT_RELATED_TOP))
+    except ValueError:
+        return jsonify({'error': 'days和top参数必须是整数'}), 400
+
+    try:
+        result = plate_stats.get_related_plates(plate, days, top)
+    except Exception as e:
+        logging.error(f"获取相关题材失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify(result))
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/plate-clusters')
+def get_plate_clusters():
+    """
+    获取某一天共现最紧密的题材集群
+
+    参数：date（YYYYMMDD，默认最新一天）、min_count（两个题材至少共现的股票数，默认2）、top（默认10，0表示全部集群）
+    """
+    import plate_stats
+
+    date_str = request.args.get('date', '').replace('-', '').strip() or None
+    try:
+        min_count = int(request.args.get('min_count', plate_stats.DEFAULT_CLUSTER_MIN_COUNT))
+        top = int(request.args.get('top', plate_stats.DEFAULT_RELATED_TOP))
+    except ValueError:
+        return jsonify({'error': 'min_count和top参数必须是整数'}), 400
+
+    try:
+        result = plate_stats.get_plate_clusters(date_str, min_count, top)
+    except Exception as e:
+        logging.error(f"获取题材集群失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify(result))
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/appearances')
+def get_appearances():
+    """
+    按上榜位图统计股票的上榜情况
+
+    参数：mode（frequency：最近days天上榜至少min_count次；streak：连续上榜至少min_streak天；
+    new：当天上榜且之前days天未上榜；span：codes中每只股票的首次、最近上榜日期）、days、min_count、min_streak、
+    codes（逗号分隔的股票代码）、date（截止日期YYYYMMDD，默认最新一天）
+    """
+    import bitmap_index
+
+    mode = request.args.get('mode', 'frequency').strip()
+    codes = [c.strip() for c in request.args.get('codes', '').split(',') if c.strip()]
+    end = request.args.get('date', '').replace('-', '').strip() or None
+    try:
+        days = int(request.args['days']) if request.args.get('days') else None
+        min_count = int(request.args.get('min_count', 1))
+        min_streak = int(request.args.get('min_streak', 2))
+    except ValueError:
+        return jsonify({'error': 'days、min_count和min_streak参数必须是整数'}), 400
+
+    try:
+        result = bitmap_index.query_appearances(mode, days, min_count, min_streak, codes, end)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"统计上榜情况失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify(result))
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/plate-query')
+def plate_query():
+    """
+    按题材组合条件查询股票，例如q=机器人 AND NOT 华为&days=5
+
+    参数：q（查询表达式，支持AND/&、OR/|、NOT/!和括号，题材按名称包含匹配）、days（最近多少个交易日）
+    或start/end（日期区间，默认全部日期）、page、page_size
+    """
+    import bitmap_index
+
+    expression = request.args.get('q', '').strip()
+    if not expression:
+        return jsonify({'error': '缺少q参数'}), 400
+    start = request.args.get('start', '').replace('-', '').strip() or None
+    end = request.args.get('end', '').replace('-', '').strip() or None
+    try:
+        days = int(request.args['days']) if request.args.get('days') else None
+        page = int(request.args.get('page', 1))
+        page_size = int(request.args['page_size']) if request.args.get('page_size') else None
+    except ValueError:
+        return jsonify({'error': 'days、page和page_size参数必须是整数'}), 400
+
+    try:
+        result = bitmap_index.query_plates(expression, days, start, end, page, page_size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"题材组合查询失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify(result))
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/trending-plates')
+def get_trending_plates():
+    """
+    获取热门题材：按最近1、3、5、20个交易日日均涨停数量的加速度排序，读取写入数据时计算好的前K个题材
+
+    参数：top（默认和最大值50）
+    """
+    import plate_stats
+
+    try:
+        top = int(request.args.get('top', plate_stats.TREND_TOP_K))
+    except ValueError:
+        return jsonify({'error': 'top参数必须是整数'}), 400
+
+    try:
+        result = plate_stats.get_trending_plates(top)
+    except Exception as e:
+        logging.error(f"获取热门题材失败: {e}")
+        return jsonify({'error': f'处理失败: {str(e)}'}), 500
+
+    response = make_response(jsonify(result))
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/stocks-range')
+def get_stocks_range():
+    """
+    按日期区间查询股票，一次查询整个区间，按日期顺序以JSON数组流式返回
+
+    参数：start（YYYYMMDD，必填）、end（默认最新一天）、code（股票代码，可不带市场后缀）、plate（题材包含该文字）、
+    unique=1（每只股票只保留区间内最新的一行）、order（日期顺序desc或asc，默认desc）
+    """
+    import stock_index
+
+    start = request.args.get('start', '').replace('-', '').strip()
+    if not start:
+        return jsonify({'error': '缺少start参数'}), 400
+    end = request.args.get('end', '').replace('-', '').strip() or None
+    code = request.args.get('code', '').strip() or None
+    plate = request.args.get('plate', '').strip() or None
+    unique = request.args.get('unique') == '1'
+    order = request.args.get('order', 'desc').strip().lower()
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'order参数必须是asc或desc'}), 400
+
+    def generate():
+        yield '['
+        for i, stock in enumerate(stock_index.iter_range(start, end, code, plate, unique, order)):
+            yield (',' if i else '') + json.dumps(stock, ensure_ascii=False)
+        yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=60'  # 缓存1分钟
+    return response
+
+@app.route('/api/upstream-stats')
+def get_upstream_stats():
+    """获取上游请求合并统计信息"""
+    return jsonify({
+        'single_flight': upstream.get_single_flight_stats(),
+        'quote_stream': quote_stream.quote_hub.get_stats()
+    })
+
 def generate_mock_kline_data(secid):
     """生成模拟的K线图数据"""
     # 生成日期
     dates = []
     klines = []
-    today = datetime.now()
+    today = datetime.datetime.now()
     
     # 初始价格在100左右
     base_price = 100
     
     for i in range(250):
         # 生成日期字符串
-        date = today - timedelta(days=249-i)
+        date = today - datetime.timedelta(days=249-i)
         date_str = date.strftime('%Y%m%d')
         dates.append(date_str)
         
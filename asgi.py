@@ -0,0 +1,353 @@
+"""
+ASGI入口
+上游代理接口（实时行情、分时、K线）运行在asyncio事件循环上，使用异步HTTP客户端请求上游，
+大量慢速上游请求在少量线程上复用，不再占用Flask的工作线程；
+其余依赖数据库的路由仍交给Flask应用处理
+
+启动方式：uvicorn asgi:application
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+import upstream
+import kline_store
+from app import app, generate_mock_kline_data, KLINE_MOCK_FALLBACK
+
+# 上游请求超时时间（秒）
+UPSTREAM_TIMEOUT = 10
+
+# 异步HTTP客户端的最大连接数，超出的请求在事件循环内排队而不是占用线程
+UPSTREAM_MAX_CONNECTIONS = 200
+
+# 东方财富批量行情代理的重试次数和重试间隔（秒）
+QUOTE_MAX_RETRIES = 3
+QUOTE_RETRY_DELAY = 1
+
+# 其余路由交给Flask应用处理（在线程池中运行）
+flask_application = WsgiToAsgi(app)
+
+# 异步HTTP客户端，在事件循环启动后按需创建
+_client = None
+
+
+def get_client():
+    """获取共享的异步HTTP客户端（连接池在所有代理请求间复用）"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            # 等待连接池空闲连接不设超时，只限制单个上游请求的耗时
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT, pool=None),
+            limits=httpx.Limits(max_connections=UPSTREAM_MAX_CONNECTIONS)
+        )
+    return _client
+
+
+async def close_client():
+    """关闭异步HTTP客户端"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_json(url, params=None, headers=None):
+    """异步GET请求上游并解析JSON，HTTP错误时抛出httpx.HTTPError"""
+    response = await get_client().get(url, params=params, headers=headers)
+    response.raise_for_status()  # 抛出HTTP错误
+    return response.json()
+
+
+async def send_json(send, data, status=200, headers=None):
+    """发送JSON响应"""
+    body = json.dumps(data).encode('utf-8')
+    response_headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode())
+    ]
+    for name, value in (headers or {}).items():
+        response_headers.append((name.lower().encode(), value.encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def fetch_time_sharing(secid, columnar=False):
+    """异步获取分时数据，与同步接口共用内存缓存，相同secid的并发请求只请求一次上游并只解码一次"""
+    cached = upstream.get_cached_time_sharing(secid, columnar)
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        result = await fetch_json(upstream.TIME_SHARING_API_URL, upstream.time_sharing_params(secid), upstream.TIME_SHARING_HEADERS)
+        return upstream.cache_time_sharing(secid, result)
+
+    entry = await upstream.async_time_sharing_flight.do(secid, fetch)
+    return upstream.time_sharing_entry_data(entry, columnar)
+
+
+async def fetch_klines(params):
+    """异步请求东方财富日K线
+
+    Returns:
+        (klines字符串列表, 股票名称)
+    """
+    data = await fetch_json(kline_store.KLINE_API_URL, params, kline_store.HEADERS)
+    return kline_store.parse_kline_response(params['secid'], data)
+
+
+async def sync_klines(secid, fqt):
+    """异步增量同步本地日K线，与kline_store.sync_klines流程相同：
+    上游请求使用共享的异步HTTP客户端，只有SQLite读写放到线程中执行，相同secid的并发同步只执行一次
+    """
+    last_sync = await asyncio.to_thread(kline_store.get_last_sync, secid, fqt)
+    if kline_store.is_fresh(last_sync):
+        return
+
+    async def sync():
+        stored = await asyncio.to_thread(kline_store.load_stored, secid, fqt)
+        klines, name = await fetch_klines(kline_store.sync_params(secid, fqt, stored))
+        replace = kline_store.adjust_changed(secid, fqt, stored, klines)
+        if replace:
+            klines, name = await fetch_klines(kline_store.kline_params(secid, fqt))
+        await asyncio.to_thread(kline_store.save_sync, secid, fqt, klines, name, replace)
+
+    try:
+        await upstream.async_kline_flight.do(('sync', secid, fqt), sync)
+    except Exception as e:
+        if last_sync is None:
+            raise
+        logging.warning(f"同步{secid}的K线失败，使用本地已有数据: {e}")
+
+
+async def backfill_klines(secid, fqt, lmt, end):
+    """本地K线不足时异步向前补齐，失败时保留本地已有数据"""
+    params = await asyncio.to_thread(kline_store.backfill_params, secid, fqt, lmt, end)
+    if params is None:
+        return
+
+    async def backfill():
+        klines, _ = await fetch_klines(params)
+        await asyncio.to_thread(kline_store.save_backfill, secid, fqt, klines, params)
+
+    try:
+        await upstream.async_kline_flight.do(('backfill', secid, fqt, params['end'], params['lmt']), backfill)
+    except Exception as e:
+        logging.warning(f"向前补齐{secid}的K线失败，使用本地已有数据: {e}")
+
+
+async def get_kline_payload(secid, fqt, lmt, end, columnar=False):
+    """异步获取本地日K线（先增量同步，不足lmt条时向前补齐），以东方财富K线API的响应格式返回"""
+    lmt = int(lmt)
+    await sync_klines(secid, fqt)
+    await backfill_klines(secid, fqt, lmt, end)
+    result = await asyncio.to_thread(kline_store.read_klines, secid, fqt, lmt, end)
+    return kline_store.build_kline_payload(secid, result, columnar)
+
+
+async def realtime_stock_data(args, send):
+    """雪球实时行情代理，对应/api/realtime-stock-data"""
+    symbols = args.get('symbols', '')
+    if not symbols:
+        return await send_json(send, {'error': '缺少股票代码参数'}, 400)
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Referer': 'https://xueqiu.com/'
+    }
+    try:
+        result = await fetch_json(upstream.XUEQIU_QUOTE_API_URL, {'symbol': symbols}, headers)
+        await send_json(send, result, headers={'Cache-Control': 'public, max-age=60'})  # 缓存1分钟
+    except (httpx.HTTPError, ValueError) as e:
+        # ValueError：上游返回的不是JSON
+        await send_json(send, {'error': f'请求失败: {str(e)}'}, 500)
+
+
+async def time_sharing_data(args, send):
+    """分时数据代理，对应/api/time-sharing-data"""
+    code = args.get('code', '').strip()
+    if not code:
+        return await send_json(send, {'error': '缺少股票代码参数'}, 400)
+    columnar = args.get('format') == 'columnar'
+
+    try:
+        secid = upstream.get_secid(code)
+    except ValueError as e:
+        return await send_json(send, {'error': str(e)}, 400)
+
+    try:
+        result = await fetch_time_sharing(secid, columnar)
+        if columnar:
+            if result is None:
+                return await send_json(send, {'error': '分时数据为空'}, 404)
+            result = {'data': result}
+        await send_json(send, result, headers={'Cache-Control': 'public, max-age=60'})  # 缓存1分钟
+    except httpx.HTTPError as e:
+        await send_json(send, {'error': f'请求失败: {str(e)}'}, 500)
+    except Exception as e:
+        await send_json(send, {'error': f'处理失败: {str(e)}'}, 500)
+
+
+async def time_sharing_batch(args, send):
+    """批量分时数据代理，对应/api/time-sharing-batch"""
+    codes = [c.strip() for c in args.get('codes', '').split(',') if c.strip()]
+    if not codes:
+        return await send_json(send, {'error': '缺少股票代码参数'}, 400)
+    if len(codes) > 200:
+        return await send_json(send, {'error': '单次最多请求200只股票'}, 400)
+
+    # 去重并保持顺序
+    codes = list(dict.fromkeys(codes))
+    results = {}
+    semaphore = asyncio.Semaphore(upstream.TIME_SHARING_MAX_WORKERS)
+
+    async def fetch_one(code):
+        try:
+            secid = upstream.get_secid(code)
+        except ValueError as e:
+            results[code] = {'error': str(e)}
+            return
+        try:
+            async with semaphore:
+                compact = await fetch_time_sharing(secid, columnar=True)
+            results[code] = compact if compact else {'error': '分时数据为空'}
+        except Exception as e:
+            logging.warning(f"获取{code}的分时数据失败: {e}")
+            results[code] = {'error': f'请求失败: {str(e)}'}
+
+    await asyncio.gather(*(fetch_one(code) for code in codes))
+    await send_json(send, {'data': {code: results[code] for code in codes}},
+                    headers={'Cache-Control': 'public, max-age=30'})  # 缓存30秒
+
+
+async def eastmoney_stock_data(args, send):
+    """东方财富批量行情代理，对应/api/proxy-eastmoney-stock-data，重试等待不占用线程"""
+    secids = args.get('secids')
+    if not secids:
+        return await send_json(send, {'error': '缺少必要参数'}, 400)
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36',
+        'Referer': 'https://data.eastmoney.com/',
+        'Accept': 'application/json, text/javascript, */*; q=0.01'
+    }
+    params = {
+        'fields': 'f2,f3,f6,f12,f14',
+        'fltt': '2',
+        'secids': secids
+    }
+
+    for retry_count in range(QUOTE_MAX_RETRIES):
+        try:
+            response_data = await fetch_json(upstream.QUOTE_API_URL, params, headers)
+            if response_data and response_data.get('rc') == 0 and 'data' in response_data:
+                return await send_json(send, response_data, headers={
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                    'Access-Control-Max-Age': '30'
+                })
+            logging.warning(f"返回数据格式不正确或请求失败: {response_data}")
+        except (httpx.HTTPError, ValueError) as e:
+            logging.warning(f"请求失败 (尝试 {retry_count+1}/{QUOTE_MAX_RETRIES}): {str(e)}")
+        if retry_count < QUOTE_MAX_RETRIES - 1:
+            await asyncio.sleep(QUOTE_RETRY_DELAY)
+
+    await send_json(send, {'error': '获取数据失败，请稍后重试'}, 503)
+
+
+async def eastmoney_kline_data(args, send):
+    """东方财富K线代理，对应/api/proxy-eastmoney-kline-data"""
+    secid = args.get('secid')
+    klt = args.get('klt', '101')  # 默认日线
+    fqt = args.get('fqt', '1')    # 默认前复权
+    lmt = args.get('lmt', '250')  # 默认250条数据
+    end = args.get('end')         # 结束日期
+    columnar = args.get('format') == 'columnar'
+    if not secid or not end:
+        return await send_json(send, {'error': '缺少必要参数'}, 400)
+
+    params = {
+        'secid': secid,
+        'klt': klt,
+        'fqt': fqt,
+        'lmt': lmt,
+        'end': end,
+        'iscca': '1',
+        'fields1': 'f1,f2,f3,f4,f5',
+        'fields2': 'f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61,f62',
+        'ut': 'f057cbcbce2a86e2866ab8877db1d059',
+        'forcect': '1'
+    }
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
+        'Referer': 'https://data.eastmoney.com/',
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+        'X-Requested-With': 'XMLHttpRequest'
+    }
+
+    try:
+        if klt == '101':
+            # 日K线从本地K线库读取，增量同步的上游请求也在事件循环内完成
+            data = await get_kline_payload(secid, fqt, lmt, end, columnar)
+        else:
+            data = await upstream.async_kline_flight.do(
+                (secid, klt, fqt, lmt, end),
+                lambda: fetch_json(upstream.KLINE_API_URL, params, headers)
+            )
+            if columnar and data.get('data'):
+                data = kline_store.to_columnar_payload(data)
+        await send_json(send, data, headers={
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+            'Cache-Control': 'max-age=300'  # 5分钟缓存
+        })
+    except httpx.HTTPError as e:
+        logging.warning(f"东方财富网K线API请求失败: {str(e)}")
+        if not KLINE_MOCK_FALLBACK:
+            return await send_json(send, {'error': f'请求失败: {str(e)}'}, 502)
+        # API请求失败，返回模拟数据作为后备
+        mock_data = generate_mock_kline_data(secid)
+        if columnar:
+            mock_data = kline_store.to_columnar_payload(mock_data)
+        await send_json(send, mock_data, headers={'Access-Control-Allow-Origin': '*'})
+    except Exception as e:
+        logging.error(f"代理K线数据处理异常: {str(e)}")
+        await send_json(send, {'error': '服务器内部错误'}, 500)
+
+
+# 由异步网关处理的代理路由
+ASYNC_ROUTES = {
+    '/api/realtime-stock-data': realtime_stock_data,
+    '/api/time-sharing-data': time_sharing_data,
+    '/api/time-sharing-batch': time_sharing_batch,
+    '/api/proxy-eastmoney-stock-data': eastmoney_stock_data,
+    '/api/proxy-eastmoney-kline-data': eastmoney_kline_data,
+}
+
+
+async def lifespan(receive, send):
+    """处理ASGI生命周期事件，退出时关闭HTTP客户端"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI应用：代理路由在事件循环内异步处理，其余请求交给Flask"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ASYNC_ROUTES.get(scope.get('path'))
+    if scope['type'] == 'http' and handler and scope.get('method') == 'GET':
+        query = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+        args = {key: values[0] for key, values in query.items()}
+        return await handler(args, send)
+
+    await flask_application(scope, receive, send)
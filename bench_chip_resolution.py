@@ -0,0 +1,93 @@
+"""
+筹码分布自适应分辨率的耗时和误差报告
+对窄幅、普通、宽幅三种波动的模拟K线，比较不同(精度因子, 粗网格价格区间数)与同一精度因子的固定网格结果：
+获利比例误差为百分点，平均成本和90%成本区间边界误差为相对固定网格平均成本的百分比
+
+运行：python bench_chip_resolution.py
+"""
+import time
+import numpy as np
+import pandas as pd
+import chip_batch
+from chip_kernel import NumpyChipDistributionAnalyzer, CHIP_RESOLUTIONS
+
+# 模拟K线的日波动率
+REGIMES = {
+    '窄幅': 0.005,
+    '普通': 0.03,
+    '宽幅': 0.08
+}
+
+# 参与对比的(精度因子, 粗网格价格区间数)
+SETTINGS = [
+    (150, None), (150, 50),
+    (600, None), (600, 150), (600, 50),
+    (2000, None), (2000, 150), (2000, 50)
+]
+
+BARS = 250
+CALC_RANGE = 120
+
+
+def make_kdata(volatility, seed):
+    """生成模拟日K线"""
+    rng = np.random.default_rng(seed)
+    closes = 20 * np.exp(np.cumsum(rng.normal(0, volatility, BARS)))
+    opens = closes * (1 + rng.normal(0, volatility / 3, BARS))
+    highs = np.maximum(opens, closes) * (1 + np.abs(rng.normal(0, volatility / 3, BARS)))
+    lows = np.minimum(opens, closes) * (1 - np.abs(rng.normal(0, volatility / 3, BARS)))
+    return pd.DataFrame({
+        '开盘': opens, '收盘': closes, '最高': highs, '最低': lows,
+        '成交量': 1, '换手率': np.abs(rng.normal(5, 3, BARS))
+    })
+
+
+def timed(fn, indices):
+    """依次计算indices处的指标，返回(结果列表, 平均每次耗时毫秒)"""
+    start = time.perf_counter()
+    results = [fn(i) for i in indices]
+    return results, (time.perf_counter() - start) * 1000 / len(indices)
+
+
+def single_stock_report():
+    """单只股票逐日计算的耗时和误差"""
+    indices = range(BARS - CALC_RANGE, BARS)
+    print(f"{'波动':<4}{'精度因子':>8}{'粗网格':>8}{'固定网格ms':>12}{'自适应ms':>10}{'加速':>8}"
+          f"{'获利比例误差max/mean(pp)':>28}{'平均成本误差max(%)':>20}{'90%区间边界误差max/mean(%)':>30}")
+    for name, volatility in REGIMES.items():
+        analyzer_cache = {}
+        for factor, coarse_bins in SETTINGS:
+            if factor not in analyzer_cache:
+                analyzer = NumpyChipDistributionAnalyzer(make_kdata(volatility, 0), factor, CALC_RANGE)
+                analyzer_cache[factor] = (analyzer, *timed(analyzer.calculate_chip_distribution, indices))
+            analyzer, reference, fixed_ms = analyzer_cache[factor]
+            results, adaptive_ms = timed(lambda i: analyzer.calculate_metrics(i, coarse_bins), indices)
+
+            profit = np.array([abs(r['profit_ratio'] - a['profit_ratio']) * 100 for r, a in zip(reference, results)])
+            avg_cost = np.array([abs(r['avg_cost'] - a['avg_cost']) / r['avg_cost'] * 100 for r, a in zip(reference, results)])
+            bounds = np.array([
+                max(abs(x - y) for x, y in zip(r['cost_90_range'], a['cost_90_range'])) / r['avg_cost'] * 100
+                for r, a in zip(reference, results)
+            ])
+            print(f"{name:<4}{factor:>10}{str(coarse_bins):>10}{fixed_ms:>12.3f}{adaptive_ms:>12.3f}"
+                  f"{fixed_ms / adaptive_ms:>9.1f}x{profit.max():>16.3f}/{profit.mean():.3f}"
+                  f"{avg_cost.max():>22.4f}{bounds.max():>22.3f}/{bounds.mean():.3f}")
+
+
+def batch_report(stocks=120):
+    """横截面批量计算各精度档位的耗时"""
+    frames = [make_kdata(list(REGIMES.values())[i % len(REGIMES)], i) for i in range(stocks)]
+    matrix = [np.stack([f[col].to_numpy(float)[-CALC_RANGE:] for f in frames])
+              for col in ('开盘', '收盘', '最高', '最低', '换手率')]
+    matrix[4] = np.minimum(matrix[4] / 100, 1)
+    chip_batch.PROCESS_WORKERS = 1
+    for resolution, (factor, coarse_bins) in CHIP_RESOLUTIONS.items():
+        start = time.perf_counter()
+        chip_batch.compute_metrics(*matrix, resolution)
+        print(f"批量计算{stocks}只股票 {resolution}({factor}, {coarse_bins}): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    single_stock_report()
+    print()
+    batch_report()
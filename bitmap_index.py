@@ -0,0 +1,459 @@
+"""
+股票上榜位图索引
+按交易日顺序给每个有数据的日期编号，每只股票保存一个位图（第i位表示第i个交易日是否在涨停列表中），
+写入数据时只更新对应日期的位；"最近5天上榜3次""20天内首次上榜"等问题在全部股票的位图矩阵上一次计算，
+不再逐只股票扫描每一天的表；
+同时在内存中维护题材倒排位图：(日期, 股票)行按日期顺序编号，每个题材一个行位图，
+"机器人 AND NOT 华为"这类组合条件用位运算求值，日期区间是连续的一段行
+"""
+import bisect
+import re
+import sqlite3
+import logging
+import threading
+import numpy as np
+import db
+
+# 与股票数据共用数据库文件
+BITMAP_DB_PATH = db.DB_PATH
+
+# 上榜次数、首次上榜默认统计的交易日数
+DEFAULT_WINDOW = 5
+DEFAULT_NEW_WINDOW = 20
+
+# 支持的查询方式
+QUERY_MODES = ('frequency', 'streak', 'new', 'span')
+
+# 每个进程第一次查询时检查位图与已有日期是否一致，之后由写入数据时的钩子保持最新
+_sync_state = {'done': db.SNAPSHOT_MODE, 'lock': threading.Lock()}
+
+# 内存中的位图矩阵（每行一只股票，按位打包），位图版本变化时重新读取
+_cache = {'version': None, 'dates': [], 'codes': [], 'names': [], 'bits': None}
+_cache_lock = threading.Lock()
+
+# 内存中的题材倒排位图，同样按位图版本重新生成
+_plate_cache = {'version': None, 'index': None}
+_plate_lock = threading.Lock()
+
+# 题材查询表达式的词法：括号、引号中的题材、运算符和不含空白的题材
+TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|(&|\||!)|([^\s()&|!"]+))')
+OPERATORS = {'AND': '&', 'OR': '|', 'NOT': '!', '&': '&', '|': '|', '!': '!'}
+
+# 缓存的题材匹配结果数量上限
+MAX_CACHED_TERMS = 1000
+
+
+def _connect():
+    """连接数据库并确保位图表结构存在"""
+    conn = sqlite3.connect(BITMAP_DB_PATH, timeout=30)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS appearance_dates (
+        position INTEGER PRIMARY KEY,
+        date TEXT UNIQUE NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS appearance_bitmap (
+        code TEXT PRIMARY KEY,
+        name TEXT,
+        bits BLOB NOT NULL
+    )
+    ''')
+    # 每次更新位图时加1，各进程据此判断内存中的矩阵是否过期
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS bitmap_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO bitmap_version (id, version) VALUES (1, 0)")
+    return conn
+
+
+def _to_blob(bits):
+    """位图整数转换为小端字节串"""
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def _day_codes(stocks):
+    """一天的股票代码到名称的映射"""
+    return {stock['code']: stock.get('name') for stock in stocks}
+
+
+def _bump_version(conn):
+    conn.execute("UPDATE bitmap_version SET version = version + 1 WHERE id = 1")
+
+
+def _set_day(conn, position, date_str, codes):
+    """把第position个交易日的位设置为codes中的股票（已有日期重新写入时先清除原来的位）"""
+    conn.execute("INSERT OR IGNORE INTO appearance_dates (position, date) VALUES (?, ?)", (position, date_str))
+    is_latest = conn.execute("SELECT MAX(position) FROM appearance_dates").fetchone()[0] == position
+    mask = 1 << position
+    updates, removed, seen = [], [], set()
+    for code, blob in conn.execute("SELECT code, bits FROM appearance_bitmap").fetchall():
+        seen.add(code)
+        bits = int.from_bytes(blob, 'little')
+        new = bits | mask if code in codes else bits & ~mask
+        if new == 0:
+            removed.append((code,))
+        elif new != bits:
+            updates.append((_to_blob(new), code))
+    conn.executemany("UPDATE appearance_bitmap SET bits=? WHERE code=?", updates)
+    conn.executemany("DELETE FROM appearance_bitmap WHERE code=?", removed)
+    conn.executemany("INSERT INTO appearance_bitmap (code, name, bits) VALUES (?, ?, ?)",
+                     [(code, name, _to_blob(mask)) for code, name in codes.items() if code not in seen])
+    if is_latest:
+        # 名称以最新一天为准
+        conn.executemany("UPDATE appearance_bitmap SET name=? WHERE code=?",
+                         [(name, code) for code, name in codes.items() if name])
+
+
+def _rebuild(days):
+    """按交易日顺序重新编号并生成全部位图，days为[(日期, 股票代码到名称的映射)]"""
+    bitmaps, names = {}, {}
+    for position, (_, codes) in enumerate(days):
+        for code, name in codes.items():
+            bitmaps[code] = bitmaps.get(code, 0) | (1 << position)
+            if name:
+                names[code] = name
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM appearance_dates")
+        conn.execute("DELETE FROM appearance_bitmap")
+        conn.executemany("INSERT INTO appearance_dates (position, date) VALUES (?, ?)",
+                         [(position, date) for position, (date, _) in enumerate(days)])
+        conn.executemany("INSERT INTO appearance_bitmap (code, name, bits) VALUES (?, ?, ?)",
+                         [(code, names.get(code), _to_blob(bits)) for code, bits in bitmaps.items()])
+        _bump_version(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    logging.info(f"重新生成{len(days)}个交易日、{len(bitmaps)}只股票的上榜位图")
+
+
+def _rebuild_from_db():
+    """从每天的股票表读取全部日期后重新生成位图"""
+    days = [(date, _day_codes(db.get_stock_data_by_date(date))) for date in sorted(db.get_available_dates())]
+    _rebuild([(date, codes) for date, codes in days if codes])
+
+
+def refresh_date(date_str):
+    """
+    更新某一天（YYYYMMDD）的上榜位图
+
+    已有日期或新的最新一天只修改这一天对应的位；补写较早的日期或某一天的数据被清空时交易日编号会变化，重新生成全部位图
+    """
+    codes = _day_codes(db.get_stock_data_by_date(date_str))
+    conn = _connect()
+    try:
+        dates = [row[0] for row in conn.execute("SELECT date FROM appearance_dates ORDER BY position")]
+        if codes and (date_str in dates or not dates or date_str > dates[-1]):
+            position = dates.index(date_str) if date_str in dates else len(dates)
+            _set_day(conn, position, date_str, codes)
+            _bump_version(conn)
+            conn.commit()
+            logging.info(f"成功更新{date_str}的{len(codes)}只股票的上榜位图")
+            return
+    finally:
+        conn.close()
+    if codes or date_str in dates:
+        _rebuild_from_db()
+
+
+def sync():
+    """位图中的日期与库中有数据的日期不一致时重新生成，每个进程只执行一次"""
+    with _sync_state['lock']:
+        if _sync_state['done']:
+            return
+        conn = _connect()
+        try:
+            indexed = [row[0] for row in conn.execute("SELECT date FROM appearance_dates ORDER BY position")]
+        finally:
+            conn.close()
+        if indexed != sorted(db.get_available_dates()):
+            _rebuild_from_db()
+        _sync_state['done'] = True
+
+
+def load_bitmaps():
+    """
+    获取内存中的位图矩阵，位图版本变化时重新读取
+
+    Returns:
+        dict: dates为按交易日顺序排列的日期，codes、names为每行对应的股票，
+              bits为按位打包（bitorder='little'）的(股票数, 字节数)uint8矩阵
+    """
+    sync()
+    conn = _connect()
+    try:
+        version = conn.execute("SELECT version FROM bitmap_version").fetchone()[0]
+        with _cache_lock:
+            if _cache['version'] != version:
+                dates = [row[0] for row in conn.execute("SELECT date FROM appearance_dates ORDER BY position")]
+                rows = conn.execute("SELECT code, name, bits FROM appearance_bitmap ORDER BY code").fetchall()
+                bits = np.zeros((len(rows), (len(dates) + 7) // 8), dtype=np.uint8)
+                for i, (_, _, blob) in enumerate(rows):
+                    bits[i, :len(blob)] = np.frombuffer(blob, dtype=np.uint8)
+                _cache.update(version=version, dates=dates, codes=[row[0] for row in rows],
+                              names=[row[1] for row in rows], bits=bits)
+            return dict(_cache)
+    finally:
+        conn.close()
+
+
+def _unpack(bits, start, stop):
+    """解出第start到stop-1个交易日的位，返回(股票数, stop-start)的布尔矩阵"""
+    first = start // 8
+    chunk = np.unpackbits(bits[:, first:(stop + 7) // 8], axis=1, bitorder='little')
+    return chunk[:, start - first * 8:stop - first * 8].astype(bool)
+
+
+def query_appearances(mode='frequency', days=None, min_count=1, min_streak=2, codes=None, end=None):
+    """
+    在全部股票的位图上统计上榜情况
+
+    Args:
+        mode: frequency（最近days个交易日上榜至少min_count次）、streak（截至end连续上榜至少min_streak天）、
+              new（end当天上榜且之前days个交易日未上榜）、span（codes中每只股票的首次、最近上榜日期）
+        days: 统计的交易日数，frequency默认5，new默认20
+        end: 截止日期（YYYYMMDD），默认最新一天，不是交易日时使用之前最近的交易日
+
+    Returns:
+        dict: end、start（统计区间的第一天）、days和data，data中每只股票包含code、name、count（区间内上榜次数）、
+              streak（截至end的连续上榜天数）、total（截至end的上榜总次数）、first_date和last_date，
+              按count、streak降序排列
+    """
+    if mode not in QUERY_MODES:
+        raise ValueError(f"不支持的查询方式: {mode}")
+    if days is None:
+        days = DEFAULT_NEW_WINDOW if mode == 'new' else DEFAULT_WINDOW
+    days = max(1, days)
+
+    bitmaps = load_bitmaps()
+    dates = bitmaps['dates']
+    stop = bisect.bisect_right(dates, end) if end else len(dates)
+    if stop == 0 or not bitmaps['codes']:
+        return {'end': None, 'start': None, 'days': days, 'data': []}
+
+    matrix = _unpack(bitmaps['bits'], 0, stop)
+    start = max(0, stop - days)
+    counts = matrix[:, start:].sum(axis=1)
+    totals = matrix.sum(axis=1)
+    reverse = matrix[:, ::-1]
+    streaks = np.where(reverse.all(axis=1), stop, reverse.argmin(axis=1))
+    firsts = matrix.argmax(axis=1)
+    lasts = stop - 1 - reverse.argmax(axis=1)
+
+    if mode == 'frequency':
+        selected = counts >= max(1, min_count)
+    elif mode == 'streak':
+        selected = streaks >= max(1, min_streak)
+    elif mode == 'new':
+        # 窗口取end当天和之前days个交易日
+        start = max(0, stop - 1 - days)
+        selected = matrix[:, -1] & ~matrix[:, start:stop - 1].any(axis=1)
+        counts = matrix[:, start:].sum(axis=1)
+    else:
+        wanted = set(codes or [])
+        selected = np.array([code in wanted for code in bitmaps['codes']], dtype=bool) & (totals > 0)
+
+    data = [{
+        'code': bitmaps['codes'][i],
+        'name': bitmaps['names'][i],
+        'count': int(counts[i]),
+        'streak': int(streaks[i]),
+        'total': int(totals[i]),
+        'first_date': dates[firsts[i]],
+        'last_date': dates[lasts[i]]
+    } for i in np.flatnonzero(selected)]
+    data.sort(key=lambda item: (-item['count'], -item['streak'], item['code']))
+    return {'end': dates[stop - 1], 'start': dates[start], 'days': days, 'data': data}
+
+
+def load_plate_index():
+    """
+    获取内存中的题材倒排位图，位图版本变化时从股票索引重新生成
+
+    Returns:
+        dict: rows为按(日期, 股票代码)排列的(date, code, plate_count, popularity)，
+              dates为日期列表，offsets[i]为第i个日期的第一行，plates为题材到行位图（整数）的映射
+    """
+    import stock_index
+    stock_index.sync()
+    version = load_bitmaps()['version']
+    with _plate_lock:
+        if _plate_cache['version'] == version:
+            return _plate_cache['index']
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT date, code, plate_count, popularity FROM daily_stocks ORDER BY date, code").fetchall()
+            plate_rows = conn.execute("SELECT date, code, plate FROM daily_stock_plates").fetchall()
+        finally:
+            conn.close()
+
+        positions = {(date, code): i for i, (date, code, _, _) in enumerate(rows)}
+        members = {}
+        for date, code, plate in plate_rows:
+            position = positions.get((date, code))
+            if position is not None:
+                members.setdefault(plate, []).append(position)
+        plates = {}
+        for plate, items in members.items():
+            flags = np.zeros(len(rows), dtype=bool)
+            flags[items] = True
+            plates[plate] = int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+        dates, offsets = [], []
+        for i, (date, _, _, _) in enumerate(rows):
+            if not dates or dates[-1] != date:
+                dates.append(date)
+                offsets.append(i)
+        # 整体替换，正在查询的请求继续使用旧的索引
+        index = {'rows': rows, 'dates': dates, 'offsets': offsets, 'plates': plates, 'terms': {}}
+        _plate_cache.update(version=version, index=index)
+        return index
+
+
+def _term_bits(index, term):
+    """题材名称包含term的所有题材的行位图之并"""
+    bits = index['terms'].get(term)
+    if bits is None:
+        bits = 0
+        for plate, plate_bits in index['plates'].items():
+            if term in plate:
+                bits |= plate_bits
+        if len(index['terms']) >= MAX_CACHED_TERMS:
+            index['terms'].clear()
+        index['terms'][term] = bits
+    return bits
+
+
+def parse_plate_query(expression):
+    """
+    解析题材查询表达式为语法树
+
+    支持AND（&）、OR（|）、NOT（!）和括号，相邻的题材之间默认为AND，运算优先级NOT > AND > OR；
+    题材按名称包含匹配，含空格或运算符的题材用双引号括起来，例如：机器人 AND NOT 华为、(黄金 | 白银) !"AI 医疗"
+
+    Returns:
+        ('term', 题材)、('not', 子树)、('and', 左, 右)或('or', 左, 右)
+    """
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match or match.end() == position:
+            raise ValueError(f"无法解析查询表达式: {expression[position:]}")
+        position = match.end()
+        left, right, quoted, symbol, word = match.groups()
+        if left or right:
+            tokens.append(left or right)
+        elif symbol or (word and word.upper() in OPERATORS):
+            tokens.append(OPERATORS[(symbol or word).upper()])
+        elif quoted is not None or word:
+            tokens.append(('term', (quoted if quoted is not None else word).strip()))
+    if not tokens:
+        raise ValueError('查询表达式为空')
+
+    def parse_or(i):
+        node, i = parse_and(i)
+        while i < len(tokens) and tokens[i] == '|':
+            right, i = parse_and(i + 1)
+            node = ('or', node, right)
+        return node, i
+
+    def parse_and(i):
+        node, i = parse_not(i)
+        while i < len(tokens) and tokens[i] not in ('|', ')'):
+            if tokens[i] == '&':
+                i += 1
+            right, i = parse_not(i)
+            node = ('and', node, right)
+        return node, i
+
+    def parse_not(i):
+        if i >= len(tokens):
+            raise ValueError('查询表达式不完整')
+        token = tokens[i]
+        if token == '!':
+            node, i = parse_not(i + 1)
+            return ('not', node), i
+        if token == '(':
+            node, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i] != ')':
+                raise ValueError('查询表达式缺少右括号')
+            return node, i + 1
+        if isinstance(token, tuple) and token[1]:
+            return token, i + 1
+        raise ValueError(f"查询表达式中的位置{i + 1}不能是{token}")
+
+    tree, i = parse_or(0)
+    if i != len(tokens):
+        raise ValueError('查询表达式缺少左括号')
+    return tree
+
+
+def _evaluate(index, node, universe):
+    """在行位图上求值语法树，universe为全部行的位图"""
+    kind = node[0]
+    if kind == 'term':
+        return _term_bits(index, node[1])
+    if kind == 'not':
+        return universe ^ _evaluate(index, node[1], universe)
+    left = _evaluate(index, node[1], universe)
+    right = _evaluate(index, node[2], universe)
+    return left & right if kind == 'and' else left | right
+
+
+def query_plates(expression, days=None, start=None, end=None, page=1, page_size=None):
+    """
+    按题材组合条件查询股票
+
+    Args:
+        expression: 查询表达式，见parse_plate_query
+        days: 最近多少个交易日（截至end），与start同时指定时使用days
+        start、end: 日期区间（YYYYMMDD），都不指定时查询全部日期
+        page、page_size: 分页参数，page_size默认和最大值与股票表格查询相同
+
+    Returns:
+        dict: expression、start、end、total、page、page_size和data（与股票表格查询相同格式的股票数据），
+              按sort_stocks_by_plates的顺序排列（题材数量、题材热度降序，同序时日期较新的在前）
+    """
+    import stock_index
+
+    tree = parse_plate_query(expression)
+    page_size = max(1, min(page_size or stock_index.DEFAULT_PAGE_SIZE, stock_index.MAX_PAGE_SIZE))
+    page = max(1, page)
+
+    index = load_plate_index()
+    rows, dates, offsets = index['rows'], index['dates'], index['offsets']
+    stop = bisect.bisect_right(dates, end) if end else len(dates)
+    if days:
+        first = max(0, stop - days)
+    else:
+        first = bisect.bisect_left(dates, start) if start else 0
+    empty = {'expression': expression, 'start': None, 'end': None, 'total': 0,
+             'page': page, 'page_size': page_size, 'data': []}
+    if first >= stop:
+        return empty
+
+    low = offsets[first]
+    high = offsets[stop] if stop < len(offsets) else len(rows)
+    window = ((1 << high) - 1) ^ ((1 << low) - 1)
+    bits = _evaluate(index, tree, (1 << len(rows)) - 1) & window
+    flags = np.unpackbits(np.frombuffer(bits.to_bytes((len(rows) + 7) // 8, 'little'), dtype=np.uint8),
+                          bitorder='little')
+    matched = [rows[i] for i in np.flatnonzero(flags[:len(rows)])]
+
+    # 与stock_index.SORT_KEYS['default']相同，即sort_stocks_by_plates的顺序
+    matched.sort(key=lambda row: (-row[2], -row[3], -int(row[0]), row[1]))
+    selected = matched[(page - 1) * page_size:page * page_size]
+
+    conn = _connect()
+    try:
+        data = stock_index.load_stocks(conn, [(date, code) for date, code, _, _ in selected])
+    finally:
+        conn.close()
+    return dict(empty, start=dates[first], end=dates[stop - 1], total=len(matched), data=data)
@@ -0,0 +1,233 @@
+"""
+筹码分析黄金结果回归检查
+golden/chip_golden.json保存了日K线和参考实现（chip_analytics.ChipDistributionAnalyzer）在这些K线上的计算结果：
+- 参考实现必须与黄金结果逐位一致
+- 优化实现（NumPy逐个位置、逐根推进、横截面批量、自适应完整精度）与黄金结果的差异不能超过TOLERANCE
+
+sources记录每组K线的来源：recorded为从东方财富录制的真实K线，synthetic为合成的K线
+（mock_upstream.synthesize_klines生成的模拟行情，以及edge_case_klines构造的特殊情况），合成K线的键名以synthetic_开头
+
+用法：
+    python check_chip_golden.py                    # 检查所有实现
+    python check_chip_golden.py --record 300191 600000   # 从K线库录制这些股票的K线，加入黄金结果（UPSTREAM_BASE_URL等指向替身服务器时记为合成K线）
+    python check_chip_golden.py --regenerate       # 指标定义有意修改后，用已保存的K线重新生成黄金结果
+"""
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+import chip_analytics
+import chip_batch
+import upstream
+
+GOLDEN_PATH = os.path.join('golden', 'chip_golden.json')
+
+# 优化实现允许的最大差异（浮点求和顺序不同带来的误差）
+TOLERANCE = 1e-9
+
+# 每只股票检查的(精度因子, 计算范围)组合，与各接口使用的参数一致
+CASES = [(150, 120), (100, 60)]
+
+# 每只股票检查最后多少个位置
+CHECK_DAYS = 30
+
+# 录制的K线条数
+RECORD_BARS = 200
+
+# 东方财富K线的真实上游地址，其他地址（替身服务器）返回的K线记为合成K线
+REAL_KLINE_BASE = 'https://push2his.eastmoney.com'
+
+# 与kline_store.load_kline_frame相同的字段
+FRAME_COLUMNS = ['日期', '开盘', '收盘', '最高', '最低', '成交量', '成交额', '涨跌幅', '换手率']
+
+
+def edge_case_klines():
+    """构造覆盖特殊情况的K线：一字板、换手率缺失、换手率超过100%、K线不足计算范围"""
+    rng = np.random.default_rng(20240101)
+    bars = 90
+    closes = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.04, bars))), 2)
+    opens = np.round(closes * (1 + rng.normal(0, 0.01, bars)), 2)
+    highs = np.round(np.maximum(opens, closes) * 1.02, 2)
+    lows = np.round(np.minimum(opens, closes) * 0.98, 2)
+    turnovers = np.round(np.abs(rng.normal(6, 3, bars)), 2)
+    for i in (10, 11, 50, 88):
+        opens[i] = closes[i] = highs[i] = lows[i]
+    turnovers[30] = np.nan
+    turnovers[60] = 135.0
+    dates = pd.bdate_range('2024-01-02', periods=bars).strftime('%Y-%m-%d')
+    return pd.DataFrame({
+        '日期': dates, '开盘': opens, '收盘': closes, '最高': highs, '最低': lows,
+        '成交量': 1.0, '成交额': 1.0, '涨跌幅': 0.0, '换手率': turnovers
+    })
+
+
+def frame_to_json(kdata):
+    """K线DataFrame转换为按列的JSON（NaN记为None）"""
+    return {col: [None if isinstance(v, float) and np.isnan(v) else v for v in kdata[col].tolist()] for col in FRAME_COLUMNS}
+
+
+def frame_from_json(columns):
+    """按列的JSON还原为K线DataFrame"""
+    return pd.DataFrame({col: [np.nan if v is None else v for v in columns[col]] for col in FRAME_COLUMNS})
+
+
+def to_plain(metrics):
+    """指标字典转换为可JSON序列化、可逐位比较的形式"""
+    result = {}
+    for key, value in metrics.items():
+        if isinstance(value, tuple):
+            value = [float(v) for v in value]
+        elif key != 'date':
+            value = float(value)
+        result[key] = value
+    return result
+
+
+def record_klines(codes):
+    """从K线库录制股票的K线
+
+    Returns:
+        (klines, sources): 键名到按列K线的映射和键名到来源的映射
+    """
+    klines, sources = {}, {}
+    real = upstream.EASTMONEY_PUSH2HIS_BASE == REAL_KLINE_BASE
+    for code in codes:
+        key = code if real else f'synthetic_{code}'
+        klines[key] = frame_to_json(chip_analytics.load_kline_frame(code, RECORD_BARS))
+        if real:
+            sources[key] = {'type': 'recorded', 'upstream': REAL_KLINE_BASE,
+                            'recorded_at': pd.Timestamp.now().strftime('%Y-%m-%d')}
+        else:
+            sources[key] = {'type': 'synthetic', 'generator': f'{upstream.EASTMONEY_PUSH2HIS_BASE}（替身服务器）'}
+            print(f"K线上游为{upstream.EASTMONEY_PUSH2HIS_BASE}，{code}记为合成K线{key}")
+    return klines, sources
+
+
+def build_golden(klines, sources):
+    """用参考实现计算所有股票、所有参数组合的黄金结果"""
+    cases = []
+    for code, columns in klines.items():
+        kdata = frame_from_json(columns)
+        indices = list(range(max(0, len(kdata) - CHECK_DAYS), len(kdata)))
+        for factor, calc_range in CASES:
+            results = chip_analytics.calculate_metrics(kdata, indices, factor, calc_range, engine='reference')
+            cases.append({
+                'code': code,
+                'accuracy_factor': factor,
+                'calc_range': calc_range,
+                'indices': indices,
+                'results': [to_plain(r) for r in results]
+            })
+            print(f"生成{code} ({factor}, {calc_range})的黄金结果{len(results)}条")
+    return {'sources': sources, 'klines': klines, 'cases': cases}
+
+
+def to_plain_list(results):
+    """批量转换指标字典"""
+    return [to_plain(r) for r in results]
+
+
+def compare(expected, actual):
+    """返回两组指标的最大差异"""
+    diff = 0.0
+    for exp, act in zip(expected, to_plain_list(actual)):
+        for key, value in exp.items():
+            if key == 'date':
+                if value != act[key]:
+                    return float('inf')
+                continue
+            values = value if isinstance(value, list) else [value]
+            others = act[key] if isinstance(act[key], list) else [act[key]]
+            diff = max(diff, max(abs(a - b) for a, b in zip(values, others)))
+    return diff
+
+
+def batch_results(kdata, index, factor, calc_range):
+    """横截面批量计算（单只股票）在index处的指标，转换为与calculate_metrics相同的格式"""
+    start = max(0, index - calc_range + 1)
+    window = kdata.iloc[start:index + 1]
+    rates = window['换手率'].to_numpy(float)[None, :] / 100
+    arrays = [window[col].to_numpy(float)[None, :] for col in ('开盘', '收盘', '最高', '最低')]
+    m = chip_batch.compute_fixed_grid(*arrays, np.where(rates < 1, rates, 1.0), factor)
+    return {
+        'date': kdata['日期'].iloc[index],
+        'current_price': m['current_price'][0],
+        'profit_ratio': m['profit_ratio'][0],
+        'avg_cost': m['avg_cost'][0],
+        'cost_90_range': (m['cost_90_low'][0], m['cost_90_high'][0]),
+        'concentration_90': m['concentration_90'][0],
+        'cost_70_range': (m['cost_70_low'][0], m['cost_70_high'][0]),
+        'concentration_70': m['concentration_70'][0]
+    }
+
+
+def check(golden):
+    """检查所有实现与黄金结果的差异，返回是否全部通过"""
+    recorded = [key for key, source in golden['sources'].items() if source['type'] == 'recorded']
+    print(f"真实K线: {', '.join(recorded) or '无'}；合成K线: {len(golden['sources']) - len(recorded)}组")
+    if not recorded:
+        print("警告: 黄金结果只包含合成K线，请在可访问东方财富的环境中执行python check_chip_golden.py --record 300191 600000录制真实K线")
+    passed = True
+    for case in golden['cases']:
+        kdata = frame_from_json(golden['klines'][case['code']])
+        factor, calc_range, indices = case['accuracy_factor'], case['calc_range'], case['indices']
+        expected = case['results']
+
+        runs = {
+            engine: chip_analytics.calculate_metrics(kdata, indices, factor, calc_range, engine)
+            for engine in chip_analytics.ENGINES
+        }
+        analyzer = chip_analytics.NumpyChipDistributionAnalyzer(kdata, factor, calc_range)
+        runs['adaptive'] = [dict(analyzer.calculate_metrics(i), date=kdata['日期'].iloc[i]) for i in indices]
+        runs['batch'] = [batch_results(kdata, i, factor, calc_range) for i in indices]
+
+        for name, results in runs.items():
+            if name == 'reference':
+                ok = to_plain_list(results) == expected
+                detail = '逐位一致' if ok else '与黄金结果不一致'
+            else:
+                diff = compare(expected, results)
+                ok = diff <= TOLERANCE
+                detail = f'最大差异{diff:.2e}'
+            passed &= ok
+            print(f"{'通过' if ok else '失败'}  {case['code']} ({factor}, {calc_range}) {name}: {detail}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='筹码分析黄金结果回归检查')
+    parser.add_argument('--record', nargs='+', metavar='CODE', help='从K线库录制这些股票的K线并生成黄金结果')
+    parser.add_argument('--regenerate', action='store_true', help='用已录制的K线重新生成黄金结果')
+    args = parser.parse_args()
+
+    if args.record or args.regenerate:
+        if os.path.exists(GOLDEN_PATH):
+            with open(GOLDEN_PATH, encoding='utf-8') as f:
+                saved = json.load(f)
+            klines, sources = saved['klines'], saved['sources']
+        else:
+            klines = {'edge_cases': frame_to_json(edge_case_klines())}
+            sources = {'edge_cases': {'type': 'synthetic', 'generator': 'check_chip_golden.edge_case_klines'}}
+        if args.record:
+            # 录制的K线加入已保存的K线，不替换其他股票
+            recorded, recorded_sources = record_klines(args.record)
+            klines.update(recorded)
+            sources.update(recorded_sources)
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump(build_golden(klines, sources), f, ensure_ascii=False)
+        print(f"黄金结果已保存到{GOLDEN_PATH}")
+        return
+
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        golden = json.load(f)
+    if not check(golden):
+        print('存在与黄金结果不一致的实现')
+        sys.exit(1)
+    print('所有实现均与黄金结果一致')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+"""
+筹码分析统一入口
+- ChipDistributionAnalyzer：逐K线、逐价格区间计算的参考实现（原huoli.py和profit_ratio.py中的两份副本合并而来）
+- ENGINES：可替换的计算实现，NumPy内核等优化实现与参考实现的接口和指标定义相同
+- load_kline_frame：统一的日K线读取（本地K线库）
+- analyze_batch：多只股票 × 多个日期的批量计算接口
+
+指标定义（所有实现一致）：获利比例为价格小于等于当前价格的筹码占比，
+集中度为(成本区间上限 - 下限) / (上限 + 下限) × 100
+"""
+import pandas as pd
+import numpy as np
+import upstream
+import kline_store
+from chip_kernel import NumpyChipDistributionAnalyzer, distribution_metrics
+from typing import Dict, List, Tuple, Optional
+
+class ChipDistributionAnalyzer:
+    """筹码分布分析器（参考实现，逐K线、逐价格区间计算，其他实现的结果以它为准）"""
+    
+    def __init__(self, kdata: pd.DataFrame, accuracy_factor: int = 150, calc_range: Optional[int] = None):
+        """
+        初始化筹码分布分析器
+        
+        Args:
+            kdata: K线数据，必须包含 [开盘, 收盘, 最高, 最低, 成交量, 换手率] 等字段
+            accuracy_factor: 精度因子，决定价格分割的精度
+            calc_range: 计算的K线范围，默认使用全部数据
+        """
+        self._validate_data(kdata)
+        self.kdata = kdata
+        self.factor = accuracy_factor
+        self.range = calc_range
+
+    def _validate_data(self, kdata: pd.DataFrame) -> None:
+        """
+        验证输入数据的完整性
+        
+        Args:
+            kdata: 待验证的K线数据
+            
+        Raises:
+            ValueError: 当数据不完整或格式不正确时抛出
+        """
+        required_columns = ['开盘', '收盘', '最高', '最低', '成交量', '换手率']
+        missing_columns = [col for col in required_columns if col not in kdata.columns]
+        if missing_columns:
+            raise ValueError(f"K线数据缺少必要字段: {missing_columns}")
+
+    def calculate_chip_distribution(self, index: int) -> Dict:
+        """
+        计算指定位置的筹码分布
+        
+        Args:
+            index: K线位置索引
+            
+        Returns:
+            包含筹码分布结果的字典
+        """
+        # 确定计算范围
+        start = max(0, index - self.range + 1) if self.range else 0
+        kdata = self.kdata.iloc[start:index + 1]
+        
+        # 确定价格范围
+        max_price = max(kdata['最高'].values)
+        min_price = min(kdata['最低'].values)
+        
+        # 计算精度
+        accuracy = max(0.01, (max_price - min_price) / (self.factor - 1))
+        
+        # 初始化分布数组
+        price_range = [round(min_price + accuracy * i, 2) for i in range(self.factor)]
+        distribution = [0] * self.factor
+        
+        # 计算每个K线的贡献
+        for _, row in kdata.iterrows():
+            distribution = self._calculate_k_line_contribution(
+                row, distribution, min_price, accuracy, price_range
+            )
+        
+        result = self._calculate_distribution_metrics(
+            distribution, price_range, self.kdata['收盘'].iloc[index]
+        )
+        
+        # 添加日期信息
+        if '日期' in self.kdata.columns:
+            result['date'] = self.kdata['日期'].iloc[index]
+        return result
+
+    def _calculate_k_line_contribution(
+        self, 
+        kline: pd.Series, 
+        distribution: List[float],
+        min_price: float,
+        accuracy: float,
+        price_range: List[float]
+    ) -> List[float]:
+        """
+        计算单个K线对筹码分布的贡献
+        
+        Args:
+            kline: 单个K线数据
+            distribution: 现有筹码分布
+            min_price: 最小价格
+            accuracy: 价格精度
+            price_range: 价格范围数组
+            
+        Returns:
+            更新后的筹码分布
+        """
+        open_price = kline['开盘']
+        close_price = kline['收盘']
+        high_price = kline['最高']
+        low_price = kline['最低']
+        turnover_rate = min(1, kline['换手率'] / 100)
+        
+        # 计算平均价格
+        avg_price = (open_price + close_price + high_price + low_price) / 4
+        
+        # 计算价格区间索引
+        low_idx = max(0, int((low_price - min_price) / accuracy))
+        high_idx = min(self.factor - 1, int((high_price - min_price) / accuracy))
+        
+        # 衰减现有筹码
+        distribution = [d * (1 - turnover_rate) for d in distribution]
+        
+        # 一字板特殊处理
+        if high_price == low_price:
+            idx = int((high_price - min_price) / accuracy)
+            distribution[idx] += turnover_rate / 2
+        else:
+            # 计算三角形分布
+            for idx in range(low_idx, high_idx + 1):
+                price = price_range[idx]
+                if price <= avg_price:
+                    weight = (price - low_price) / (avg_price - low_price)
+                else:
+                    weight = (high_price - price) / (high_price - avg_price)
+                distribution[idx] += weight * turnover_rate
+                
+        return distribution
+
+    def _calculate_distribution_metrics(
+        self,
+        distribution: List[float],
+        price_range: List[float],
+        current_price: float
+    ) -> Dict:
+        """
+        计算筹码分布的各项指标
+        
+        Args:
+            distribution: 筹码分布数组
+            price_range: 价格范围数组
+            current_price: 当前价格
+            
+        Returns:
+            包含各项指标的字典
+        """
+        total_weight = sum(distribution)
+        if total_weight == 0:
+            return {
+                'profit_ratio': 0,
+                'avg_cost': 0,
+                'cost_90_range': (0, 0),
+                'concentration_90': 0,
+                'cost_70_range': (0, 0),
+                'concentration_70': 0,
+                'prices': price_range,
+                'distribution': distribution,
+                'current_price': current_price
+            }
+
+        # 计算平均成本
+        avg_cost = sum(p * d for p, d in zip(price_range, distribution)) / total_weight
+        
+        # 计算获利比例 - 正确的逻辑应该是计算当前价格以下的筹码占比
+        # 因为如果当前价格高于买入成本，那么这个筹码就是获利的
+        profit_ratio = sum(d for p, d in zip(price_range, distribution) if p <= current_price) / total_weight
+        
+        # 计算成本区间
+        cost_90_range, concentration_90 = self._calculate_cost_range(
+            price_range, distribution, total_weight, 0.9
+        )
+        cost_70_range, concentration_70 = self._calculate_cost_range(
+            price_range, distribution, total_weight, 0.7
+        )
+        
+        return {
+            'prices': price_range,
+            'distribution': distribution,
+            'current_price': current_price,
+            'profit_ratio': profit_ratio,
+            'avg_cost': avg_cost,
+            'cost_90_range': cost_90_range,
+            'concentration_90': concentration_90,
+            'cost_70_range': cost_70_range,
+            'concentration_70': concentration_70
+        }
+
+    def _calculate_cost_range(
+        self,
+        price_range: List[float],
+        distribution: List[float],
+        total_weight: float,
+        threshold: float
+    ) -> Tuple[Tuple[float, float], float]:
+        """
+        计算指定比例的成本区间
+        
+        Args:
+            price_range: 价格范围数组
+            distribution: 筹码分布数组
+            total_weight: 总权重
+            threshold: 阈值(如0.9表示90%)
+            
+        Returns:
+            (成本区间元组, 集中度)
+        """
+        sorted_prices = sorted(
+            [(p, d) for p, d in zip(price_range, distribution)],
+            key=lambda x: x[1],
+            reverse=True
+        )
+        
+        cumsum = 0
+        cost_low = float('inf')
+        cost_high = float('-inf')
+        
+        for price, dist in sorted_prices:
+            cumsum += dist
+            cost_low = min(cost_low, price)
+            cost_high = max(cost_high, price)
+            if cumsum >= threshold * total_weight:
+                break
+                
+        concentration = (
+            (cost_high - cost_low) / (cost_high + cost_low) * 100 
+            if cost_high + cost_low > 0 else 0
+        )
+        
+        return (cost_low, cost_high), concentration
+
+    def visualize_chip_distribution(self, chip_distribution: Dict, title_prefix: str = "") -> None:
+        """
+        可视化筹码分布
+        
+        Args:
+            chip_distribution: 筹码分布数据
+            title_prefix: 标题前缀
+        """
+        try:
+            import matplotlib.pyplot as plt
+        except ImportError:
+            print("matplotlib未安装，无法显示图表")
+            return
+        
+        fig, ax = plt.subplots(figsize=(12, 6))
+        
+        # 绘制筹码分布
+        for i in range(len(chip_distribution['prices'])):
+            color = 'red' if chip_distribution['prices'][i] < chip_distribution['current_price'] else 'green'
+            ax.barh(
+                chip_distribution['prices'][i],
+                chip_distribution['distribution'][i],
+                color=color,
+                alpha=0.6,
+                edgecolor='none'
+            )
+
+        # 设置标题和标签
+        title = f"筹码分布图: {title_prefix}\n"
+        title += f"当前股价: {chip_distribution['current_price']:.2f}  "
+        title += f"获利比例: {chip_distribution['profit_ratio']*100:.2f}%"
+        
+        ax.set_title(title, fontsize=12)
+        ax.set_xlabel('筹码占比', fontsize=10)
+        ax.set_ylabel('价格', fontsize=10)
+        
+        # 添加指标说明
+        text_content = (
+            f"获利比例: {chip_distribution['profit_ratio']*100:.2f}%\n"
+            f"平均成本: {chip_distribution['avg_cost']:.2f}\n"
+            f"90%成本: {chip_distribution['cost_90_range'][0]:.2f}-{chip_distribution['cost_90_range'][1]:.2f}\n"
+            f"集中度: {chip_distribution['concentration_90']:.2f}%\n"
+            f"70%成本: {chip_distribution['cost_70_range'][0]:.2f}-{chip_distribution['cost_70_range'][1]:.2f}\n"
+            f"集中度: {chip_distribution['concentration_70']:.2f}%"
+        )
+        
+        plt.text(
+            1.02, 0.5,
+            text_content,
+            transform=ax.transAxes,
+            verticalalignment='center',
+            bbox=dict(boxstyle='round', facecolor='white', alpha=0.8)
+        )
+
+        ax.grid(True, linestyle='--', alpha=0.3)
+        plt.show()
+
+    def calculate_all_distributions(self) -> List[Dict]:
+        """
+        计算所有K线的筹码分布指标
+        
+        Returns:
+            所有K线的筹码分布指标列表，每个元素包含:
+            - profit_ratio: 获利比例
+            - avg_cost: 平均成本
+            - concentration_70: 70%筹码集中度
+            - concentration_90: 90%筹码集中度
+        """
+        return [
+            {key: result[key] for key in ('profit_ratio', 'avg_cost', 'concentration_70', 'concentration_90')}
+            for result in (self.calculate_chip_distribution(i) for i in range(len(self.kdata)))
+        ]
+
+
+# 可选的计算实现：reference为参考实现，numpy为逐个位置计算的NumPy内核，series为逐根推进的NumPy内核
+ENGINES = {
+    'reference': ChipDistributionAnalyzer,
+    'numpy': NumpyChipDistributionAnalyzer,
+    'series': NumpyChipDistributionAnalyzer
+}
+
+# 批量计算时返回的指标字段
+METRIC_KEYS = ('date', 'current_price', 'profit_ratio', 'avg_cost', 'cost_90_range', 'concentration_90',
+               'cost_70_range', 'concentration_70')
+
+
+def load_kline_frame(stock_code: str, days: int, end: Optional[str] = None, secid: Optional[str] = None) -> pd.DataFrame:
+    """
+    读取股票最近days根日K线（本地K线库，缺少的K线从东方财富增量同步）
+
+    Args:
+        stock_code: 股票代码，支持600000、600000.SH、SZ.000001等格式
+        days: K线条数
+        end: 结束日期（YYYYMMDD或YYYY-MM-DD），默认最新
+        secid: 已知的东方财富secid，提供时不再根据股票代码推算
+
+    Returns:
+        包含日期、开盘、收盘、最高、最低、成交量、成交额、涨跌幅、换手率字段的DataFrame
+
+    Raises:
+        ValueError: 不支持的股票代码前缀
+    """
+    return kline_store.load_kline_frame(secid or upstream.get_secid(stock_code), days, end=end)
+
+
+def calculate_metrics(kdata: pd.DataFrame, indices: List[int], accuracy_factor: int = 150,
+                      calc_range: Optional[int] = 120, engine: str = 'numpy') -> List[Dict]:
+    """
+    用指定的实现计算K线数据在若干位置的筹码指标
+
+    Args:
+        kdata: K线数据
+        indices: 升序的K线位置索引
+        engine: ENGINES中的实现名称
+
+    Returns:
+        每个位置的指标字典（字段见METRIC_KEYS，不含prices和distribution）
+    """
+    analyzer = ENGINES[engine](kdata, accuracy_factor, calc_range)
+    dates = kdata['日期'].tolist() if '日期' in kdata.columns else None
+    if engine == 'series':
+        # 从第一个位置逐根推进到最后一个位置，只保留需要的位置
+        wanted = set(indices)
+        results = {}
+        for i, prices, distribution in analyzer.iter_distributions(indices[0] if indices else len(kdata)):
+            if i in wanted:
+                results[i] = distribution_metrics(prices, distribution, analyzer.closes[i], include_distribution=False)
+            if i >= indices[-1]:
+                break
+    else:
+        results = {i: analyzer.calculate_chip_distribution(i) for i in indices}
+
+    output = []
+    for i in indices:
+        metrics = {key: results[i].get(key) for key in METRIC_KEYS}
+        metrics['date'] = dates[i] if dates is not None else i
+        output.append(metrics)
+    return output
+
+
+def analyze_batch(codes: List[str], dates: List[str], accuracy_factor: int = 150,
+                  calc_range: Optional[int] = 120, engine: str = 'numpy') -> Dict[str, Dict]:
+    """
+    批量计算多只股票在多个日期的筹码指标，每只股票只读取一次K线
+
+    Args:
+        codes: 股票代码列表
+        dates: 日期列表（YYYYMMDD或YYYY-MM-DD），非交易日取之前最近的交易日
+        engine: ENGINES中的实现名称
+
+    Returns:
+        dict: 股票代码到结果的映射，结果为{'data': 按日期升序的指标列表}或{'error': 错误信息}
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"不支持的计算实现: {engine}")
+    dates = sorted({kline_store.normalize_date(d) for d in dates})
+    if not dates:
+        return {code: {'data': []} for code in codes}
+    # 最早日期的窗口需要之前calc_range根K线，日期跨度按工作日估算
+    days = (calc_range or 0) + int(np.busday_count(dates[0], dates[-1])) + 1
+
+    results = {}
+    for code in codes:
+        try:
+            kdata = load_kline_frame(code, days, end=dates[-1])
+            bar_dates = kdata['日期'].tolist()
+            indices = sorted({
+                pos - 1 for pos in (int(np.searchsorted(bar_dates, d, side='right')) for d in dates) if pos > 0
+            })
+            results[code] = {'data': calculate_metrics(kdata, indices, accuracy_factor, calc_range, engine)}
+        except Exception as e:
+            results[code] = {'error': str(e)}
+    return results
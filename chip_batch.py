@@ -0,0 +1,211 @@
+"""
+横截面批量筹码分析
+对某一天涨停列表中的全部股票一次性计算获利比例、平均成本和集中度：
+K线从本地K线库读取（有限并发同步），所有股票的筹码分布在一个(股票数, 价格区间数)的矩阵上同时计算，
+股票较多时分块交给进程池并行计算
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import db
+import upstream
+import kline_store
+from chip_kernel import (build_price_ranges, triangular_contributions, decay_weights, batch_distribution_metrics,
+                         adaptive_distribution, distribution_metrics, CHIP_RESOLUTIONS)
+
+# 默认精度档位和计算范围（与profit_ratio.py的单只股票计算一致）
+DEFAULT_RESOLUTION = 'standard'
+DEFAULT_CALC_RANGE = 120
+
+# 同步K线的最大并发数（受上游限流约束）
+KLINE_FETCH_WORKERS = 8
+
+# 精度因子为150时每个计算分块的股票数，同时限制(股票数, K线数, 价格区间数)中间矩阵的内存，
+# 精度因子更大时按比例减少
+CHUNK_SIZE = 32
+
+# 进程池大小；股票数不超过一个分块时直接在当前进程计算
+PROCESS_WORKERS = min(4, os.cpu_count() or 1)
+
+# 筹码指标的输出字段
+METRIC_FIELDS = ('profit_ratio', 'avg_cost', 'concentration_90', 'concentration_70',
+                 'cost_90_low', 'cost_90_high', 'cost_70_low', 'cost_70_high')
+
+# 进程池在第一次批量计算时按需创建
+_process_pool = None
+
+
+def _get_process_pool():
+    """获取共享的进程池，创建失败（如运行环境不支持多进程）时返回None"""
+    global _process_pool
+    if _process_pool is None and PROCESS_WORKERS > 1:
+        try:
+            _process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+        except (OSError, NotImplementedError, ValueError) as e:
+            logging.warning(f"创建筹码计算进程池失败，改为单进程计算: {e}")
+            return None
+    return _process_pool
+
+
+def _load_bars(code, calc_range, end):
+    """读取单只股票截至end的最近calc_range根日K线
+
+    Returns:
+        (secid, 形状为(5, K线数)的开收高低换手数组)
+    """
+    secid = upstream.get_secid(code)
+    rows = kline_store.get_klines(secid, '1', calc_range, end)['rows']
+    if not rows:
+        raise ValueError('没有K线数据')
+    bars = np.array([(r[1], r[2], r[3], r[4], r[10]) for r in rows], dtype=float).T
+    return secid, bars
+
+
+def load_bar_matrix(codes, calc_range=DEFAULT_CALC_RANGE, end=None):
+    """有限并发地读取多只股票的K线，对齐成(股票数, calc_range)的矩阵
+
+    K线不足calc_range根的股票在前面补换手率为0、价格为区间最低价的K线，
+    补齐的K线不新增筹码也不衰减已有筹码，计算结果与只用实际K线相同
+
+    Returns:
+        (成功的股票代码列表, 开盘, 收盘, 最高, 最低, 换手率矩阵, 失败股票代码到错误信息的映射)
+    """
+    loaded = {}
+    errors = {}
+
+    def load(code):
+        try:
+            loaded[code] = _load_bars(code, calc_range, end)[1]
+        except Exception as e:
+            logging.warning(f"读取{code}的K线失败: {e}")
+            errors[code] = str(e)
+
+    with ThreadPoolExecutor(max_workers=KLINE_FETCH_WORKERS) as executor:
+        list(executor.map(load, codes))
+
+    ok_codes = [code for code in codes if code in loaded]
+    matrix = np.empty((5, len(ok_codes), calc_range))
+    for i, code in enumerate(ok_codes):
+        bars = loaded[code]
+        pad = calc_range - bars.shape[1]
+        matrix[:4, i, :pad] = np.nanmin(bars[3])
+        matrix[4, i, :pad] = 0
+        matrix[:, i, pad:] = bars
+
+    opens, closes, highs, lows, rates = matrix
+    rates = rates / 100
+    # 与min(1, 换手率/100)一致：换手率缺失时按全部换手处理
+    turnovers = np.where(rates < 1, rates, 1.0)
+    return ok_codes, opens, closes, highs, lows, turnovers, errors
+
+
+def _compute_adaptive(opens, closes, highs, lows, turnovers, accuracy_factor, coarse_bins):
+    """逐只股票用自适应分辨率计算筹码指标，返回格式与compute_chunk相同"""
+    rows = []
+    for i in range(len(closes)):
+        prices, distribution = adaptive_distribution(
+            opens[i], closes[i], highs[i], lows[i], turnovers[i], closes[i, -1], accuracy_factor, coarse_bins
+        )
+        metrics = distribution_metrics(prices, distribution, closes[i, -1], include_distribution=False)
+        (c90l, c90h), (c70l, c70h) = metrics['cost_90_range'], metrics['cost_70_range']
+        rows.append((metrics['profit_ratio'], metrics['avg_cost'], metrics['concentration_90'], metrics['concentration_70'],
+                     c90l, c90h, c70l, c70h))
+    columns = np.array(rows, dtype=float).reshape(-1, len(METRIC_FIELDS)).T
+    result = dict(zip(METRIC_FIELDS, columns))
+    result['current_price'] = closes[:, -1]
+    return result
+
+
+def compute_chunk(opens, closes, highs, lows, turnovers, resolution=DEFAULT_RESOLUTION):
+    """计算一组股票在最后一根K线处的筹码指标，输入均为(股票数, K线数)矩阵
+
+    Args:
+        resolution: chip_kernel.CHIP_RESOLUTIONS中的精度档位，完整精度时所有股票在一个矩阵上同时计算，
+                    自适应档位逐只股票计算
+
+    Returns:
+        指标名到每只股票指标数组的映射（另含current_price）
+    """
+    accuracy_factor, coarse_bins = CHIP_RESOLUTIONS[resolution]
+    if coarse_bins:
+        return _compute_adaptive(opens, closes, highs, lows, turnovers, accuracy_factor, coarse_bins)
+    return compute_fixed_grid(opens, closes, highs, lows, turnovers, accuracy_factor)
+
+
+def compute_fixed_grid(opens, closes, highs, lows, turnovers, accuracy_factor):
+    """在固定网格上同时计算一组股票在最后一根K线处的筹码指标，返回格式与compute_chunk相同"""
+    min_prices = lows.min(axis=1)
+    prices, accuracies = build_price_ranges(min_prices, highs.max(axis=1), accuracy_factor)
+    contributions = triangular_contributions(opens, closes, highs, lows, turnovers, prices, min_prices, accuracies)
+    distributions = np.einsum('sb,sbf->sf', decay_weights(turnovers), contributions)
+    current_prices = closes[:, -1]
+    result = batch_distribution_metrics(prices, distributions, current_prices)
+    result['current_price'] = current_prices
+    return result
+
+
+def compute_metrics(opens, closes, highs, lows, turnovers, resolution=DEFAULT_RESOLUTION):
+    """分块计算全部股票的筹码指标，股票较多时分块并行交给进程池"""
+    count = len(closes)
+    size = max(1, CHUNK_SIZE * 150 // CHIP_RESOLUTIONS[resolution][0])
+    chunks = [slice(i, i + size) for i in range(0, count, size)]
+    arrays = (opens, closes, highs, lows, turnovers)
+
+    results = None
+    pool = _get_process_pool() if len(chunks) > 1 else None
+    if pool is not None:
+        try:
+            futures = [pool.submit(compute_chunk, *(a[c] for a in arrays), resolution) for c in chunks]
+            results = [f.result() for f in futures]
+        except Exception as e:
+            logging.warning(f"进程池计算筹码指标失败，改为单进程计算: {e}")
+    if results is None:
+        results = [compute_chunk(*(a[c] for a in arrays), resolution) for c in chunks]
+
+    if not results:
+        return {name: np.empty(0) for name in METRIC_FIELDS + ('current_price',)}
+    return {name: np.concatenate([r[name] for r in results]) for name in results[0]}
+
+
+def analyze_stocks(stocks, end=None, resolution=DEFAULT_RESOLUTION, calc_range=DEFAULT_CALC_RANGE):
+    """批量计算一组股票的筹码指标
+
+    Args:
+        stocks: db模块返回的股票字典列表（需要code和name）
+        end: K线结束日期（YYYYMMDD），默认最新
+        resolution: chip_kernel.CHIP_RESOLUTIONS中的精度档位
+
+    Returns:
+        dict: data为每只股票的指标列表（获利比例为百分比），errors为失败股票代码到错误信息的映射
+    """
+    names = {stock['code']: stock.get('name') for stock in stocks}
+    codes, opens, closes, highs, lows, turnovers, errors = load_bar_matrix(list(names), calc_range, end)
+    metrics = compute_metrics(opens, closes, highs, lows, turnovers, resolution)
+
+    data = []
+    for i, code in enumerate(codes):
+        item = {'code': code, 'name': names[code]}
+        item['current_price'] = round(float(metrics['current_price'][i]), 2)
+        item['profit_ratio'] = round(float(metrics['profit_ratio'][i]) * 100, 2)
+        for name in METRIC_FIELDS[1:]:
+            item[name] = round(float(metrics[name][i]), 2)
+        data.append(item)
+    return {'data': data, 'errors': errors}
+
+
+def analyze_date(date_str=None, resolution=DEFAULT_RESOLUTION, calc_range=DEFAULT_CALC_RANGE):
+    """批量计算某一天涨停列表中全部股票的筹码指标，date_str为空时使用最新一天
+
+    Returns:
+        dict: date为数据日期，data和errors见analyze_stocks
+    """
+    stocks = db.get_stock_data_by_date(date_str) if date_str else db.get_latest_day_data()
+    if not stocks:
+        return {'date': date_str, 'data': [], 'errors': {}}
+    # 历史日期只使用当天及以前的K线
+    date = stocks[0].get('date') or date_str
+    end = date_str or None
+    result = analyze_stocks(stocks, end, resolution, calc_range)
+    result['date'] = date
+    return result
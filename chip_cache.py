@@ -0,0 +1,239 @@
+"""
+筹码指标持久化缓存模块
+收盘后的历史筹码指标不会再变化，按(secid, 复权类型, 精度因子, 计算范围, 交易日)把每天的指标和筹码分布
+保存到K线数据库，重复请求只计算缺失的交易日
+"""
+import sqlite3
+import datetime
+import numpy as np
+import pandas as pd
+import kline_store
+from chip_kernel import NumpyChipDistributionAnalyzer, distribution_metrics
+
+# 与K线存储共用数据库文件（同样属于可随时重建的缓存）
+CHIP_DB_PATH = kline_store.KLINE_DB_PATH
+
+def _connect():
+    """连接筹码缓存数据库并确保表结构存在"""
+    conn = sqlite3.connect(CHIP_DB_PATH, timeout=30)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS chip_metrics (
+        secid TEXT NOT NULL,
+        fqt TEXT NOT NULL,
+        factor INTEGER NOT NULL,
+        calc_range INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        close REAL,
+        profit_ratio REAL,
+        avg_cost REAL,
+        cost_90_low REAL,
+        cost_90_high REAL,
+        concentration_90 REAL,
+        cost_70_low REAL,
+        cost_70_high REAL,
+        concentration_70 REAL,
+        min_price REAL,
+        accuracy REAL,
+        distribution BLOB,
+        PRIMARY KEY (secid, fqt, factor, calc_range, date)
+    )
+    ''')
+    return conn
+
+
+def _row_to_metrics(row, factor, with_distribution):
+    """把chip_metrics表的一行转换为与calculate_series相同格式的指标字典"""
+    date, close, pr, avg, c90l, c90h, k90, c70l, c70h, k70, min_price, accuracy, blob = row
+    result = {
+        'date': date,
+        'current_price': close,
+        'profit_ratio': pr,
+        'avg_cost': avg,
+        'cost_90_range': (c90l, c90h),
+        'concentration_90': k90,
+        'cost_70_range': (c70l, c70h),
+        'concentration_70': k70
+    }
+    if with_distribution:
+        # 价格区间由最低价和精度还原，与build_price_range的结果相同
+        result['prices'] = np.round(min_price + accuracy * np.arange(factor), 2).tolist()
+        result['distribution'] = np.frombuffer(blob, dtype=np.float64).tolist()
+        result['min_price'] = min_price
+        result['accuracy'] = accuracy
+    return result
+
+
+def get_metric_series(secid, days, end=None, fqt='1', accuracy_factor=150, calc_range=120, with_distribution=False):
+    """获取最近days个交易日的筹码指标序列，已缓存的交易日直接读取，缺失的交易日计算后写入缓存
+
+    每天的指标都使用完整的calc_range根K线窗口计算，与请求的天数无关；
+    缓存行记录了当天的收盘价，复权价格变化（除权除息）或未收盘K线更新后收盘价不一致，会重新计算
+
+    Args:
+        secid: 东方财富secid，如1.600000
+        days: 交易日数
+        end: 结束日期（YYYYMMDD或YYYY-MM-DD），默认最新
+        with_distribution: 是否在结果中包含prices和distribution列表，以及价格区间的min_price和未取整的accuracy
+
+    Returns:
+        list: 按日期升序的指标字典，格式与NumpyChipDistributionAnalyzer.calculate_series相同
+    """
+    rows = kline_store.get_klines(secid, fqt, days + calc_range - 1, end)['rows']
+    if not rows:
+        return []
+    first = max(0, len(rows) - days)
+    dates = [r[0] for r in rows]
+
+    conn = _connect()
+    try:
+        cached = {
+            row[0]: row for row in conn.execute('''
+            SELECT date, close, profit_ratio, avg_cost, cost_90_low, cost_90_high, concentration_90,
+                   cost_70_low, cost_70_high, concentration_70, min_price, accuracy, distribution
+            FROM chip_metrics
+            WHERE secid=? AND fqt=? AND factor=? AND calc_range=? AND date>=? AND date<=?
+            ''', (secid, fqt, accuracy_factor, calc_range, dates[first], dates[-1]))
+        }
+
+        results = {}
+        for i in range(first, len(rows)):
+            row = cached.get(dates[i])
+            if row is not None and row[1] == rows[i][2] and (row[-1] is not None or not with_distribution):
+                results[i] = _row_to_metrics(row, accuracy_factor, with_distribution)
+
+        missing = [i for i in range(first, len(rows)) if i not in results]
+        if missing:
+            kdata = pd.DataFrame(
+                [(r[0], r[1], r[2], r[3], r[4], r[5], r[10]) for r in rows],
+                columns=['日期', '开盘', '收盘', '最高', '最低', '成交量', '换手率']
+            )
+            analyzer = NumpyChipDistributionAnalyzer(kdata, accuracy_factor, calc_range)
+            # 只有收盘后的K线才不会再变化，当天盘中的结果不写入缓存
+            closed_date = kline_store.last_market_close().strftime('%Y-%m-%d')
+            new_rows = []
+            for i, prices, distribution in analyzer.iter_distributions(missing[0]):
+                if i in results:
+                    continue
+                metrics = distribution_metrics(prices, distribution, analyzer.closes[i], with_distribution)
+                metrics['date'] = dates[i]
+                results[i] = metrics
+                # 价格区间的最低价和未取整的精度（与build_price_range相同），价格区间由两者还原
+                w = analyzer.window(i)
+                min_price = analyzer.lows[w].min()
+                accuracy = max(0.01, (analyzer.highs[w].max() - min_price) / (accuracy_factor - 1))
+                if with_distribution:
+                    metrics['min_price'] = float(min_price)
+                    metrics['accuracy'] = float(accuracy)
+                if dates[i] <= closed_date:
+                    new_rows.append((
+                        secid, fqt, accuracy_factor, calc_range, dates[i], float(analyzer.closes[i]),
+                        metrics['profit_ratio'], metrics['avg_cost'],
+                        *metrics['cost_90_range'], metrics['concentration_90'],
+                        *metrics['cost_70_range'], metrics['concentration_70'],
+                        float(min_price), float(accuracy), distribution.astype(np.float64).tobytes()
+                    ))
+            if new_rows:
+                conn.executemany('''
+                INSERT OR REPLACE INTO chip_metrics
+                (secid, fqt, factor, calc_range, date, close, profit_ratio, avg_cost, cost_90_low, cost_90_high,
+                 concentration_90, cost_70_low, cost_70_high, concentration_70, min_price, accuracy, distribution)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', new_rows)
+                conn.commit()
+    finally:
+        conn.close()
+
+    return [results[i] for i in range(first, len(rows))]
+
+
+def clear_cache(secid=None):
+    """清除筹码指标缓存，secid为空时清除全部"""
+    conn = _connect()
+    try:
+        if secid:
+            conn.execute("DELETE FROM chip_metrics WHERE secid=?", (secid,))
+        else:
+            conn.execute("DELETE FROM chip_metrics")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# 筹码分布量化后每天的权重总和，权重用整数表示
+PROFILE_SCALE = 10000
+
+# 区间查询最多返回的交易日数
+MAX_PROFILE_DAYS = 250
+
+
+def quantize_distribution(min_price, accuracy, distribution, bins=None, scale=PROFILE_SCALE):
+    """把筹码分布量化为整数权重，可选合并相邻价格区间降采样
+
+    Args:
+        min_price: 价格区间的最低价
+        accuracy: 未取整的价格精度（价格区间列表保留了两位小数，相邻价格之差不是实际步长）
+        distribution: 筹码分布列表
+        bins: 降采样后的最大区间数，默认不降采样
+        scale: 权重总和
+
+    Returns:
+        (最低价, 降采样后的区间价格步长, 整数权重列表)
+    """
+    weights = np.clip(np.asarray(distribution, dtype=float), 0, None)
+    group = -(-len(weights) // bins) if bins and bins < len(weights) else 1
+    if group > 1:
+        # 末尾补0后按组求和，每组的价格为组内最低价
+        weights = np.pad(weights, (0, -len(weights) % group)).reshape(-1, group).sum(axis=1)
+    total = weights.sum()
+    quantized = np.rint(weights / total * scale).astype(int) if total > 0 else np.zeros(len(weights), dtype=int)
+    return float(min_price), float(accuracy) * group, quantized.tolist()
+
+
+def get_profile_frames(secid, start=None, end=None, bins=None, fqt='1', accuracy_factor=150, calc_range=120):
+    """获取一个交易日或一段日期的筹码分布，量化为整数权重并按天差分编码
+
+    价格区间与前一天相同时只返回与前一天权重的差值（delta），价格区间变化时返回完整权重（weights），
+    客户端依次累加即可还原每天的分布
+
+    Args:
+        start: 开始日期（YYYYMMDD或YYYY-MM-DD），为空时只返回end当天
+        end: 结束日期，默认最新
+        bins: 降采样后的最大区间数
+
+    Returns:
+        list: 每天的帧，包含date、current_price、profit_ratio、avg_cost、min_price、step，以及weights或delta
+    """
+    start_date = kline_store.normalize_date(start)
+    end_date = kline_store.normalize_date(end)
+    if start_date:
+        last = end_date or datetime.date.today().isoformat()
+        days = min(MAX_PROFILE_DAYS, int(np.busday_count(start_date, last)) + 1)
+    else:
+        days = 1
+    if days < 1:
+        return []
+
+    series = get_metric_series(secid, days, end, fqt, accuracy_factor, calc_range, with_distribution=True)
+    frames = []
+    previous = None
+    for item in series:
+        if start_date and item['date'] < start_date:
+            continue
+        min_price, step, weights = quantize_distribution(item['min_price'], item['accuracy'], item['distribution'], bins)
+        frame = {
+            'date': item['date'],
+            'current_price': float(item['current_price']),
+            'profit_ratio': round(item['profit_ratio'] * 100, 2),
+            'avg_cost': round(item['avg_cost'], 2),
+            'min_price': min_price,
+            'step': step
+        }
+        # 价格区间的参数（最低价、未取整的精度、区间数）与前一天完全相同时才按差值编码
+        grid = (item['min_price'], item['accuracy'], len(item['distribution']))
+        if previous and previous[0] == grid:
+            frame['delta'] = [w - p for w, p in zip(weights, previous[1])]
+        else:
+            frame['weights'] = weights
+        previous = (grid, weights)
+        frames.append(frame)
+    return frames
@@ -0,0 +1,184 @@
+"""
+盘中筹码分布模块
+用分时接口的分钟成交（价格、成交量）把当天尚未收盘的K线逐步累积出来，
+在前一交易日的筹码分布上按当天累计换手率衰减并加上当天K线的筹码，盘中即可得到最新的获利比例
+
+每只股票只在当天第一次更新时读取日K线并计算前面K线的筹码（之后价格突破窗口最高/最低价时才重新计算），
+之后每次更新只处理新增的分钟数据，再做一次价格区间数量级的运算
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import upstream
+import kline_store
+from chip_kernel import build_price_range, triangular_contributions, decay_weights, distribution_metrics
+
+# 与获利比例序列相同的精度因子和计算范围（含当天）
+ACCURACY_FACTOR = 150
+CALC_RANGE = 120
+
+# 首次读取日K线的最大并发数
+INIT_WORKERS = 8
+
+
+class IntradayChipState:
+    """单只股票当天的盘中筹码状态"""
+
+    def __init__(self, secid, trade_date, accuracy_factor=ACCURACY_FACTOR, calc_range=CALC_RANGE):
+        """
+        读取trade_date之前的calc_range-1根日K线，作为当天窗口中前面的K线
+
+        Raises:
+            ValueError: 没有之前的日K线或无法推算流通股本
+        """
+        self.secid = secid
+        self.trade_date = trade_date
+        self.factor = accuracy_factor
+        # 同一只股票的更新串行执行，分钟累积状态不会被并发请求打乱
+        self.lock = threading.Lock()
+
+        rows = kline_store.get_klines(secid, '1', calc_range, trade_date)['rows']
+        rows = [r for r in rows if r[0] < trade_date][-(calc_range - 1):] if calc_range > 1 else []
+        if not rows:
+            raise ValueError('没有之前的日K线数据')
+        bars = np.array([(r[1], r[2], r[3], r[4], r[5], r[10]) for r in rows], dtype=float).T
+        self.opens, self.closes, self.highs, self.lows, volumes, rates = bars
+        # 与min(1, 换手率/100)一致：换手率缺失时按全部换手处理
+        rates = rates / 100
+        self.turnovers = np.where(rates < 1, rates, 1.0)
+
+        # 用最近一根有换手率的日K线推算流通股本（成交量和分时成交量单位都是手）
+        valid = np.flatnonzero((rates > 0) & (volumes > 0))
+        if not len(valid):
+            raise ValueError('无法推算流通股本')
+        self.float_volume = volumes[valid[-1]] / rates[valid[-1]]
+
+        # 已确认的分钟数据（最后一分钟可能还在变化，不计入）
+        self.minutes = 0
+        self.open = None
+        self.high = -np.inf
+        self.low = np.inf
+        self.volume = 0.0
+
+        # 前面K线的筹码分布（未计入当天换手衰减）及其价格区间
+        self.grid = None
+        self.prices = None
+        self.accuracy = None
+        self.carry = None
+
+    def _ensure_grid(self, low, high):
+        """当天价格超出当前价格区间时，按新的窗口最高/最低价重新计算前面K线的筹码分布"""
+        min_price = min(self.lows.min(), low)
+        max_price = max(self.highs.max(), high)
+        if self.grid == (min_price, max_price):
+            return
+        self.prices, self.accuracy = build_price_range(min_price, max_price, self.factor)
+        self.carry = decay_weights(self.turnovers) @ triangular_contributions(
+            self.opens, self.closes, self.highs, self.lows, self.turnovers, self.prices, min_price, self.accuracy
+        )
+        self.grid = (min_price, max_price)
+
+    def update(self, prices, volumes):
+        """
+        用当天的分钟价格和成交量更新筹码分布，只处理上次更新之后新增的分钟
+
+        Args:
+            prices: 当天从开盘起的分钟价格列表
+            volumes: 对应的分钟成交量列表（手）
+
+        Returns:
+            dict: 当前的筹码指标（与distribution_metrics格式相同，不含分布），没有分钟数据时返回None
+        """
+        count = len(prices)
+        if count == 0:
+            return None
+
+        # 确认新增的完整分钟（最后一分钟除外）
+        confirmed = slice(self.minutes, count - 1)
+        if confirmed.start < confirmed.stop:
+            new_prices = np.asarray(prices[confirmed], dtype=float)
+            if self.open is None:
+                self.open = new_prices[0]
+            self.high = max(self.high, new_prices.max())
+            self.low = min(self.low, new_prices.min())
+            self.volume += float(np.sum(volumes[confirmed]))
+            self.minutes = count - 1
+
+        # 当天K线 = 已确认的分钟 + 最后一分钟
+        last_price = float(prices[-1])
+        day_open = self.open if self.open is not None else last_price
+        day_high = max(self.high, last_price)
+        day_low = min(self.low, last_price)
+        turnover = min(1.0, (self.volume + float(volumes[-1])) / self.float_volume)
+
+        self._ensure_grid(day_low, day_high)
+        today = triangular_contributions(
+            np.array([day_open]), np.array([last_price]), np.array([day_high]), np.array([day_low]),
+            np.array([turnover]), self.prices, self.grid[0], self.accuracy
+        )[0]
+        distribution = self.carry * (1 - turnover) + today
+
+        result = distribution_metrics(self.prices, distribution, last_price, include_distribution=False)
+        result['date'] = self.trade_date
+        result['turnover'] = turnover
+        return result
+
+
+class IntradayChipTracker:
+    """维护一组股票的盘中筹码状态，分时数据与分时代理接口共用缓存"""
+
+    def __init__(self, accuracy_factor=ACCURACY_FACTOR, calc_range=CALC_RANGE):
+        self.factor = accuracy_factor
+        self.range = calc_range
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def _get_state(self, secid, trade_date):
+        """获取股票当天的状态，交易日变化时重新创建"""
+        with self.lock:
+            state = self.states.get(secid)
+        if state is None or state.trade_date != trade_date:
+            state = IntradayChipState(secid, trade_date, self.factor, self.range)
+            with self.lock:
+                self.states[secid] = state
+        return state
+
+    def _update_one(self, code, compact):
+        """用一只股票的紧凑分时数据更新筹码指标"""
+        if 'error' in compact:
+            return {'error': compact['error']}
+        if not compact.get('times'):
+            return {'error': '分时数据为空'}
+        try:
+            secid = upstream.get_secid(code)
+            trade_date = compact['times'][0][:10]
+            state = self._get_state(secid, trade_date)
+            with state.lock:
+                metrics = state.update(compact['prices'], compact['volumes'])
+        except Exception as e:
+            logging.warning(f"更新{code}的盘中筹码失败: {e}")
+            return {'error': str(e)}
+        metrics['time'] = compact['times'][-1]
+        return metrics
+
+    def refresh(self, codes):
+        """
+        获取最新分时数据并更新一组股票的盘中筹码指标
+
+        Returns:
+            dict: 股票代码到筹码指标（失败时为包含error的字典）的映射
+        """
+        time_sharing = upstream.fetch_time_sharing_batch(codes)
+        with ThreadPoolExecutor(max_workers=INIT_WORKERS) as executor:
+            results = dict(zip(codes, executor.map(lambda code: self._update_one(code, time_sharing[code]), codes)))
+        return results
+
+    def clear(self):
+        """清除所有股票的状态"""
+        with self.lock:
+            self.states.clear()
+
+
+# 全局盘中筹码跟踪器
+tracker = IntradayChipTracker()
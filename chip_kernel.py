@@ -0,0 +1,469 @@
+"""
+筹码分布NumPy计算内核
+与chip_analytics.ChipDistributionAnalyzer（参考实现）的算法一致（三角形分布、换手率衰减），
+用数组运算代替逐行iterrows和逐价格区间的Python循环，可直接替换原分析器使用
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 逐根推进筹码分布时，价格区间不变的情况下最多连续推进的K线数，之后重新完整计算一次以消除累积的浮点误差
+REANCHOR_INTERVAL = 120
+
+
+def build_price_range(min_price: float, max_price: float, factor: int) -> Tuple[np.ndarray, float]:
+    """
+    生成价格区间，与原分析器相同：精度至少0.01，价格保留两位小数
+
+    Returns:
+        (价格区间数组, 价格精度)
+    """
+    accuracy = max(0.01, (max_price - min_price) / (factor - 1))
+    prices = np.round(min_price + accuracy * np.arange(factor), 2)
+    return prices, accuracy
+
+
+def build_price_ranges(min_prices: np.ndarray, max_prices: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    为多只股票分别生成价格区间，每只股票的结果与build_price_range相同
+
+    Returns:
+        (形状为(股票数, 价格区间数)的价格区间矩阵, 每只股票的价格精度)
+    """
+    accuracies = np.maximum(0.01, (max_prices - min_prices) / (factor - 1))
+    prices = np.round(min_prices[:, None] + accuracies[:, None] * np.arange(factor), 2)
+    return prices, accuracies
+
+
+def triangular_contributions(
+    opens: np.ndarray,
+    closes: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    turnovers: np.ndarray,
+    prices: np.ndarray,
+    min_price: float,
+    accuracy: float,
+    bins: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    计算每根K线按三角形分布新增的筹码（未衰减）
+
+    单只股票时K线数组为一维、prices为一维、min_price/accuracy为标量；
+    多只股票时K线数组形状为(股票数, K线数)、prices为(股票数, 价格区间数)、min_price/accuracy为每只股票的数组
+
+    Args:
+        opens/closes/highs/lows: K线价格数组
+        turnovers: 换手率（0~1）
+        prices: 价格区间数组
+        min_price: 价格区间的最低价
+        accuracy: 价格精度
+        bins: prices在完整价格区间中的位置索引，只计算部分价格区间时使用，默认prices即完整价格区间
+
+    Returns:
+        形状为(K线数, 价格区间数)或(股票数, K线数, 价格区间数)的新增筹码
+    """
+    if bins is None:
+        bins = np.arange(prices.shape[-1])
+    min_price = np.asarray(min_price)[..., None]
+    accuracy = np.asarray(accuracy)[..., None]
+    avgs = (opens + closes + highs + lows) / 4
+    low_idx = np.maximum(0, ((lows - min_price) / accuracy).astype(int))
+    high_idx = np.minimum(bins[-1], ((highs - min_price) / accuracy).astype(int))
+
+    p = prices[..., None, :]
+    low = lows[..., None]
+    high = highs[..., None]
+    avg = avgs[..., None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 均价以下从最低价线性上升，均价以上向最高价线性下降
+        weights = np.where(p <= avg, (p - low) / (avg - low), (high - p) / (high - avg))
+
+        in_range = (bins >= low_idx[..., None]) & (bins <= high_idx[..., None])
+        contributions = np.where(in_range, weights, 0.0) * turnovers[..., None]
+
+    # 一字板特殊处理：全部筹码的一半落在唯一价格上
+    flat = highs == lows
+    if flat.any():
+        flat_idx = ((highs - min_price) / accuracy).astype(int)
+        contributions[flat] = np.where(bins == flat_idx[flat][:, None], turnovers[flat][:, None] / 2, 0.0)
+    return contributions
+
+
+def decay_weights(turnovers: np.ndarray) -> np.ndarray:
+    """
+    每根K线新增筹码经过之后所有K线换手衰减后的剩余比例，即prod(1 - 之后每根K线的换手率)，
+    多只股票时按最后一维（K线）分别计算
+    """
+    remaining = np.ones(turnovers.shape)
+    if turnovers.shape[-1] > 1:
+        remaining[..., :-1] = np.cumprod((1 - turnovers)[..., ::-1], axis=-1)[..., ::-1][..., 1:]
+    return remaining
+
+
+def cost_range(prices: np.ndarray, distribution: np.ndarray, total_weight: float, threshold: float) -> Tuple[Tuple[float, float], float]:
+    """
+    计算指定比例的成本区间：按筹码量从多到少累加价格区间，直到达到阈值
+
+    Returns:
+        (成本区间元组, 集中度)
+    """
+    # 稳定排序，筹码量相同时保持价格顺序，与原分析器的sorted一致
+    order = np.argsort(-distribution, kind='stable')
+    reached = np.cumsum(distribution[order]) >= threshold * total_weight
+    stop = int(np.argmax(reached)) if reached.any() else len(order) - 1
+    selected = prices[order[:stop + 1]]
+    cost_low = float(selected.min())
+    cost_high = float(selected.max())
+
+    concentration = (
+        (cost_high - cost_low) / (cost_high + cost_low) * 100
+        if cost_high + cost_low > 0 else 0
+    )
+    return (cost_low, cost_high), concentration
+
+
+def distribution_metrics(prices: np.ndarray, distribution: np.ndarray, current_price: float,
+                         include_distribution: bool = True) -> Dict:
+    """
+    计算筹码分布的各项指标（获利比例、平均成本、90%/70%成本区间和集中度）
+
+    Args:
+        include_distribution: 是否在结果中包含prices和distribution列表
+
+    Returns:
+        与ChipDistributionAnalyzer._calculate_distribution_metrics格式相同的字典
+    """
+    total_weight = distribution.sum()
+    if total_weight == 0:
+        result = {
+            'profit_ratio': 0,
+            'avg_cost': 0,
+            'cost_90_range': (0, 0),
+            'concentration_90': 0,
+            'cost_70_range': (0, 0),
+            'concentration_70': 0,
+            'current_price': current_price
+        }
+        if include_distribution:
+            result['prices'] = prices.tolist()
+            result['distribution'] = distribution.tolist()
+        return result
+
+    # 获利比例：当前价格及以下的筹码占比
+    profit_ratio = float(distribution[prices <= current_price].sum() / total_weight)
+    avg_cost = float(np.dot(prices, distribution) / total_weight)
+    cost_90_range, concentration_90 = cost_range(prices, distribution, total_weight, 0.9)
+    cost_70_range, concentration_70 = cost_range(prices, distribution, total_weight, 0.7)
+
+    result = {
+        'current_price': current_price,
+        'profit_ratio': profit_ratio,
+        'avg_cost': avg_cost,
+        'cost_90_range': cost_90_range,
+        'concentration_90': concentration_90,
+        'cost_70_range': cost_70_range,
+        'concentration_70': concentration_70
+    }
+    if include_distribution:
+        result['prices'] = prices.tolist()
+        result['distribution'] = distribution.tolist()
+    return result
+
+
+def batch_distribution_metrics(prices: np.ndarray, distributions: np.ndarray, current_prices: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    同时计算多只股票的筹码分布指标，每只股票的结果与distribution_metrics相同
+
+    Args:
+        prices: 形状为(股票数, 价格区间数)的价格区间矩阵
+        distributions: 形状为(股票数, 价格区间数)的筹码分布矩阵
+        current_prices: 每只股票的当前价格
+
+    Returns:
+        指标名到每只股票指标数组的映射，成本区间拆分为cost_90_low/cost_90_high等
+    """
+    total = distributions.sum(axis=1)
+    valid = total != 0
+    safe_total = np.where(valid, total, 1)
+
+    result = {
+        'profit_ratio': np.where(prices <= current_prices[:, None], distributions, 0).sum(axis=1) / safe_total,
+        'avg_cost': (prices * distributions).sum(axis=1) / safe_total,
+    }
+
+    # 按筹码量从多到少排序（稳定排序），累加到阈值为止的价格区间构成成本区间
+    order = np.argsort(-distributions, axis=1, kind='stable')
+    cumulative = np.cumsum(np.take_along_axis(distributions, order, axis=1), axis=1)
+    sorted_prices = np.take_along_axis(prices, order, axis=1)
+    ranks = np.arange(prices.shape[1])
+    for threshold, name in ((0.9, '90'), (0.7, '70')):
+        reached = cumulative >= threshold * total[:, None]
+        stop = np.where(reached.any(axis=1), reached.argmax(axis=1), prices.shape[1] - 1)
+        selected = ranks[None, :] <= stop[:, None]
+        low = np.where(selected, sorted_prices, np.inf).min(axis=1)
+        high = np.where(selected, sorted_prices, -np.inf).max(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            concentration = np.where(low + high > 0, (high - low) / (low + high) * 100, 0)
+        result[f'cost_{name}_low'] = low
+        result[f'cost_{name}_high'] = high
+        result[f'concentration_{name}'] = concentration
+
+    # 没有筹码的股票所有指标为0，与distribution_metrics一致
+    for key in result:
+        result[key] = np.where(valid, result[key], 0)
+    return result
+
+
+def adaptive_distribution(opens: np.ndarray, closes: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+                          turnovers: np.ndarray, current_price: float, accuracy_factor: int = 150,
+                          coarse_bins: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按价格波动范围和最小价位自适应计算一个窗口的筹码分布
+
+    价格精度达到最小价位0.01时，最高价以上的价格区间没有筹码，只保留到最高价的价格区间（结果不变）；
+    指定coarse_bins时先在约coarse_bins个价格区间上计算再线性插值（粗网格间距受K线振幅限制，
+    窄幅波动时退回完整精度），只在当前价格和90%/70%成本区间边界所在的区间内按完整精度重新计算
+
+    Args:
+        opens/closes/highs/lows/turnovers: 窗口内的K线数组
+        current_price: 当前价格
+        accuracy_factor: 精度因子（完整精度的价格区间数）
+        coarse_bins: 粗网格的价格区间数，None表示不插值，结果与固定网格相同
+
+    Returns:
+        (价格区间数组, 筹码分布数组)
+    """
+    min_price = lows.min()
+    max_price = highs.max()
+    accuracy = max(0.01, (max_price - min_price) / (accuracy_factor - 1))
+    size = min(accuracy_factor, int((max_price - min_price) / accuracy) + 1)
+    prices = np.round(min_price + accuracy * np.arange(size), 2)
+    decay = decay_weights(turnovers)
+
+    def evaluate(bins):
+        return decay @ triangular_contributions(opens, closes, highs, lows, turnovers, prices[bins], min_price, accuracy, bins)
+
+    # 粗网格间距不超过K线典型振幅的1/4，否则窄幅K线的三角形分布会被插值抹平
+    stride = -(-size // coarse_bins) if coarse_bins else 1
+    stride = min(stride, int(np.median(highs - lows) / accuracy / 4))
+    if stride <= 1:
+        return prices, evaluate(np.arange(size))
+
+    coarse = np.arange(0, size, stride)
+    if coarse[-1] != size - 1:
+        coarse = np.append(coarse, size - 1)
+    distribution = np.interp(np.arange(size), coarse, evaluate(coarse))
+
+    # 需要完整精度的区间：当前价格所在区间，以及插值结果的成本区间边界所在区间
+    cells = set()
+    below = int(np.searchsorted(prices, current_price, side='right')) - 1
+    if 0 <= below < size - 1:
+        cells.add(below // stride)
+    total = distribution.sum()
+    for threshold in (0.9, 0.7):
+        bounds, _ = cost_range(prices, distribution, total, threshold)
+        cells.update(int(i) // stride for i in np.searchsorted(prices, bounds))
+    fine = np.unique(np.concatenate([np.arange(c * stride, min((c + 1) * stride, size - 1) + 1) for c in cells]))
+    distribution[fine] = evaluate(fine)
+    return prices, distribution
+
+
+# 各接口可选的精度档位：(精度因子, 粗网格价格区间数)，粗网格为None时按完整精度计算
+# 各档位的耗时和误差见python bench_chip_resolution.py
+CHIP_RESOLUTIONS = {
+    'standard': (150, None),
+    'fine': (600, 150),
+    'precise': (600, None)
+}
+
+
+class NumpyChipDistributionAnalyzer:
+    """NumPy实现的筹码分布分析器，接口与ChipDistributionAnalyzer相同"""
+
+    def __init__(self, kdata: pd.DataFrame, accuracy_factor: int = 150, calc_range: Optional[int] = None):
+        """
+        初始化筹码分布分析器
+
+        Args:
+            kdata: K线数据，必须包含 [开盘, 收盘, 最高, 最低, 成交量, 换手率] 等字段
+            accuracy_factor: 精度因子，决定价格分割的精度
+            calc_range: 计算的K线范围，默认使用全部数据
+        """
+        required_columns = ['开盘', '收盘', '最高', '最低', '成交量', '换手率']
+        missing_columns = [col for col in required_columns if col not in kdata.columns]
+        if missing_columns:
+            raise ValueError(f"K线数据缺少必要字段: {missing_columns}")
+
+        self.kdata = kdata
+        self.factor = accuracy_factor
+        self.range = calc_range
+
+        # 一次性转换为数组，计算时只做切片
+        self.opens = kdata['开盘'].to_numpy(dtype=float)
+        self.closes = kdata['收盘'].to_numpy(dtype=float)
+        self.highs = kdata['最高'].to_numpy(dtype=float)
+        self.lows = kdata['最低'].to_numpy(dtype=float)
+        rates = kdata['换手率'].to_numpy(dtype=float) / 100
+        # 与min(1, 换手率/100)一致：换手率缺失时按全部换手处理
+        self.turnovers = np.where(rates < 1, rates, 1.0)
+        self.dates = kdata['日期'].tolist() if '日期' in kdata.columns else None
+
+    def window(self, index: int) -> slice:
+        """指定位置参与计算的K线范围"""
+        start = max(0, index - self.range + 1) if self.range else 0
+        return slice(start, index + 1)
+
+    def _contributions(self, rows: slice, prices: np.ndarray, min_price: float, accuracy: float) -> np.ndarray:
+        """指定K线在给定价格区间上新增的筹码"""
+        return triangular_contributions(
+            self.opens[rows], self.closes[rows], self.highs[rows], self.lows[rows],
+            self.turnovers[rows], prices, min_price, accuracy
+        )
+
+    def distribution_at(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算指定位置的筹码分布
+
+        Returns:
+            (价格区间数组, 筹码分布数组)
+        """
+        w = self.window(index)
+        min_price = self.lows[w].min()
+        prices, accuracy = build_price_range(min_price, self.highs[w].max(), self.factor)
+        return prices, decay_weights(self.turnovers[w]) @ self._contributions(w, prices, min_price, accuracy)
+
+    def iter_distributions(self, start: int = 0) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        从start开始逐根K线推进筹码分布
+
+        窗口的最高价和最低价不变时价格区间不变，只需衰减已有筹码、加上新K线的筹码、
+        减去移出窗口的K线剩余的筹码；价格区间变化时才对整个窗口重新计算
+
+        Yields:
+            (K线位置索引, 价格区间数组, 筹码分布数组)
+        """
+        grid = None
+        steps = 0
+        for i in range(max(0, start), len(self.closes)):
+            w = self.window(i)
+            min_price = self.lows[w].min()
+            max_price = self.highs[w].max()
+
+            if grid != (min_price, max_price) or steps >= REANCHOR_INTERVAL:
+                # 价格区间变化（或推进次数达到上限），整个窗口重新计算
+                prices, accuracy = build_price_range(min_price, max_price, self.factor)
+                distribution = decay_weights(self.turnovers[w]) @ self._contributions(w, prices, min_price, accuracy)
+                grid = (min_price, max_price)
+                steps = 0
+            else:
+                distribution = distribution * (1 - self.turnovers[i]) + self._contributions(slice(i, i + 1), prices, min_price, accuracy)[0]
+                if w.start > 0 and self.range:
+                    # 移出窗口的K线经过之后每根K线换手衰减后剩余的筹码
+                    leaving = w.start - 1
+                    remaining = np.prod(1 - self.turnovers[leaving + 1:i + 1])
+                    distribution -= self._contributions(slice(leaving, leaving + 1), prices, min_price, accuracy)[0] * remaining
+                steps += 1
+
+            yield i, prices, distribution
+
+    def calculate_series(self, start: int = 0) -> List[Dict]:
+        """
+        一次计算从start到最后一根K线的筹码分布指标序列
+
+        Args:
+            start: 起始K线位置索引，只需要最近几天的指标时可以跳过前面的K线
+
+        Returns:
+            每根K线的指标列表，包含date、current_price、profit_ratio、avg_cost、
+            cost_90_range、concentration_90、cost_70_range、concentration_70
+        """
+        results = []
+        for i, prices, distribution in self.iter_distributions(start):
+            metrics = distribution_metrics(prices, distribution, self.closes[i], include_distribution=False)
+            metrics['date'] = self.dates[i] if self.dates is not None else i
+            results.append(metrics)
+        return results
+
+    def calculate_metrics(self, index: int, coarse_bins: Optional[int] = None) -> Dict:
+        """
+        用自适应分辨率计算指定位置的筹码指标（不含prices和distribution）
+
+        Args:
+            index: K线位置索引
+            coarse_bins: 粗网格的价格区间数，None时结果与calculate_chip_distribution相同
+
+        Returns:
+            包含筹码指标的字典
+        """
+        w = self.window(index)
+        prices, distribution = adaptive_distribution(
+            self.opens[w], self.closes[w], self.highs[w], self.lows[w], self.turnovers[w],
+            self.closes[index], self.factor, coarse_bins
+        )
+        result = distribution_metrics(prices, distribution, self.closes[index], include_distribution=False)
+        if self.dates is not None:
+            result['date'] = self.dates[index]
+        return result
+
+    def calculate_chip_distribution(self, index: int) -> Dict:
+        """
+        计算指定位置的筹码分布
+
+        Args:
+            index: K线位置索引
+
+        Returns:
+            包含筹码分布结果的字典
+        """
+        prices, distribution = self.distribution_at(index)
+        result = distribution_metrics(prices, distribution, self.closes[index])
+        if self.dates is not None:
+            result['date'] = self.dates[index]
+        return result
+
+
+if __name__ == '__main__':
+    # 与原分析器对比结果和耗时：python chip_kernel.py
+    import time
+    from chip_analytics import ChipDistributionAnalyzer
+
+    rng = np.random.default_rng(0)
+    n = 250
+    closes = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    opens = closes * (1 + rng.normal(0, 0.01, n))
+    kdata = pd.DataFrame({
+        '日期': pd.date_range('2024-01-01', periods=n, freq='B').strftime('%Y-%m-%d'),
+        '开盘': opens.round(2),
+        '收盘': closes.round(2),
+        '最高': (np.maximum(opens, closes) * (1 + rng.uniform(0, 0.02, n))).round(2),
+        '最低': (np.minimum(opens, closes) * (1 - rng.uniform(0, 0.02, n))).round(2),
+        '成交量': rng.integers(10000, 1000000, n),
+        '换手率': rng.uniform(0.5, 15, n).round(2),
+    })
+
+    for factor, calc_range in ((150, 120), (100, 60)):
+        original = ChipDistributionAnalyzer(kdata, accuracy_factor=factor, calc_range=calc_range)
+        vectorized = NumpyChipDistributionAnalyzer(kdata, accuracy_factor=factor, calc_range=calc_range)
+
+        started = time.perf_counter()
+        expected = [original.calculate_chip_distribution(i) for i in range(n)]
+        original_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = [vectorized.calculate_chip_distribution(i) for i in range(n)]
+        vectorized_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        series = vectorized.calculate_series()
+        series_time = time.perf_counter() - started
+
+        max_diff = max(
+            abs(a[key] - e[key])
+            for results in (actual, series)
+            for a, e in zip(results, expected)
+            for key in ('profit_ratio', 'avg_cost', 'concentration_90', 'concentration_70')
+        )
+        print(f"accuracy_factor={factor}, calc_range={calc_range}: "
+              f"原实现{original_time:.3f}s, NumPy实现{vectorized_time:.3f}s, 逐根推进序列{series_time:.3f}s, "
+              f"加速{original_time / series_time:.1f}倍, 指标最大差异{max_diff:.2e}")
@@ -3,12 +3,13 @@ import datetime
 import db
 import logging
 import sqlite3
+import upstream
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# API基本URL
-BASE_URL = "https://flash-api.xuangubao.com.cn/api/surge_stock/stocks"
+# API基本URL（可通过环境变量XUANGUBAO_BASE修改服务地址）
+BASE_URL = upstream.SURGE_STOCK_API_URL
 
 # 请求头，模拟浏览器请求
 HEADERS = {
@@ -2,13 +2,15 @@ import sqlite3
 import os
 import logging
 import time
-from pypinyin import lazy_pinyin, Style
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# 数据库文件路径
-DB_PATH = "stock_data.db"
+# 数据库文件路径（Serverless环境下为复制到临时目录的快照）
+DB_PATH = os.environ.get('STOCK_DB_PATH', "stock_data.db")
+
+# 数据库是预先生成汇总表的快照时，各汇总模块跳过每个进程第一次查询时的补齐检查
+SNAPSHOT_MODE = os.environ.get('DB_SNAPSHOT') == '1'
 
 def init_db():
     """初始化数据库"""
@@ -149,6 +151,57 @@ def store_stock_data(date_str, stock_data):
         logging.error(f"存储数据失败: {e}")
     finally:
         conn.close()
+    
+    # 更新由每日数据派生的汇总表
+    _after_ingest(date_str)
+
+def _after_ingest(date_str):
+    """某一天的数据写入后更新派生的汇总表，失败时只记录日志，不影响原始数据"""
+    # 汇总模块依赖本模块，在函数内导入避免循环导入
+    import plate_stats
+    import stock_index
+    import bitmap_index
+    
+    refreshers = (
+        ('题材统计', plate_stats.refresh_date),
+        ('股票索引', stock_index.refresh_date),
+        ('上榜位图', bitmap_index.refresh_date)
+    )
+    for label, refresh in refreshers:
+        try:
+            refresh(date_str)
+        except Exception as e:
+            logging.error(f"更新{date_str}的{label}失败: {e}")
+    _bump_data_version()
+
+def _bump_data_version():
+    """数据版本加1，缓存的页面等按数据版本判断是否过期"""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS data_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+            conn.execute("INSERT INTO data_version (id, version) VALUES (1, 1) ON CONFLICT(id) DO UPDATE SET version = version + 1")
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.error(f"更新数据版本失败: {e}")
+
+def get_data_version():
+    """获取数据版本（每次写入某一天的数据后加1），读取失败时返回None"""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else 0
+    except sqlite3.OperationalError:
+        # 还没有写入过数据时表不存在
+        return 0
+    except Exception as e:
+        logging.error(f"获取数据版本失败: {e}")
+        return None
 
 def get_all_stock_data():
     """获取所有日期的股票数据，按日期降序排列（去重）"""
@@ -397,6 +450,10 @@ def get_available_dates():
     finally:
         conn.close()
 
+def split_plates(plates):
+    """拆分顿号分隔的题材，去除空白和重复（题材数量、题材热度和各题材统计共用，保证排序口径一致）"""
+    return list(dict.fromkeys(p.strip() for p in (plates or '').split('、') if p.strip()))
+
 # 题材计数缓存
 plate_counts_cache = {
     'data': {},
@@ -439,13 +496,10 @@ def sort_stocks_by_plates(stocks):
                 cursor.execute(f"SELECT plates FROM {table_name}")
                 rows = cursor.fetchall()
                 
-                # 统计每个题材的出现次数
+                # 统计每个题材的出现次数（同一只股票的重复题材只计一次）
                 for row in rows:
-                    plates = row[0]
-                    if plates:
-                        plate_list = plates.split('、')
-                        for plate in plate_list:
-                            plate_counts[plate] = plate_counts.get(plate, 0) + 1
+                    for plate in split_plates(row[0]):
+                        plate_counts[plate] = plate_counts.get(plate, 0) + 1
         finally:
             conn.close()
         
@@ -456,10 +510,9 @@ def sort_stocks_by_plates(stocks):
     # 创建一个列表，包含股票和它们的排序键
     stocks_with_keys = []
     for stock in stocks:
-        plates = stock.get('plates', '')
-        if plates:
+        plate_list = split_plates(stock.get('plates'))
+        if plate_list:
             # 计算题材数量
-            plate_list = plates.split('、')
             plate_count = len(plate_list)
             
             # 计算该股票所属题材的总出现次数
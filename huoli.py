@@ -1,395 +1,10 @@
 import pandas as pd
 import numpy as np
 import requests
-import json
-from typing import Dict, List, Tuple, Optional
-
-class ChipDistributionAnalyzer:
-    """筹码分布分析器"""
-    
-    def __init__(self, kdata: pd.DataFrame, accuracy_factor: int = 150, calc_range: Optional[int] = None):
-        """
-        初始化筹码分布分析器
-        
-        Args:
-            kdata: K线数据，必须包含 [开盘, 收盘, 最高, 最低, 成交量, 换手率] 等字段
-            accuracy_factor: 精度因子，决定价格分割的精度
-            calc_range: 计算的K线范围，默认使用全部数据
-        """
-        self._validate_data(kdata)
-        self.kdata = kdata
-        self.factor = accuracy_factor
-        self.range = calc_range
-
-    def _validate_data(self, kdata: pd.DataFrame) -> None:
-        """
-        验证输入数据的完整性
-        
-        Args:
-            kdata: 待验证的K线数据
-            
-        Raises:
-            ValueError: 当数据不完整或格式不正确时抛出
-        """
-        required_columns = ['开盘', '收盘', '最高', '最低', '成交量', '换手率']
-        missing_columns = [col for col in required_columns if col not in kdata.columns]
-        if missing_columns:
-            raise ValueError(f"K线数据缺少必要字段: {missing_columns}")
-
-    def calculate_chip_distribution(self, index: int) -> Dict:
-        """
-        计算指定位置的筹码分布
-        
-        Args:
-            index: K线位置索引
-            
-        Returns:
-            包含筹码分布结果的字典
-        """
-        # 确定计算范围
-        start = max(0, index - self.range + 1) if self.range else 0
-        kdata = self.kdata.iloc[start:index + 1]
-        
-        # 确定价格范围
-        max_price = max(kdata['最高'].values)
-        min_price = min(kdata['最低'].values)
-        
-        # 计算精度
-        accuracy = max(0.01, (max_price - min_price) / (self.factor - 1))
-        
-        # 初始化分布数组
-        price_range = [round(min_price + accuracy * i, 2) for i in range(self.factor)]
-        distribution = [0] * self.factor
-        
-        # 计算每个K线的贡献
-        for _, row in kdata.iterrows():
-            distribution = self._calculate_k_line_contribution(
-                row, distribution, min_price, accuracy, price_range
-            )
-        
-        return self._calculate_distribution_metrics(
-            distribution, price_range, self.kdata['收盘'].iloc[index]
-        )
-
-    def _calculate_k_line_contribution(
-        self, 
-        kline: pd.Series, 
-        distribution: List[float],
-        min_price: float,
-        accuracy: float,
-        price_range: List[float]
-    ) -> List[float]:
-        """
-        计算单个K线对筹码分布的贡献
-        
-        Args:
-            kline: 单个K线数据
-            distribution: 现有筹码分布
-            min_price: 最小价格
-            accuracy: 价格精度
-            price_range: 价格范围数组
-            
-        Returns:
-            更新后的筹码分布
-        """
-        open_price = kline['开盘']
-        close_price = kline['收盘']
-        high_price = kline['最高']
-        low_price = kline['最低']
-        turnover_rate = min(1, kline['换手率'] / 100)
-        
-        # 计算平均价格
-        avg_price = (open_price + close_price + high_price + low_price) / 4
-        
-        # 计算价格区间索引
-        low_idx = max(0, int((low_price - min_price) / accuracy))
-        high_idx = min(self.factor - 1, int((high_price - min_price) / accuracy))
-        
-        # 衰减现有筹码
-        distribution = [d * (1 - turnover_rate) for d in distribution]
-        
-        # 一字板特殊处理
-        if high_price == low_price:
-            idx = int((high_price - min_price) / accuracy)
-            distribution[idx] += turnover_rate / 2
-        else:
-            # 计算三角形分布
-            for idx in range(low_idx, high_idx + 1):
-                price = price_range[idx]
-                if price <= avg_price:
-                    weight = (price - low_price) / (avg_price - low_price)
-                else:
-                    weight = (high_price - price) / (high_price - avg_price)
-                distribution[idx] += weight * turnover_rate
-                
-        return distribution
-
-    def _calculate_distribution_metrics(
-        self,
-        distribution: List[float],
-        price_range: List[float],
-        current_price: float
-    ) -> Dict:
-        """
-        计算筹码分布的各项指标
-        
-        Args:
-            distribution: 筹码分布数组
-            price_range: 价格范围数组
-            current_price: 当前价格
-            
-        Returns:
-            包含各项指标的字典
-        """
-        total_weight = sum(distribution)
-        if total_weight == 0:
-            return {
-                'profit_ratio': 0,
-                'avg_cost': 0,
-                'cost_90_range': (0, 0),
-                'concentration_90': 0,
-                'cost_70_range': (0, 0),
-                'concentration_70': 0,
-                'prices': price_range,
-                'distribution': distribution,
-                'current_price': current_price
-            }
-
-        # 计算平均成本
-        avg_cost = sum(p * d for p, d in zip(price_range, distribution)) / total_weight
-        
-        # 计算获利比例 - 正确的逻辑应该是计算当前价格以下的筹码占比
-        # 因为如果当前价格高于买入成本，那么这个筹码就是获利的
-        profit_ratio = sum(d for p, d in zip(price_range, distribution) if p <= current_price) / total_weight
-        
-        # 计算成本区间
-        cost_90_range, concentration_90 = self._calculate_cost_range(
-            price_range, distribution, total_weight, 0.9
-        )
-        cost_70_range, concentration_70 = self._calculate_cost_range(
-            price_range, distribution, total_weight, 0.7
-        )
-        
-        return {
-            'prices': price_range,
-            'distribution': distribution,
-            'current_price': current_price,
-            'profit_ratio': profit_ratio,
-            'avg_cost': avg_cost,
-            'cost_90_range': cost_90_range,
-            'concentration_90': concentration_90,
-            'cost_70_range': cost_70_range,
-            'concentration_70': concentration_70
-        }
-
-    def _calculate_cost_range(
-        self,
-        price_range: List[float],
-        distribution: List[float],
-        total_weight: float,
-        threshold: float
-    ) -> Tuple[Tuple[float, float], float]:
-        """
-        计算指定比例的成本区间
-        
-        Args:
-            price_range: 价格范围数组
-            distribution: 筹码分布数组
-            total_weight: 总权重
-            threshold: 阈值(如0.9表示90%)
-            
-        Returns:
-            (成本区间元组, 集中度)
-        """
-        sorted_prices = sorted(
-            [(p, d) for p, d in zip(price_range, distribution)],
-            key=lambda x: x[1],
-            reverse=True
-        )
-        
-        cumsum = 0
-        cost_low = float('inf')
-        cost_high = float('-inf')
-        
-        for price, dist in sorted_prices:
-            cumsum += dist
-            cost_low = min(cost_low, price)
-            cost_high = max(cost_high, price)
-            if cumsum >= threshold * total_weight:
-                break
-                
-        concentration = (
-            (cost_high - cost_low) / (cost_high + cost_low) * 100 
-            if cost_high + cost_low > 0 else 0
-        )
-        
-        return (cost_low, cost_high), concentration
-
-    def visualize_chip_distribution(self, chip_distribution: Dict, title_prefix: str = "") -> None:
-        """
-        可视化筹码分布
-        
-        Args:
-            chip_distribution: 筹码分布数据
-            title_prefix: 标题前缀
-        """
-        try:
-            import matplotlib.pyplot as plt
-        except ImportError:
-            print("matplotlib未安装，无法显示图表")
-            return
-        
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # 绘制筹码分布
-        for i in range(len(chip_distribution['prices'])):
-            color = 'red' if chip_distribution['prices'][i] < chip_distribution['current_price'] else 'green'
-            ax.barh(
-                chip_distribution['prices'][i],
-                chip_distribution['distribution'][i],
-                color=color,
-                alpha=0.6,
-                edgecolor='none'
-            )
-
-        # 设置标题和标签
-        title = f"筹码分布图: {title_prefix}\n"
-        title += f"当前股价: {chip_distribution['current_price']:.2f}  "
-        title += f"获利比例: {chip_distribution['profit_ratio']*100:.2f}%"
-        
-        ax.set_title(title, fontsize=12)
-        ax.set_xlabel('筹码占比', fontsize=10)
-        ax.set_ylabel('价格', fontsize=10)
-        
-        # 添加指标说明
-        text_content = (
-            f"获利比例: {chip_distribution['profit_ratio']*100:.2f}%\n"
-            f"平均成本: {chip_distribution['avg_cost']:.2f}\n"
-            f"90%成本: {chip_distribution['cost_90_range'][0]:.2f}-{chip_distribution['cost_90_range'][1]:.2f}\n"
-            f"集中度: {chip_distribution['concentration_90']:.2f}%\n"
-            f"70%成本: {chip_distribution['cost_70_range'][0]:.2f}-{chip_distribution['cost_70_range'][1]:.2f}\n"
-            f"集中度: {chip_distribution['concentration_70']:.2f}%"
-        )
-        
-        plt.text(
-            1.02, 0.5,
-            text_content,
-            transform=ax.transAxes,
-            verticalalignment='center',
-            bbox=dict(boxstyle='round', facecolor='white', alpha=0.8)
-        )
-
-        ax.grid(True, linestyle='--', alpha=0.3)
-        plt.show()
-
-    def calculate_all_distributions(self) -> List[Dict]:
-        """
-        计算所有K线的筹码分布指标
-        
-        Returns:
-            所有K线的筹码分布指标列表，每个元素包含:
-            - profit_ratio: 获利比例
-            - avg_cost: 平均成本
-            - concentration_70: 70%筹码集中度
-            - concentration_90: 90%筹码集中度
-        """
-        results = []
-        min_price = min(self.kdata['最低'])
-        max_price = max(self.kdata['最高'])
-        price_step = (max_price - min_price) / (self.factor - 1)
-        
-        # 预先计算价格区间
-        price_ranges = [round(min_price + price_step * i, 2) for i in range(self.factor)]
-        
-        # 初始化筹码分布
-        distribution = [0] * self.factor
-        
-        for i in range(len(self.kdata)):
-            k_line = self.kdata.iloc[i]
-            current_price = k_line['收盘']
-            
-            # 更新当前K线的筹码分布
-            distribution = self._calculate_k_line_contribution(
-                k_line,
-                distribution,
-                min_price,
-                price_step,
-                price_ranges
-            )
-            
-            # 计算关键指标
-            metrics = self._calculate_key_metrics(distribution, price_ranges, current_price)
-            results.append(metrics)
-        
-        return results
-
-    def _calculate_key_metrics(self, distribution: List[float], price_ranges: List[float], 
-                             current_price: float) -> Dict:
-        """
-        计算关键筹码分布指标
-        
-        Args:
-            distribution: 筹码分布列表
-            price_ranges: 价格区间列表
-            current_price: 当前价格
-            
-        Returns:
-            包含关键指标的字典
-        """
-        total_chips = sum(distribution)
-        if total_chips == 0:
-            return {
-                'profit_ratio': 0,
-                'avg_cost': current_price,
-                'concentration_70': 0,
-                'concentration_90': 0
-            }
-        
-        # 1. 计算获利比例 - 修复逻辑：价格低于当前价格的筹码才是获利的
-        profit_chips = sum(d for i, d in enumerate(distribution) 
-                          if price_ranges[i] < current_price)  # 移除等号，使用严格小于
-        profit_ratio = profit_chips / total_chips
-        
-        # 2. 计算平均成本
-        avg_cost = sum(price * dist for price, dist in zip(price_ranges, distribution)) / total_chips
-        
-        # 3. 计算70%筹码集中度
-        target_chips = total_chips * 0.7
-        accumulated_chips = 0
-        price_range_count = 0
-        
-        #
-        sorted_dist = sorted(zip(price_ranges, distribution), 
-                            key=lambda x: x[1], reverse=True)
-        
-        for _, chips in sorted_dist:
-            accumulated_chips += chips
-            price_range_count += 1
-            if accumulated_chips >= target_chips:
-                break
-        
-        concentration_70 = price_range_count / self.factor
-        
-        # 4. 计算90%筹码集中度
-        target_chips = total_chips * 0.9
-        accumulated_chips = 0
-        price_range_count = 0
-        
-        for _, chips in sorted_dist:
-            accumulated_chips += chips
-            price_range_count += 1
-            if accumulated_chips >= target_chips:
-                break
-        
-        concentration_90 = price_range_count / self.factor
-        
-        return {
-            'profit_ratio': profit_ratio,
-            'avg_cost': avg_cost,
-            'concentration_70': concentration_70,
-            'concentration_90': concentration_90
-        }
-
+import upstream
+import chip_analytics
+# 筹码分布分析器已合并到chip_analytics，保留原导入路径
+from chip_analytics import ChipDistributionAnalyzer
 
 # 从东方财富API获取股票数据 - 增强版
 def get_stock_data_from_api(stock_code="301629", secid=None, end=None, lmt=120):
@@ -405,55 +20,23 @@ def get_stock_data_from_api(stock_code="301629", secid=None, end=None, lmt=120):
     Returns:
         包含股票历史数据的DataFrame
     """
-    # 根据股票代码生成secid（如果没有提供）
-    if secid is None:
-        if stock_code.startswith('6'):
-            secid = f'1.{stock_code}'
-        else:
-            secid = f'0.{stock_code}'
-    
     # 获取今天的日期（如果没有提供结束日期）
     if end is None:
         import datetime
         today = datetime.datetime.now()
         end = today.strftime('%Y%m%d')
     
-    # API调用
-    url = f"https://push2his.eastmoney.com/api/qt/stock/kline/get?secid={secid}&klt=101&fqt=1&lmt={lmt}&end={end}&iscca=1&fields1=f1,f2,f3,f4,f5&fields2=f51,f52,f53,f54,f55,f56,f57,f59,f61&ut=f057cbcbce2a86e2866ab8877db1d059&forcect=1"
-    
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        # 从本地K线库读取，只增量请求最后存储日期之后的K线
+        df = chip_analytics.load_kline_frame(stock_code, lmt, end=end, secid=secid)
         
-        if data.get('data') and data['data'].get('klines'):
-            klines = data['data']['klines']
-            
-            # 解析数据
-            stock_data = []
-            for kline in klines:
-                parts = kline.split(',')
-                stock_data.append({
-                    '日期': parts[0],
-                    '开盘': float(parts[1]),
-                    '收盘': float(parts[2]),
-                    '最高': float(parts[3]),
-                    '最低': float(parts[4]),
-                    '成交量': float(parts[5]),
-                    '成交额': float(parts[6]),
-                    '涨跌幅': float(parts[7]),
-                    '换手率': float(parts[8])
-                })
-            
-            # 创建DataFrame
-            df = pd.DataFrame(stock_data)
+        if not df.empty:
             # 将日期列设置为索引
             df['日期'] = pd.to_datetime(df['日期'])
             df.set_index('日期', inplace=True)
-            
             return df
         else:
-            print(f"获取股票数据失败: {data.get('message', '未知错误')}")
+            print(f"获取股票数据失败: 本地K线为空")
             return pd.DataFrame()
     
     except Exception as e:
@@ -467,65 +50,18 @@ from datetime import datetime, timedelta
 # 以下是修复后的get_stock_data_from_api_v2函数实现，确保返回正确格式的数据
 def get_stock_data_from_api_v2(stock_code="301629"):
     """从API获取股票数据，如果失败则返回模拟数据"""
-    # 注意：不再动态生成secid，而是直接使用固定格式
-    secid = "0." + stock_code
-    print(f"获取股票数据: {stock_code}, secid: {secid}")
-    
-    # 设置API URL - 使用正确的fields2参数确保只获取需要的字段
-    end_date = datetime.now().strftime("%Y%m%d")
-    # 只请求用户指定的字段：f51(日期),f52(开盘),f53(收盘),f54(最高),f55(最低),f56(成交量),f57(成交额),f59(涨跌幅),f61(换手率)
-    url = f"https://push2his.eastmoney.com/api/qt/stock/kline/get?secid={secid}&klt=101&fqt=1&lmt=250&end={end_date}&iscca=1&fields1=f1,f2,f3,f4,f5&fields2=f51,f52,f53,f54,f55,f56,f57,f59,f61&ut=f057cbcbce2a86e2866ab8877db1d059&forcect=1"
+    print(f"获取股票数据: {stock_code}")
     
     try:
-        # 设置请求头
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Accept-Encoding": "gzip, deflate",
-            "Accept": "*/*",
-            "Connection": "keep-alive"
-        }
-        
-        # 发送请求
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # 检查HTTP响应状态码
-        
-        # 解析响应数据
-        data = response.json()
-        
-        # 检查数据是否存在且格式正确
-        if data and data.get('data') and data['data'].get('klines'):
-            klines_data = data['data']['klines']
-            if len(klines_data) > 0:
-                # 使用正确的字段映射解析数据 - 根据用户提供的字段映射
-                stock_data = []
-                for kline in klines_data:
-                    parts = kline.split(',')
-                    if len(parts) >= 9:  # 确保有足够的数据
-                        stock_data.append({
-                            '日期': parts[0],     # f51
-                            '开盘': float(parts[1]), # f52
-                            '收盘': float(parts[2]), # f53
-                            '最高': float(parts[3]), # f54
-                            '最低': float(parts[4]), # f55
-                            '成交量': float(parts[5]), # f56
-                            '成交额': float(parts[6]), # f57
-                            '涨跌幅': float(parts[7]), # f59
-                            '换手率': float(parts[8])  # f61
-                        })
-                
-                # 转换为DataFrame
-                df = pd.DataFrame(stock_data)
-                if len(df) > 0:
-                    # 确保日期列格式正确
-                    df['日期'] = pd.to_datetime(df['日期'], errors='coerce')
-                    print(f"成功获取股票数据，数据量: {len(df)}行")
-                    return df
-                else:
-                    print(f"警告: 解析数据后为空")
-            else:
-                print(f"警告: API返回了空的K线数据")
+        # 从本地K线库读取，只增量请求最后存储日期之后的K线
+        df = chip_analytics.load_kline_frame(stock_code, 250)
+        if len(df) > 0:
+            # 确保日期列格式正确
+            df['日期'] = pd.to_datetime(df['日期'], errors='coerce')
+            print(f"成功获取股票数据，数据量: {len(df)}行")
+            return df
         else:
-            print(f"警告: API返回的数据格式不正确")
+            print(f"警告: 本地K线数据为空")
             
     except requests.exceptions.RequestException as e:
         print(f"API请求异常: {str(e)}")
@@ -582,39 +118,22 @@ def create_mock_data(stock_code):
 def get_profit_ratio_data(stock_code="301629", days=30):
     """获取股票获利比例数据，如果失败则返回模拟数据"""
     try:
-        # 尝试从API获取数据
-        from profit_ratio import get_stock_data_from_api
-        df = get_stock_data_from_api(stock_code, days=max(days + 30, 60))
+        # 从筹码指标缓存读取最后days天的序列，只计算缓存中缺失的交易日（NumPy实现，结果与ChipDistributionAnalyzer一致）
+        import chip_cache
+        secid = upstream.get_secid(stock_code)
+        series = chip_cache.get_metric_series(secid, days, accuracy_factor=100, calc_range=60)
         
         # 检查获取的数据是否足够
-        if len(df) < 5:
+        if len(series) < 5:
             print(f"警告: 数据量不足，使用模拟数据")
             return create_mock_profit_ratio_data(stock_code, days)
-            
-        # 创建ChipDistributionAnalyzer实例分析筹码分布
-        analyzer = ChipDistributionAnalyzer(df, accuracy_factor=100, calc_range=60)
-        
-        # 计算每一天的获利比例（计算所有数据）
-        profit_ratios = []
-        for i in range(len(df)):
-            try:
-                # 计算筹码分布
-                distribution_result = analyzer.calculate_chip_distribution(i)
-                
-                # 确保日期格式正确
-                date = df.iloc[i]['日期']
-                
-                profit_ratios.append({
-                    "date": pd.Timestamp(date).strftime('%Y-%m-%d'),
-                    "profit_ratio": float(distribution_result['profit_ratio'] * 100)
-                })
-            except Exception as e:
-                # 单个日期计算失败不影响整体
-                print(f"计算单日获利比例失败: {str(e)}")
-                continue
-        
-        # 只返回用户请求的天数的数据（最后days条）
-        returned_data = profit_ratios[-days:] if days <= len(profit_ratios) else profit_ratios
+        returned_data = [
+            {
+                "date": pd.Timestamp(item['date']).strftime('%Y-%m-%d'),  # 确保日期格式正确
+                "profit_ratio": float(item['profit_ratio'] * 100)
+            }
+            for item in series
+        ]
         
         # 如果计算结果不足days条，补充模拟数据
         while len(returned_data) < days:
@@ -0,0 +1,433 @@
+"""
+本地日K线存储模块
+按secid/复权类型把日K线增量保存到SQLite，只向东方财富请求最后存储日期之后的K线，
+供K线代理接口和获利比例（筹码分布）计算共用；
+同步流程的上游请求和SQLite读写拆分为独立的步骤，异步网关（asgi.py）用异步HTTP客户端执行同样的流程
+"""
+import os
+import sqlite3
+import logging
+import time
+import datetime
+import requests
+import upstream
+import quote_stream
+
+# K线缓存数据库文件路径（与stock_data.db分开，属于可随时重建的缓存）
+KLINE_DB_PATH = os.environ.get('KLINE_DB_PATH', "kline_data.db")
+
+# 东方财富K线API
+KLINE_API_URL = upstream.KLINE_API_URL
+
+# 请求的K线字段：日期,开盘,收盘,最高,最低,成交量,成交额,振幅,涨跌幅,涨跌额,换手率
+KLINE_FIELDS2 = "f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61"
+
+# 按列返回K线时的列名，与kline_daily表的字段和KLINE_FIELDS2的顺序一致
+KLINE_COLUMNS = ('date', 'open', 'close', 'high', 'low', 'volume', 'amount',
+                 'amplitude', 'change_pct', 'change_amt', 'turnover')
+
+# 首次同步时拉取的K线条数
+INITIAL_BARS = 500
+
+# 交易时间内两次同步之间的最小间隔（秒）
+SYNC_INTERVAL = 60
+
+# 请求头，模拟浏览器请求
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
+    'Referer': 'https://data.eastmoney.com/',
+    'Accept': 'application/json, text/javascript, */*; q=0.01'
+}
+
+
+def _connect():
+    """连接K线数据库并确保表结构存在"""
+    conn = sqlite3.connect(KLINE_DB_PATH, timeout=30)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS kline_daily (
+        secid TEXT NOT NULL,
+        fqt TEXT NOT NULL,
+        date TEXT NOT NULL,
+        open REAL,
+        close REAL,
+        high REAL,
+        low REAL,
+        volume REAL,
+        amount REAL,
+        amplitude REAL,
+        change_pct REAL,
+        change_amt REAL,
+        turnover REAL,
+        raw TEXT NOT NULL,
+        PRIMARY KEY (secid, fqt, date)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS kline_sync (
+        secid TEXT NOT NULL,
+        fqt TEXT NOT NULL,
+        name TEXT,
+        last_sync REAL NOT NULL,
+        PRIMARY KEY (secid, fqt)
+    )
+    ''')
+    # 向前补齐时上游已没有更早K线的股票，first_date为上游最早的一条K线日期
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS kline_history (
+        secid TEXT NOT NULL,
+        fqt TEXT NOT NULL,
+        first_date TEXT NOT NULL,
+        PRIMARY KEY (secid, fqt)
+    )
+    ''')
+    return conn
+
+
+def _parse_kline(raw):
+    """把东方财富返回的K线字符串解析为入库的行"""
+    parts = raw.split(',')
+    values = [float(x) if x not in ('', '-') else None for x in parts[1:11]]
+    return (parts[0], *values, raw)
+
+
+def normalize_date(date_str):
+    """把YYYYMMDD或YYYY-MM-DD格式的日期统一转换为YYYY-MM-DD"""
+    if not date_str:
+        return None
+    date_str = date_str.replace('/', '-')
+    if '-' not in date_str and len(date_str) == 8:
+        return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
+    return date_str
+
+
+def last_market_close(now=None):
+    """获取最近一次收盘时间（工作日15:00，不考虑节假日）"""
+    now = now or datetime.datetime.now()
+    close_time = now.replace(hour=15, minute=0, second=0, microsecond=0)
+    if now < close_time:
+        close_time -= datetime.timedelta(days=1)
+    while close_time.weekday() >= 5:
+        close_time -= datetime.timedelta(days=1)
+    return close_time
+
+
+def is_fresh(last_sync):
+    """判断上次同步后的本地K线是否仍是最新的（不需要重新同步）"""
+    if last_sync is None:
+        return False
+    # 交易时间内当天的K线随成交不断变化，只按同步间隔限制同步频率
+    if quote_stream.is_trading_time():
+        return time.time() - last_sync < SYNC_INTERVAL
+    # 收盘后和非交易日：最近一次收盘后已经同步过，K线不会再变化
+    return last_sync >= last_market_close().timestamp()
+
+
+def kline_params(secid, fqt, beg=None, end=None, lmt=INITIAL_BARS):
+    """构建东方财富日K线API的请求参数（返回截至end的最近lmt条K线，beg限制最早日期）"""
+    params = {
+        'secid': secid,
+        'klt': '101',
+        'fqt': fqt,
+        'lmt': lmt,
+        'end': end.replace('-', '') if end else '20500101',
+        'iscca': '1',
+        'fields1': 'f1,f2,f3,f4,f5',
+        'fields2': KLINE_FIELDS2,
+        'ut': 'f057cbcbce2a86e2866ab8877db1d059',
+        'forcect': '1'
+    }
+    if beg:
+        params['beg'] = beg.replace('-', '')
+    return params
+
+
+def parse_kline_response(secid, data):
+    """解析东方财富K线API的响应
+
+    Returns:
+        (klines字符串列表, 股票名称)
+    """
+    if not data.get('data'):
+        raise Exception(f"K线API返回数据为空: secid={secid}, rc={data.get('rc')}")
+    return data['data'].get('klines') or [], data['data'].get('name')
+
+
+def _request_klines(params):
+    """向东方财富请求K线数据
+
+    Returns:
+        (klines字符串列表, 股票名称)
+    """
+    response = requests.get(KLINE_API_URL, headers=HEADERS, params=params, timeout=10)
+    response.raise_for_status()
+    return parse_kline_response(params['secid'], response.json())
+
+
+def get_last_sync(secid, fqt):
+    """读取上次同步时间，没有同步过时返回None"""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT last_sync FROM kline_sync WHERE secid=? AND fqt=?", (secid, fqt)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def load_stored(secid, fqt):
+    """读取最后两条已存储的K线：最后一条可能是盘中未完成的K线，倒数第二条用作复权校验"""
+    conn = _connect()
+    try:
+        return conn.execute(
+            "SELECT date, raw FROM kline_daily WHERE secid=? AND fqt=? ORDER BY date DESC LIMIT 2",
+            (secid, fqt)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def sync_params(secid, fqt, stored):
+    """增量同步的上游请求参数：已有K线时从校验日期开始请求，第一条K线用于校验复权是否发生变化"""
+    if stored:
+        return kline_params(secid, fqt, beg=stored[-1][0], lmt=1000000)
+    return kline_params(secid, fqt)
+
+
+def adjust_changed(secid, fqt, stored, klines):
+    """复权价格是否变化（除权除息），变化时前后复权的历史K线全部失效，需要重新拉取"""
+    if fqt == '0' or len(stored) < 2 or not klines:
+        return False
+    check_date, check_raw = stored[-1]
+    first = _parse_kline(klines[0])
+    if first[0] != check_date:
+        return False
+    old = _parse_kline(check_raw)
+    if any(abs((a or 0) - (b or 0)) > 1e-6 for a, b in zip(old[1:5], first[1:5])):
+        logging.info(f"检测到{secid}复权价格变化，重新拉取全部K线")
+        return True
+    return False
+
+
+def save_sync(secid, fqt, klines, name, replace=False):
+    """保存增量同步的K线，replace为True时先删除该secid已存储的全部K线"""
+    rows = [(secid, fqt) + _parse_kline(k) for k in klines]
+    conn = _connect()
+    try:
+        if replace:
+            conn.execute("DELETE FROM kline_daily WHERE secid=? AND fqt=?", (secid, fqt))
+            conn.execute("DELETE FROM kline_history WHERE secid=? AND fqt=?", (secid, fqt))
+        conn.executemany('''
+        INSERT OR REPLACE INTO kline_daily
+        (secid, fqt, date, open, close, high, low, volume, amount, amplitude, change_pct, change_amt, turnover, raw)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO kline_sync (secid, fqt, name, last_sync) VALUES (?, ?, ?, ?)",
+            (secid, fqt, name, time.time())
+        )
+        conn.commit()
+        logging.info(f"同步{secid}(fqt={fqt})的日K线{len(rows)}条")
+    finally:
+        conn.close()
+
+
+def _sync(secid, fqt):
+    """增量同步指定secid的日K线到本地"""
+    stored = load_stored(secid, fqt)
+    klines, name = _request_klines(sync_params(secid, fqt, stored))
+    replace = adjust_changed(secid, fqt, stored, klines)
+    if replace:
+        klines, name = _request_klines(kline_params(secid, fqt))
+    save_sync(secid, fqt, klines, name, replace)
+
+
+def sync_klines(secid, fqt='1', force=False):
+    """确保本地K线是最新的，必要时向上游增量同步
+
+    同步失败时保留本地已有数据，只有本地完全没有数据时才抛出异常
+    """
+    last_sync = get_last_sync(secid, fqt)
+    if not force and is_fresh(last_sync):
+        return
+
+    try:
+        # 同一secid的并发同步只执行一次
+        upstream.kline_flight.do(('sync', secid, fqt), lambda: _sync(secid, fqt))
+    except Exception as e:
+        if last_sync is None:
+            raise
+        logging.warning(f"同步{secid}的K线失败，使用本地已有数据: {e}")
+
+
+def backfill_params(secid, fqt, lmt, end=None):
+    """本地截至end的K线不足lmt条时，返回从最早一条已存储K线向前补齐的上游请求参数
+
+    lmt超过首次同步的INITIAL_BARS条、或end早于已存储的范围时都需要补齐；
+    本地没有K线、K线已足够或上游已没有更早的K线时返回None
+    """
+    end_date = normalize_date(end) or '9999-12-31'
+    conn = _connect()
+    try:
+        if conn.execute("SELECT 1 FROM kline_history WHERE secid=? AND fqt=?", (secid, fqt)).fetchone():
+            return None
+        oldest, = conn.execute(
+            "SELECT MIN(date) FROM kline_daily WHERE secid=? AND fqt=?", (secid, fqt)
+        ).fetchone()
+        count, = conn.execute(
+            "SELECT COUNT(*) FROM kline_daily WHERE secid=? AND fqt=? AND date<=?", (secid, fqt, end_date)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if oldest is None or count >= lmt:
+        return None
+    # 补齐的K线必须与已存储的K线连续：从最早一条已存储K线（含）向前请求，
+    # end早于已存储范围时，中间相隔的交易日数不超过相差的自然日数
+    gap = 0
+    if end_date < oldest:
+        gap = (datetime.date.fromisoformat(oldest) - datetime.date.fromisoformat(end_date)).days
+    return kline_params(secid, fqt, end=oldest, lmt=lmt - count + gap + 1)
+
+
+def save_backfill(secid, fqt, klines, params):
+    """保存向前补齐的K线，上游返回的条数少于请求条数时记录已到最早一条K线"""
+    rows = [(secid, fqt) + _parse_kline(k) for k in klines]
+    conn = _connect()
+    try:
+        # 已存储的K线以增量同步的为准
+        conn.executemany('''
+        INSERT OR IGNORE INTO kline_daily
+        (secid, fqt, date, open, close, high, low, volume, amount, amplitude, change_pct, change_amt, turnover, raw)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        if len(rows) < params['lmt']:
+            conn.execute(
+                "INSERT OR REPLACE INTO kline_history (secid, fqt, first_date) VALUES (?, ?, ?)",
+                (secid, fqt, rows[0][2] if rows else normalize_date(params['end']))
+            )
+        conn.commit()
+        logging.info(f"向前补齐{secid}(fqt={fqt})的日K线{len(rows)}条")
+    finally:
+        conn.close()
+
+
+def backfill_klines(secid, fqt, lmt, end=None):
+    """本地K线不足时向上游向前补齐，失败时保留本地已有数据"""
+    params = backfill_params(secid, fqt, lmt, end)
+    if params is None:
+        return
+    try:
+        upstream.kline_flight.do(
+            ('backfill', secid, fqt, params['end'], params['lmt']),
+            lambda: save_backfill(secid, fqt, _request_klines(params)[0], params)
+        )
+    except Exception as e:
+        logging.warning(f"向前补齐{secid}的K线失败，使用本地已有数据: {e}")
+
+
+def read_klines(secid, fqt='1', lmt=250, end=None):
+    """读取本地存储的日K线（不同步）
+
+    Returns:
+        dict: 包含name和rows（按日期升序的K线行元组列表）
+    """
+    end_date = normalize_date(end) or '9999-12-31'
+    conn = _connect()
+    try:
+        rows = conn.execute('''
+        SELECT date, open, close, high, low, volume, amount, amplitude, change_pct, change_amt, turnover, raw
+        FROM kline_daily
+        WHERE secid=? AND fqt=? AND date<=?
+        ORDER BY date DESC
+        LIMIT ?
+        ''', (secid, fqt, end_date, lmt)).fetchall()
+        name_row = conn.execute(
+            "SELECT name FROM kline_sync WHERE secid=? AND fqt=?", (secid, fqt)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    rows.reverse()
+    return {
+        'name': name_row[0] if name_row else None,
+        'rows': rows
+    }
+
+
+def get_klines(secid, fqt='1', lmt=250, end=None):
+    """获取本地存储的日K线（先增量同步，不足lmt条时向前补齐）
+
+    Args:
+        secid: 市场代码和股票代码组合，如1.600000
+        fqt: 复权类型（0不复权，1前复权，2后复权）
+        lmt: 返回的K线条数
+        end: 结束日期（YYYYMMDD或YYYY-MM-DD），默认不限制
+
+    Returns:
+        dict: 包含name和rows（按日期升序的K线行元组列表）
+    """
+    lmt = int(lmt)
+    sync_klines(secid, fqt)
+    backfill_klines(secid, fqt, lmt, end)
+    return read_klines(secid, fqt, lmt, end)
+
+
+def _rows_to_columns(rows):
+    """把K线行元组转换为按列的数组（列名见KLINE_COLUMNS）"""
+    return {name: [row[i] for row in rows] for i, name in enumerate(KLINE_COLUMNS)}
+
+
+def decode_klines(klines):
+    """把东方财富返回的K线字符串列表解码为按列的数组，供未入库的K线使用"""
+    return _rows_to_columns([_parse_kline(k) for k in klines])
+
+
+def to_columnar_payload(payload):
+    """把东方财富格式的K线响应转换为按列格式（klines替换为columns）"""
+    data = dict(payload['data'])
+    data['columns'] = decode_klines(data.pop('klines', None) or [])
+    return dict(payload, data=data)
+
+
+def build_kline_payload(secid, result, columnar=False):
+    """把read_klines的结果转换为东方财富K线API的响应格式
+
+    Args:
+        columnar: 为True时用按列的数值数组（columns）代替逗号拼接的K线字符串（klines），
+                  数值直接取自已解码入库的字段，客户端无需逐行解析
+    """
+    market, code = secid.split('.', 1)
+    data = {
+        'code': code,
+        'market': int(market) if market.isdigit() else market,
+        'name': result['name']
+    }
+    if columnar:
+        data['columns'] = _rows_to_columns(result['rows'])
+    else:
+        data['klines'] = [row[-1] for row in result['rows']]
+    return {
+        'rc': 0,
+        'data': data
+    }
+
+
+def get_kline_payload(secid, fqt='1', lmt=250, end=None, columnar=False):
+    """以东方财富K线API的响应格式返回本地K线，供K线代理接口使用"""
+    return build_kline_payload(secid, get_klines(secid, fqt, lmt, end), columnar)
+
+
+def load_kline_frame(secid, days, end=None, fqt='1'):
+    """以DataFrame形式返回本地K线，供筹码分布分析器使用
+
+    Returns:
+        pd.DataFrame: 包含日期、开盘、收盘、最高、最低、成交量、成交额、涨跌幅、换手率字段
+    """
+    import pandas as pd
+
+    rows = get_klines(secid, fqt, days, end)['rows']
+    return pd.DataFrame(
+        [(r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[8], r[10]) for r in rows],
+        columns=['日期', '开盘', '收盘', '最高', '最低', '成交量', '成交额', '涨跌幅', '换手率']
+    )
@@ -0,0 +1,390 @@
+"""
+上游替身服务器
+回放录制的选股通/东方财富接口响应（surge_stock、ulist、trends2、kline），
+没有录制时按股票代码和日期生成确定性的模拟数据，可配置延迟、错误率和数据量，用于离线压测
+
+使用方式：
+    python mock_upstream.py --port 8900 --latency-ms 50 --error-rate 0.01
+    UPSTREAM_BASE_URL=http://127.0.0.1:8900 KLINE_MOCK_FALLBACK=0 python app.py
+
+录制真实上游响应（转发到真实上游并保存到录制目录）：
+    python mock_upstream.py --record
+"""
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import requests
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+
+# 替身服务器配置，可通过命令行参数修改
+config = {
+    'record_dir': 'mock_recordings',  # 录制文件目录
+    'record': False,                  # 是否转发到真实上游并录制响应
+    'latency_ms': 0,                  # 每个请求的固定延迟（毫秒）
+    'jitter_ms': 0,                   # 在固定延迟上增加的随机延迟上限（毫秒）
+    'error_rate': 0.0,                # 随机返回HTTP 500的概率
+    'surge_items': 80,                # 模拟的每日涨停股票数量
+    'trend_points': 241,              # 模拟的分时数据点数（最多241）
+}
+
+# 录制时转发的真实上游地址
+REAL_UPSTREAMS = {
+    'surge_stock': 'https://flash-api.xuangubao.com.cn',
+    'ulist': 'https://push2.eastmoney.com',
+    'trends2': 'https://push2.eastmoney.com',
+    'kline': 'https://push2his.eastmoney.com',
+}
+
+# 录制时使用的请求头，模拟浏览器请求
+RECORD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': 'https://quote.eastmoney.com/',
+    'Accept': 'application/json, text/plain, */*'
+}
+
+# 模拟数据使用的题材名称
+PLATE_NAMES = [
+    '人工智能', '机器人', '半导体', '算力', '消费电子', '新能源汽车', '固态电池', '光伏', '储能', '风电',
+    '医药', '创新药', '白酒', '食品饮料', '黄金', '有色金属', '稀土', '军工', '低空经济', '商业航天',
+    '数据要素', '信创', '网络安全', '油服', '化工', '证券', '银行', '房地产', '基建', '电力',
+]
+
+# 请求统计
+stats = {
+    'requests': {},   # 接口名 -> 请求次数
+    'errors': 0,      # 注入的错误次数
+    'replayed': 0,    # 回放录制数据的次数
+    'synthesized': 0  # 生成模拟数据的次数
+}
+stats_lock = threading.Lock()
+
+
+def _count(key, kind=None):
+    """累加请求统计"""
+    with stats_lock:
+        if kind:
+            stats['requests'][kind] = stats['requests'].get(kind, 0) + 1
+        if key:
+            stats[key] += 1
+
+
+def _rng(*key):
+    """按参数生成确定性的随机数生成器，相同参数每次生成相同的数据"""
+    return random.Random(':'.join(str(k) for k in key))
+
+
+def _recording_path(kind, key):
+    """录制文件路径"""
+    safe_key = re.sub(r'[^0-9A-Za-z._-]', '_', str(key))
+    return os.path.join(config['record_dir'], kind, f"{safe_key}.json")
+
+
+def load_recording(kind, key):
+    """读取录制的响应，没有录制时返回None"""
+    path = _recording_path(kind, key)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_recording(kind, key, data):
+    """保存录制的响应"""
+    path = _recording_path(kind, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def forward_to_upstream(kind):
+    """把当前请求转发到真实上游，返回解析后的JSON"""
+    url = REAL_UPSTREAMS[kind] + request.path
+    response = requests.get(url, params=request.args, headers=RECORD_HEADERS, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def _weekdays_until(end_date, count):
+    """返回截止end_date（含）的最近count个工作日，按日期升序"""
+    days = []
+    day = end_date
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= datetime.timedelta(days=1)
+    days.reverse()
+    return days
+
+
+def _latest_weekday():
+    """最近一个工作日"""
+    return _weekdays_until(datetime.date.today(), 1)[0]
+
+
+def _parse_date(date_str, default):
+    """解析YYYYMMDD或YYYY-MM-DD格式的日期"""
+    if not date_str:
+        return default
+    try:
+        return datetime.datetime.strptime(date_str.replace('-', ''), '%Y%m%d').date()
+    except ValueError:
+        return default
+
+
+def _stock_name(code):
+    """模拟的股票名称"""
+    return f"模拟{code[-4:]}"
+
+
+def _synthetic_close(secid, day):
+    """模拟的收盘价，只依赖股票和日期，同一天每次生成的价格相同（增量同步时不会误判为复权变化）"""
+    base = 5 + _rng(secid).random() * 95
+    t = day.toordinal()
+    noise = _rng(secid, day.isoformat(), 'close').uniform(-0.01, 0.01)
+    return round(base * (1 + 0.2 * math.sin(t / 15) + 0.05 * math.sin(t / 3.7) + noise), 2)
+
+
+def synthesize_kline_bar(secid, day, prev_day):
+    """模拟一条日K线，格式与fields2=f51..f61一致"""
+    rng = _rng(secid, day.isoformat(), 'bar')
+    close = _synthetic_close(secid, day)
+    prev_close = _synthetic_close(secid, prev_day)
+    open_price = round(close * (1 + rng.uniform(-0.02, 0.02)), 2)
+    high = round(max(open_price, close) * (1 + rng.uniform(0, 0.02)), 2)
+    low = round(min(open_price, close) * (1 - rng.uniform(0, 0.02)), 2)
+    volume = rng.randint(10000, 2000000)
+    amount = round(volume * close * 100, 2)
+    amplitude = round((high - low) / prev_close * 100, 2)
+    change_amt = round(close - prev_close, 2)
+    change_pct = round(change_amt / prev_close * 100, 2)
+    turnover = round(rng.uniform(0.5, 15), 2)
+    return f"{day.isoformat()},{open_price},{close},{high},{low},{volume},{amount},{amplitude},{change_pct},{change_amt},{turnover}"
+
+
+def synthesize_klines(secid, lmt, beg=None, end=None):
+    """模拟日K线响应，支持lmt/beg/end参数"""
+    end_date = min(_parse_date(end, datetime.date.today()), datetime.date.today())
+    beg_date = _parse_date(beg, None)
+    days = _weekdays_until(end_date, lmt + 1)
+    klines = [
+        synthesize_kline_bar(secid, day, prev_day)
+        for prev_day, day in zip(days, days[1:])
+        if beg_date is None or day >= beg_date
+    ]
+    market, code = secid.split('.', 1) if '.' in secid else ('0', secid)
+    return {
+        'rc': 0,
+        'data': {
+            'code': code,
+            'market': int(market) if market.isdigit() else market,
+            'name': _stock_name(code),
+            'klines': klines
+        }
+    }
+
+
+def synthesize_trends(secid):
+    """模拟当日分时数据，格式与fields2=f51,f53,f56,f58一致"""
+    day = _latest_weekday()
+    rng = _rng(secid, day.isoformat(), 'trends')
+    pre_close = _synthetic_close(secid, _weekdays_until(day - datetime.timedelta(days=1), 1)[0])
+
+    minutes = [datetime.datetime.combine(day, datetime.time(9, 30)) + datetime.timedelta(minutes=i) for i in range(121)]
+    minutes += [datetime.datetime.combine(day, datetime.time(13, 1)) + datetime.timedelta(minutes=i) for i in range(120)]
+    minutes = minutes[:config['trend_points']]
+
+    trends = []
+    price = pre_close
+    total_amount = 0
+    total_volume = 0
+    for minute in minutes:
+        price = round(max(0.01, price * (1 + rng.uniform(-0.004, 0.004))), 2)
+        volume = rng.randint(100, 20000)
+        total_amount += price * volume
+        total_volume += volume
+        trends.append(f"{minute.strftime('%Y-%m-%d %H:%M')},{price},{volume},{total_amount / total_volume:.3f}")
+
+    market, code = secid.split('.', 1) if '.' in secid else ('0', secid)
+    return {
+        'rc': 0,
+        'data': {
+            'code': code,
+            'market': int(market) if market.isdigit() else market,
+            'name': _stock_name(code),
+            'preClose': pre_close,
+            'trends': trends
+        }
+    }
+
+
+def synthesize_quote(secid):
+    """模拟一只股票的实时行情，价格每10秒变化一次"""
+    code = secid.split('.', 1)[-1]
+    rng = _rng(secid, int(time.time() // 10), 'quote')
+    pre_close = _synthetic_close(secid, _weekdays_until(_latest_weekday() - datetime.timedelta(days=1), 1)[0])
+    change_pct = round(rng.uniform(-10, 10), 2)
+    return {
+        'f2': round(pre_close * (1 + change_pct / 100), 2),
+        'f3': change_pct,
+        'f6': round(rng.uniform(1e7, 5e9), 2),
+        'f12': code,
+        'f14': _stock_name(code)
+    }
+
+
+def synthesize_surge_stocks(date_str):
+    """模拟选股通某日的涨停股票列表，每条数据的字段位置与crawler.process_and_store_data一致"""
+    rng = _rng(date_str, 'surge')
+    items = []
+    codes = set()
+    while len(items) < config['surge_items']:
+        prefix = rng.choice(['600', '601', '603', '000', '002', '300', '301'])
+        code = f"{prefix}{rng.randint(0, 999):03d}"
+        if code in codes:
+            continue
+        codes.add(code)
+        suffix = 'SS' if prefix.startswith('6') else 'SZ'
+        plates = [{'name': name} for name in rng.sample(PLATE_NAMES, rng.randint(1, 3))]
+        boards = rng.choice(['', '', '', '2天2板', '3天2板', '3天3板', '5天3板', '4天4板'])
+        items.append([
+            f"{code}.{suffix}", _stock_name(code), 0, 0, 0,
+            f"模拟解读：公司业务涉及{plates[0]['name']}", 0, 0, plates, 0, 0, boards
+        ])
+    return {'code': 20000, 'message': 'OK', 'data': {'items': items}}
+
+
+@app.before_request
+def inject_latency_and_errors():
+    """按配置注入延迟和随机错误"""
+    delay = config['latency_ms'] + random.uniform(0, config['jitter_ms'])
+    if delay > 0:
+        time.sleep(delay / 1000)
+    if request.path.startswith('/_mock/'):
+        return None
+    if config['error_rate'] > 0 and random.random() < config['error_rate']:
+        _count('errors')
+        return jsonify({'error': '模拟的上游错误'}), 500
+    return None
+
+
+@app.route('/api/surge_stock/stocks')
+def surge_stock():
+    """选股通涨停股票接口"""
+    _count(None, 'surge_stock')
+    date_str = request.args.get('date', _latest_weekday().strftime('%Y%m%d'))
+    if config['record']:
+        data = forward_to_upstream('surge_stock')
+        save_recording('surge_stock', date_str, data)
+        return jsonify(data)
+
+    data = load_recording('surge_stock', date_str)
+    _count('replayed' if data is not None else 'synthesized')
+    return jsonify(data if data is not None else synthesize_surge_stocks(date_str))
+
+
+@app.route('/api/qt/ulist.np/get')
+def ulist():
+    """东方财富批量行情接口，按股票分别录制和回放"""
+    _count(None, 'ulist')
+    secids = [s for s in request.args.get('secids', '').split(',') if s]
+    if config['record']:
+        data = forward_to_upstream('ulist')
+        for item in (data.get('data') or {}).get('diff', []):
+            save_recording('ulist', item.get('f12'), item)
+        return jsonify(data)
+
+    diff = []
+    for secid in secids:
+        item = load_recording('ulist', secid.split('.', 1)[-1])
+        _count('replayed' if item is not None else 'synthesized')
+        diff.append(item if item is not None else synthesize_quote(secid))
+    return jsonify({'rc': 0, 'data': {'total': len(diff), 'diff': diff}})
+
+
+@app.route('/api/qt/stock/trends2/get')
+def trends2():
+    """东方财富分时数据接口"""
+    _count(None, 'trends2')
+    secid = request.args.get('secid', '')
+    if config['record']:
+        data = forward_to_upstream('trends2')
+        save_recording('trends2', secid, data)
+        return jsonify(data)
+
+    data = load_recording('trends2', secid)
+    _count('replayed' if data is not None else 'synthesized')
+    return jsonify(data if data is not None else synthesize_trends(secid))
+
+
+@app.route('/api/qt/stock/kline/get')
+def kline():
+    """东方财富K线接口，回放时按lmt/beg/end参数截取录制的K线"""
+    _count(None, 'kline')
+    secid = request.args.get('secid', '')
+    key = f"{secid}_{request.args.get('klt', '101')}_{request.args.get('fqt', '1')}"
+    lmt = int(request.args.get('lmt', 250))
+    beg = request.args.get('beg')
+    end = request.args.get('end')
+    if config['record']:
+        data = forward_to_upstream('kline')
+        save_recording('kline', key, data)
+        return jsonify(data)
+
+    data = load_recording('kline', key)
+    if data is None:
+        _count('synthesized')
+        return jsonify(synthesize_klines(secid, lmt, beg, end))
+
+    _count('replayed')
+    beg_date = _parse_date(beg, datetime.date.min).isoformat()
+    end_date = _parse_date(end, datetime.date.max).isoformat()
+    klines = [k for k in (data.get('data') or {}).get('klines', []) if beg_date <= k[:10] <= end_date]
+    data['data']['klines'] = klines[-lmt:]
+    return jsonify(data)
+
+
+@app.route('/_mock/stats')
+def mock_stats():
+    """替身服务器的请求统计"""
+    with stats_lock:
+        return jsonify({'config': config, 'stats': stats})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='选股通/东方财富上游替身服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--record-dir', default=config['record_dir'], help='录制文件目录')
+    parser.add_argument('--record', action='store_true', help='转发到真实上游并录制响应')
+    parser.add_argument('--latency-ms', type=float, default=config['latency_ms'], help='每个请求的固定延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=config['jitter_ms'], help='随机延迟上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=config['error_rate'], help='随机返回HTTP 500的概率')
+    parser.add_argument('--surge-items', type=int, default=config['surge_items'], help='模拟的每日涨停股票数量')
+    parser.add_argument('--trend-points', type=int, default=config['trend_points'], help='模拟的分时数据点数（最多241）')
+    args = parser.parse_args()
+
+    config.update({
+        'record_dir': args.record_dir,
+        'record': args.record,
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'error_rate': args.error_rate,
+        'surge_items': args.surge_items,
+        'trend_points': min(args.trend_points, 241),
+    })
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.info(f"上游替身服务器配置: {config}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,550 @@
+"""
+题材每日统计模块
+在数据写入时把每天涨停列表按题材汇总成(题材, 日期)统计表：涨停数量、当天排名、占当天列表的比例和连续上榜天数，
+题材热度的趋势图和题材统计面板直接读取汇总结果，不再扫描每一天的股票表；
+同时维护题材共现矩阵：每天同一只股票所属的每两个题材计一次共现，并按几个固定窗口（最近N个交易日）增量累加，
+相关题材查询直接按索引读取累加结果；
+每次更新窗口计数后按各窗口的日均涨停数量计算题材的加速度，得分最高的前K个题材保存在热门题材表中
+"""
+import heapq
+import json
+import sqlite3
+import logging
+import threading
+import db
+
+# 与股票数据共用数据库文件
+PLATE_DB_PATH = db.DB_PATH
+
+# 未指定题材时返回区间内排名进入前多少名的题材
+DEFAULT_TOP = 20
+
+# 单次查询最多返回的交易日数
+MAX_HEAT_DAYS = 250
+
+# 增量维护共现计数的窗口（交易日数），查询其他窗口时按天汇总
+COOCCURRENCE_WINDOWS = (5, 20, 60)
+DEFAULT_COOCCURRENCE_WINDOW = 20
+
+# 热门题材使用的窗口（交易日数）和加速度权重：(短窗口, 长窗口)的权重乘以两个窗口日均涨停数量之差
+TREND_WINDOWS = (1, 3, 5, 20)
+TREND_WEIGHTS = {(1, 3): 0.2, (3, 5): 0.3, (5, 20): 0.5}
+
+# 每次写入数据后保存得分最高的多少个热门题材
+TREND_TOP_K = 50
+
+# 增量维护题材涨停数量和共现数量的全部窗口
+WINDOW_DAYS = tuple(sorted(set(COOCCURRENCE_WINDOWS) | set(TREND_WINDOWS)))
+
+# 相关题材、题材集群默认返回的数量
+DEFAULT_RELATED_TOP = 10
+
+# 题材集群中两个题材当天至少共现的股票数
+DEFAULT_CLUSTER_MIN_COUNT = 2
+
+# 每个进程第一次查询时补齐尚未汇总的日期，之后由写入数据时的钩子保持最新
+_sync_state = {'done': db.SNAPSHOT_MODE, 'lock': threading.Lock()}
+
+
+def _connect():
+    """连接数据库并确保汇总表结构存在"""
+    conn = sqlite3.connect(PLATE_DB_PATH, timeout=30)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS plate_daily (
+        plate TEXT NOT NULL,
+        date TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        share REAL NOT NULL,
+        streak INTEGER NOT NULL,
+        PRIMARY KEY (plate, date)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plate_daily_date ON plate_daily(date, rank)")
+    # 每天涨停列表的股票数，同时记录哪些日期已经汇总
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS plate_daily_total (
+        date TEXT PRIMARY KEY,
+        total INTEGER NOT NULL
+    )
+    ''')
+    # 每天的题材共现数量，(plate, other)两个方向各保存一行，便于按题材查询
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS plate_pair_daily (
+        date TEXT NOT NULL,
+        plate TEXT NOT NULL,
+        other TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (date, plate, other)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plate_pair_daily_plate ON plate_pair_daily(plate, date)")
+    # 已汇总共现数量的日期（共现表在题材统计之后加入，已有数据库需要补齐）
+    conn.execute("CREATE TABLE IF NOT EXISTS plate_pair_dates (date TEXT PRIMARY KEY)")
+    # 各窗口内的共现数量和题材涨停数量，以及窗口累加到的最新日期
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS plate_pair_window (
+        days INTEGER NOT NULL,
+        plate TEXT NOT NULL,
+        other TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (days, plate, other)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plate_pair_window_count ON plate_pair_window(days, plate, count)")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS plate_window_count (
+        days INTEGER NOT NULL,
+        plate TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (days, plate)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS plate_window_state (
+        days INTEGER PRIMARY KEY,
+        end_date TEXT
+    )
+    ''')
+    # 最新一天的热门题材，counts和acceleration为JSON
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS plate_trending (
+        rank INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        plate TEXT NOT NULL,
+        score REAL NOT NULL,
+        counts TEXT NOT NULL,
+        acceleration TEXT NOT NULL
+    )
+    ''')
+    return conn
+
+
+def count_plates(stocks):
+    """统计一组股票中每个题材的股票数（同一只股票的重复题材只计一次）"""
+    counts = {}
+    for stock in stocks:
+        for plate in db.split_plates(stock.get('plates')):
+            counts[plate] = counts.get(plate, 0) + 1
+    return counts
+
+
+def count_plate_pairs(stocks):
+    """统计一组股票中每两个题材同时出现的股票数，键为按名称排序的(题材, 题材)"""
+    counts = {}
+    for stock in stocks:
+        plates = sorted(db.split_plates(stock.get('plates')))
+        for i, plate in enumerate(plates):
+            for other in plates[i + 1:]:
+                counts[(plate, other)] = counts.get((plate, other), 0) + 1
+    return counts
+
+
+def _diff(new, old):
+    """两组计数的差（只保留非零项）"""
+    keys = set(new) | set(old)
+    return {key: new.get(key, 0) - old.get(key, 0) for key in keys if new.get(key, 0) != old.get(key, 0)}
+
+
+def _day_counts(conn, date_str):
+    """读取某一天已汇总的题材数量和共现数量"""
+    counts = dict(conn.execute("SELECT plate, count FROM plate_daily WHERE date=?", (date_str,)))
+    pairs = {(plate, other): count for plate, other, count in conn.execute(
+        "SELECT plate, other, count FROM plate_pair_daily WHERE date=? AND plate < other", (date_str,))}
+    return counts, pairs
+
+
+def _apply_window(conn, days, counts, pairs, sign=1):
+    """把一天的题材数量和共现数量（或其变化量）累加到窗口计数上，sign为-1时减去"""
+    conn.executemany(
+        "INSERT INTO plate_window_count (days, plate, count) VALUES (?, ?, ?) "
+        "ON CONFLICT(days, plate) DO UPDATE SET count = count + excluded.count",
+        [(days, plate, sign * count) for plate, count in counts.items()]
+    )
+    conn.executemany(
+        "INSERT INTO plate_pair_window (days, plate, other, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(days, plate, other) DO UPDATE SET count = count + excluded.count",
+        [row for (plate, other), count in pairs.items()
+         for row in ((days, plate, other, sign * count), (days, other, plate, sign * count))]
+    )
+    conn.execute("DELETE FROM plate_window_count WHERE days=? AND count <= 0", (days,))
+    conn.execute("DELETE FROM plate_pair_window WHERE days=? AND count <= 0", (days,))
+
+
+def _rebuild_window(conn, days, dates):
+    """按窗口内的日期重新累加窗口计数"""
+    conn.execute("DELETE FROM plate_window_count WHERE days=?", (days,))
+    conn.execute("DELETE FROM plate_pair_window WHERE days=?", (days,))
+    if not dates:
+        return
+    conn.execute('''
+    INSERT INTO plate_window_count (days, plate, count)
+    SELECT ?, plate, SUM(count) FROM plate_daily WHERE date >= ? GROUP BY plate
+    ''', (days, dates[-1]))
+    conn.execute('''
+    INSERT INTO plate_pair_window (days, plate, other, count)
+    SELECT ?, plate, other, SUM(count) FROM plate_pair_daily WHERE date >= ? GROUP BY plate, other
+    ''', (days, dates[-1]))
+
+
+def _update_windows(conn, date_str, old_latest, existed, count_delta, pair_delta):
+    """
+    某一天的汇总结果变化后更新各窗口的计数
+
+    新的一天写入时加上这一天、减去移出窗口的一天；已有日期重新写入时只累加变化量；
+    补写或删除窗口内较早的日期、窗口尚未建立时按窗口内的日期重新累加
+    """
+    dates = [row[0] for row in conn.execute(
+        "SELECT date FROM plate_daily_total ORDER BY date DESC LIMIT ?", (max(WINDOW_DAYS) + 1,))]
+    latest = dates[0] if dates else None
+    exists = date_str in dates or conn.execute(
+        "SELECT 1 FROM plate_daily_total WHERE date=?", (date_str,)).fetchone() is not None
+    for days in WINDOW_DAYS:
+        window = dates[:days]
+        state = conn.execute("SELECT end_date FROM plate_window_state WHERE days=?", (days,)).fetchone()
+        if state is None or state[0] != old_latest:
+            _rebuild_window(conn, days, window)
+        elif existed and exists:
+            if date_str in window:
+                _apply_window(conn, days, count_delta, pair_delta)
+        elif exists and date_str == latest:
+            _apply_window(conn, days, count_delta, pair_delta)
+            if len(dates) > days:
+                _apply_window(conn, days, *_day_counts(conn, dates[days]), sign=-1)
+        elif not window or date_str >= window[-1]:
+            _rebuild_window(conn, days, window)
+        conn.execute("INSERT OR REPLACE INTO plate_window_state (days, end_date) VALUES (?, ?)", (days, latest))
+    _update_trending(conn, dates)
+
+
+def _rebuild_windows():
+    """按最新的日期重新累加全部窗口的计数（新增窗口时使用）"""
+    conn = _connect()
+    try:
+        dates = [row[0] for row in conn.execute(
+            "SELECT date FROM plate_daily_total ORDER BY date DESC LIMIT ?", (max(WINDOW_DAYS),))]
+        for days in WINDOW_DAYS:
+            _rebuild_window(conn, days, dates[:days])
+            conn.execute("INSERT OR REPLACE INTO plate_window_state (days, end_date) VALUES (?, ?)",
+                         (days, dates[0] if dates else None))
+        _update_trending(conn, dates)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _update_trending(conn, dates):
+    """
+    按各窗口的计数重新计算热门题材，dates为按日期降序排列的最近交易日
+
+    窗口的日均涨停数量为窗口内的涨停数量除以窗口内的交易日数，加速度为短窗口与长窗口日均涨停数量之差，
+    得分为各加速度按TREND_WEIGHTS的加权和；只保存得分最高的TREND_TOP_K个题材
+    """
+    counts = {}
+    for days in TREND_WINDOWS:
+        for plate, count in conn.execute("SELECT plate, count FROM plate_window_count WHERE days=?", (days,)):
+            counts.setdefault(plate, dict.fromkeys(TREND_WINDOWS, 0))[days] = count
+
+    def rate(plate_counts, days):
+        return plate_counts[days] / max(1, min(days, len(dates)))
+
+    scored = []
+    for plate in sorted(counts):
+        acceleration = {f'{short}-{long}': round(rate(counts[plate], short) - rate(counts[plate], long), 4)
+                        for short, long in TREND_WEIGHTS}
+        score = sum(weight * (rate(counts[plate], short) - rate(counts[plate], long))
+                    for (short, long), weight in TREND_WEIGHTS.items())
+        scored.append((round(score, 4), plate, acceleration))
+    top = heapq.nlargest(TREND_TOP_K, scored, key=lambda item: (item[0], counts[item[1]][TREND_WINDOWS[0]]))
+
+    conn.execute("DELETE FROM plate_trending")
+    conn.executemany(
+        "INSERT INTO plate_trending (rank, date, plate, score, counts, acceleration) VALUES (?, ?, ?, ?, ?, ?)",
+        [(i + 1, dates[0], plate, score, json.dumps({str(days): count for days, count in counts[plate].items()}),
+          json.dumps(acceleration)) for i, (score, plate, acceleration) in enumerate(top)]
+    )
+
+
+def _update_streaks(conn, start_date):
+    """从start_date开始按日期顺序重新计算连续上榜天数（按库中有数据的交易日计算）"""
+    previous = conn.execute("SELECT MAX(date) FROM plate_daily_total WHERE date < ?", (start_date,)).fetchone()[0]
+    streaks = dict(conn.execute("SELECT plate, streak FROM plate_daily WHERE date=?", (previous,))) if previous else {}
+    dates = [row[0] for row in conn.execute("SELECT date FROM plate_daily_total WHERE date >= ? ORDER BY date", (start_date,))]
+    for date in dates:
+        plates = [row[0] for row in conn.execute("SELECT plate FROM plate_daily WHERE date=?", (date,))]
+        streaks = {plate: streaks.get(plate, 0) + 1 for plate in plates}
+        conn.executemany("UPDATE plate_daily SET streak=? WHERE plate=? AND date=?",
+                         [(streak, plate, date) for plate, streak in streaks.items()])
+
+
+def refresh_date(date_str):
+    """重新汇总某一天（YYYYMMDD）的题材统计和共现数量，并更新之后各天的连续上榜天数和各窗口的共现计数"""
+    stocks = db.get_stock_data_by_date(date_str)
+    counts = count_plates(stocks)
+    pairs = count_plate_pairs(stocks)
+    ordered = sorted(counts.values(), reverse=True)
+    # 并列时排名相同（1, 2, 2, 4）
+    ranks = {}
+    for i, count in enumerate(ordered):
+        ranks.setdefault(count, i + 1)
+
+    conn = _connect()
+    try:
+        old_latest = conn.execute("SELECT MAX(date) FROM plate_daily_total").fetchone()[0]
+        existed = conn.execute("SELECT 1 FROM plate_daily_total WHERE date=?", (date_str,)).fetchone() is not None
+        old_counts, old_pairs = _day_counts(conn, date_str)
+        conn.execute("DELETE FROM plate_daily WHERE date=?", (date_str,))
+        conn.execute("DELETE FROM plate_daily_total WHERE date=?", (date_str,))
+        conn.execute("DELETE FROM plate_pair_daily WHERE date=?", (date_str,))
+        conn.execute("DELETE FROM plate_pair_dates WHERE date=?", (date_str,))
+        if stocks:
+            conn.executemany(
+                "INSERT INTO plate_daily (plate, date, count, rank, share, streak) VALUES (?, ?, ?, ?, ?, 0)",
+                [(plate, date_str, count, ranks[count], count / len(stocks)) for plate, count in counts.items()]
+            )
+            conn.execute("INSERT INTO plate_daily_total (date, total) VALUES (?, ?)", (date_str, len(stocks)))
+            conn.executemany(
+                "INSERT INTO plate_pair_daily (date, plate, other, count) VALUES (?, ?, ?, ?)",
+                [row for (plate, other), count in pairs.items()
+                 for row in ((date_str, plate, other, count), (date_str, other, plate, count))]
+            )
+            conn.execute("INSERT INTO plate_pair_dates (date) VALUES (?)", (date_str,))
+        _update_streaks(conn, date_str)
+        _update_windows(conn, date_str, old_latest, existed, _diff(counts, old_counts), _diff(pairs, old_pairs))
+        conn.commit()
+    finally:
+        conn.close()
+    logging.info(f"成功汇总{date_str}的{len(counts)}个题材")
+
+
+def sync():
+    """汇总库中有数据但尚未汇总的日期，每个进程只执行一次"""
+    with _sync_state['lock']:
+        if _sync_state['done']:
+            return
+        conn = _connect()
+        try:
+            done = {row[0] for row in conn.execute(
+                "SELECT date FROM plate_daily_total WHERE date IN (SELECT date FROM plate_pair_dates)")}
+        finally:
+            conn.close()
+        for date_str in sorted(set(db.get_available_dates()) - done):
+            refresh_date(date_str)
+        conn = _connect()
+        try:
+            windows = {row[0] for row in conn.execute("SELECT days FROM plate_window_state")}
+        finally:
+            conn.close()
+        if not set(WINDOW_DAYS) <= windows:
+            _rebuild_windows()
+        _sync_state['done'] = True
+
+
+def recent_plate_counts(days):
+    """最近days个交易日中每个题材的涨停数量之和"""
+    sync()
+    conn = _connect()
+    try:
+        return dict(conn.execute('''
+        SELECT plate, SUM(count) FROM plate_daily
+        WHERE date IN (SELECT date FROM plate_daily_total ORDER BY date DESC LIMIT ?)
+        GROUP BY plate
+        ''', (days,)))
+    finally:
+        conn.close()
+
+
+def get_plate_heat(plates=None, start=None, end=None, top=DEFAULT_TOP):
+    """
+    查询题材在一段日期内的每日统计
+
+    Args:
+        plates: 题材名称列表，为空时返回区间内任一天排名进入前top名的题材（top为0时返回全部题材）
+        start: 开始日期（YYYYMMDD），为空时与end相同
+        end: 结束日期（YYYYMMDD），默认最新一天
+
+    Returns:
+        dict: dates为区间内的交易日，totals为每天涨停列表的股票数，
+              plates为每个题材按日期排列的count、rank、share（百分比）和streak，未上榜的日期rank为None
+    """
+    sync()
+    conn = _connect()
+    try:
+        if not end:
+            end = conn.execute("SELECT MAX(date) FROM plate_daily_total").fetchone()[0]
+        start = start or end
+        days = conn.execute(
+            "SELECT date, total FROM plate_daily_total WHERE date BETWEEN ? AND ? ORDER BY date DESC LIMIT ?",
+            (start, end, MAX_HEAT_DAYS)
+        ).fetchall()[::-1]
+        if not days:
+            return {'dates': [], 'totals': [], 'plates': []}
+        start = days[0][0]
+
+        if not plates:
+            if top:
+                query = "SELECT DISTINCT plate FROM plate_daily WHERE date BETWEEN ? AND ? AND rank <= ?"
+                params = (start, end, top)
+            else:
+                query = "SELECT DISTINCT plate FROM plate_daily WHERE date BETWEEN ? AND ?"
+                params = (start, end)
+            plates = [row[0] for row in conn.execute(query, params)]
+
+        index = {date: i for i, (date, _) in enumerate(days)}
+        series = {
+            plate: {'plate': plate, 'count': [0] * len(days), 'rank': [None] * len(days),
+                    'share': [0] * len(days), 'streak': [0] * len(days)}
+            for plate in plates
+        }
+        for i in range(0, len(plates), 500):
+            chunk = plates[i:i + 500]
+            rows = conn.execute(f'''
+            SELECT plate, date, count, rank, share, streak FROM plate_daily
+            WHERE plate IN ({','.join('?' * len(chunk))}) AND date BETWEEN ? AND ?
+            ''', (*chunk, start, end))
+            for plate, date, count, rank, share, streak in rows:
+                item = series[plate]
+                j = index[date]
+                item['count'][j] = count
+                item['rank'][j] = rank
+                item['share'][j] = round(share * 100, 2)
+                item['streak'][j] = streak
+    finally:
+        conn.close()
+
+    # 按最后一天的数量、区间总数量降序排列
+    result = sorted(series.values(), key=lambda item: (-item['count'][-1], -sum(item['count']), item['plate']))
+    return {
+        'dates': [date for date, _ in days],
+        'totals': [total for _, total in days],
+        'plates': result
+    }
+
+
+def get_related_plates(plate, days=DEFAULT_COOCCURRENCE_WINDOW, top=DEFAULT_RELATED_TOP):
+    """
+    查询最近days个交易日内与某个题材共现最多的题材
+
+    Args:
+        plate: 题材名称
+        days: 窗口交易日数，WINDOW_DAYS中的窗口直接读取增量维护的计数，其他窗口按天汇总（最多MAX_HEAT_DAYS）
+
+    Returns:
+        dict: plate、days、start、end、count（窗口内该题材的涨停数量），
+              related为按共现数量降序的plate、count（共现股票数）、plate_count（窗口内该题材的涨停数量）、
+              confidence（共现数量占所查题材涨停数量的百分比）和jaccard（共现数量/两个题材涨停数量的并集）
+    """
+    sync()
+    days = max(1, min(days, MAX_HEAT_DAYS))
+    conn = _connect()
+    try:
+        dates = [row[0] for row in conn.execute(
+            "SELECT date FROM plate_daily_total ORDER BY date DESC LIMIT ?", (days,))]
+        if not dates:
+            return {'plate': plate, 'days': days, 'start': None, 'end': None, 'count': 0, 'related': []}
+        if days in WINDOW_DAYS:
+            row = conn.execute("SELECT count FROM plate_window_count WHERE days=? AND plate=?", (days, plate)).fetchone()
+            rows = conn.execute('''
+            SELECT p.other, p.count, c.count FROM plate_pair_window p
+            JOIN plate_window_count c ON c.days = p.days AND c.plate = p.other
+            WHERE p.days=? AND p.plate=? ORDER BY p.count DESC, p.other LIMIT ?
+            ''', (days, plate, top)).fetchall()
+        else:
+            row = conn.execute("SELECT SUM(count) FROM plate_daily WHERE plate=? AND date >= ?", (plate, dates[-1])).fetchone()
+            rows = conn.execute('''
+            SELECT p.other, p.count, (SELECT SUM(count) FROM plate_daily WHERE plate = p.other AND date >= ?)
+            FROM (SELECT other, SUM(count) AS count FROM plate_pair_daily WHERE plate=? AND date >= ? GROUP BY other) p
+            ORDER BY p.count DESC, p.other LIMIT ?
+            ''', (dates[-1], plate, dates[-1], top)).fetchall()
+    finally:
+        conn.close()
+
+    count = (row[0] if row else 0) or 0
+    related = [{
+        'plate': other,
+        'count': pair_count,
+        'plate_count': other_count,
+        'confidence': round(pair_count / count * 100, 2) if count else 0,
+        'jaccard': round(pair_count / (count + other_count - pair_count), 4)
+    } for other, pair_count, other_count in rows]
+    return {'plate': plate, 'days': days, 'start': dates[-1], 'end': dates[0], 'count': count, 'related': related}
+
+
+def get_plate_clusters(date_str=None, min_count=DEFAULT_CLUSTER_MIN_COUNT, top=DEFAULT_RELATED_TOP):
+    """
+    查询某一天共现最紧密的题材集群：当天至少有min_count只股票同时属于的两个题材相连，连通的题材组成一个集群
+
+    Returns:
+        dict: date和clusters（按共现数量之和降序），每个集群包含strength（共现数量之和）、
+              plates（plate和当天涨停数量，按共现数量之和降序）和pairs（plates和count，按count降序）
+    """
+    sync()
+    conn = _connect()
+    try:
+        if not date_str:
+            date_str = conn.execute("SELECT MAX(date) FROM plate_daily_total").fetchone()[0]
+        rows = conn.execute(
+            "SELECT plate, other, count FROM plate_pair_daily WHERE date=? AND plate < other AND count >= ?",
+            (date_str, min_count)
+        ).fetchall()
+        plate_counts = dict(conn.execute("SELECT plate, count FROM plate_daily WHERE date=?", (date_str,)))
+    finally:
+        conn.close()
+
+    # 并查集合并相连的题材
+    parents = {}
+
+    def find(plate):
+        parents.setdefault(plate, plate)
+        while parents[plate] != plate:
+            parents[plate] = parents[parents[plate]]
+            plate = parents[plate]
+        return plate
+
+    for plate, other, _ in rows:
+        parents[find(plate)] = find(other)
+
+    clusters = {}
+    for plate, other, count in rows:
+        cluster = clusters.setdefault(find(plate), {'strength': 0, 'weights': {}, 'pairs': []})
+        cluster['strength'] += count
+        cluster['pairs'].append({'plates': [plate, other], 'count': count})
+        for name in (plate, other):
+            cluster['weights'][name] = cluster['weights'].get(name, 0) + count
+
+    result = []
+    for cluster in clusters.values():
+        plates = sorted(cluster['weights'], key=lambda name: (-cluster['weights'][name], name))
+        result.append({
+            'strength': cluster['strength'],
+            'plates': [{'plate': name, 'count': plate_counts.get(name, 0)} for name in plates],
+            'pairs': sorted(cluster['pairs'], key=lambda pair: (-pair['count'], pair['plates']))
+        })
+    result.sort(key=lambda cluster: (-cluster['strength'], cluster['plates'][0]['plate']))
+    return {'date': date_str, 'clusters': result[:top] if top else result}
+
+
+def get_trending_plates(top=TREND_TOP_K):
+    """
+    获取写入数据时计算好的热门题材（得分降序的前top个，最多TREND_TOP_K个）
+
+    Returns:
+        dict: date为最新一天，windows为TREND_WINDOWS，plates中每个题材包含rank、plate、score、
+              counts（各窗口的涨停数量）和acceleration（短窗口与长窗口日均涨停数量之差）
+    """
+    sync()
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT rank, date, plate, score, counts, acceleration FROM plate_trending ORDER BY rank LIMIT ?",
+            (max(0, min(top, TREND_TOP_K)),)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {
+        'date': rows[0][1] if rows else None,
+        'windows': list(TREND_WINDOWS),
+        'plates': [{'rank': rank, 'plate': plate, 'score': score, 'counts': json.loads(counts),
+                    'acceleration': json.loads(acceleration)}
+                   for rank, _, plate, score, counts, acceleration in rows]
+    }
@@ -0,0 +1,192 @@
+"""
+实时行情推送模块
+每组股票代码只有一个服务端轮询线程，交易时间内向所有订阅者推送行情变化（SSE），
+非交易时间停止轮询上游
+"""
+import datetime
+import json
+import logging
+import queue
+import threading
+import requests
+import upstream
+
+# 东方财富批量行情API
+QUOTE_API_URL = upstream.QUOTE_API_URL
+
+# 推送的行情字段：f2最新价，f3涨跌幅，f6成交额，f12代码，f14名称
+QUOTE_FIELDS = "f2,f3,f6,f12,f14"
+
+# 交易时间内轮询上游的间隔（秒）
+POLL_INTERVAL = 10
+
+# 非交易时间检查是否开盘的间隔（秒）
+IDLE_CHECK_INTERVAL = 30
+
+# 订阅连接的心跳间隔（秒），防止代理服务器断开空闲连接
+HEARTBEAT_INTERVAL = 15
+
+# 北京时间（无夏令时，使用固定时区即可）
+CHINA_TZ = datetime.timezone(datetime.timedelta(hours=8))
+
+# 请求头，模拟浏览器请求
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36',
+    'Referer': 'https://data.eastmoney.com/',
+    'Accept': 'application/json, text/javascript, */*; q=0.01'
+}
+
+
+def is_trading_time(now=None):
+    """检查当前是否在交易时间段内（北京时间周一到周五 9:25-11:30、13:00-15:00），与前端isInTradingHours一致"""
+    now = now or datetime.datetime.now(CHINA_TZ)
+    if now.weekday() >= 5:
+        return False
+    if now.hour < 9 or now.hour > 14:
+        return False
+    if now.hour == 9 and now.minute < 25:
+        return False
+    # 午间休市
+    if (11, 30) < (now.hour, now.minute) < (13, 0):
+        return False
+    return True
+
+
+def fetch_quotes(secids):
+    """从东方财富获取一组股票的实时行情
+
+    Returns:
+        dict: 股票代码(f12)到行情字段的映射
+    """
+    params = {
+        'fields': QUOTE_FIELDS,
+        'fltt': '2',
+        'secids': ','.join(secids)
+    }
+    response = requests.get(QUOTE_API_URL, headers=HEADERS, params=params, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+
+    if not data or data.get('rc') != 0 or not data.get('data'):
+        raise Exception(f"行情API返回数据格式不正确: {data}")
+    return {item['f12']: item for item in data['data'].get('diff', []) if item.get('f12')}
+
+
+class QuotePoller:
+    """一组股票代码的行情轮询器，所有订阅相同代码组的连接共享一个轮询线程"""
+
+    def __init__(self, hub, key):
+        self.hub = hub
+        self.key = key
+        self.subscribers = set()
+        self.snapshot = {}
+        self.thread = None
+
+    def publish(self, message):
+        """向所有订阅者推送消息"""
+        with self.hub._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def poll_once(self):
+        """轮询一次上游，推送发生变化的行情"""
+        try:
+            quotes = fetch_quotes(self.key)
+        except Exception as e:
+            logging.warning(f"轮询行情失败: {e}")
+            return
+
+        changed = [item for code, item in quotes.items() if self.snapshot.get(code) != item]
+        self.snapshot = quotes
+        if changed:
+            self.publish({'diff': changed})
+
+    def run(self):
+        """轮询线程主循环，没有订阅者时退出"""
+        logging.info(f"启动行情轮询线程: {len(self.key)}只股票")
+        # 启动时无论是否交易时间都先获取一次，让页面显示最新（收盘）价格
+        self.poll_once()
+        while self.hub.wait_while_subscribed(self, POLL_INTERVAL if is_trading_time() else IDLE_CHECK_INTERVAL):
+            if is_trading_time():
+                self.poll_once()
+        logging.info(f"行情轮询线程退出: {len(self.key)}只股票")
+
+
+class QuoteHub:
+    """行情订阅中心，按股票代码组管理轮询线程"""
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._pollers = {}
+
+    def subscribe(self, secids):
+        """订阅一组股票的行情
+
+        Returns:
+            (poller, queue.Queue): 轮询器和接收推送消息的队列
+        """
+        key = tuple(sorted(set(secids)))
+        subscriber = queue.Queue()
+        with self._lock:
+            poller = self._pollers.get(key)
+            if poller is None:
+                poller = QuotePoller(self, key)
+                self._pollers[key] = poller
+            poller.subscribers.add(subscriber)
+            # 新订阅者先收到当前完整快照
+            if poller.snapshot:
+                subscriber.put({'diff': list(poller.snapshot.values())})
+            if poller.thread is None:
+                poller.thread = threading.Thread(target=poller.run, daemon=True)
+                poller.thread.start()
+        return poller, subscriber
+
+    def unsubscribe(self, poller, subscriber):
+        """取消订阅，最后一个订阅者离开后轮询线程随之退出"""
+        with self._lock:
+            poller.subscribers.discard(subscriber)
+            if not poller.subscribers:
+                self._pollers.pop(poller.key, None)
+                self._lock.notify_all()
+
+    def wait_while_subscribed(self, poller, timeout):
+        """等待timeout秒后进行下一次轮询，返回轮询器是否仍有订阅者
+
+        其他代码组的订阅者离开时也会唤醒等待，未到时间时继续等待（wait_for按截止时间计算剩余时间），
+        保证轮询间隔不被缩短；本代码组最后一个订阅者离开时立即返回
+        """
+        with self._lock:
+            if self._lock.wait_for(lambda: not poller.subscribers, timeout):
+                poller.thread = None
+                return False
+            return True
+
+    def get_stats(self):
+        """获取订阅统计信息"""
+        with self._lock:
+            return {
+                'pollers': len(self._pollers),
+                'subscribers': sum(len(p.subscribers) for p in self._pollers.values())
+            }
+
+
+# 全局行情订阅中心
+quote_hub = QuoteHub()
+
+
+def stream_quotes(secids):
+    """生成SSE格式的行情推送流，连接断开时自动取消订阅"""
+    poller, subscriber = quote_hub.subscribe(secids)
+    try:
+        # 告诉浏览器断线后的重连间隔
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {json.dumps(message, ensure_ascii=False)}\n\n"
+    finally:
+        quote_hub.unsubscribe(poller, subscriber)
@@ -0,0 +1,152 @@
+"""
+Serverless入口（Vercel）
+冷启动时只导入Flask应用本身：拼音、定时任务、爬虫、筹码计算等较重的模块都在路由第一次用到时才导入，不创建定时任务调度器；
+部署包中的stock_data.db是预先生成全部汇总表的快照（部署前执行python serverless.py --build-snapshot），
+冷启动时复制到可写的临时目录，各汇总模块直接读取快照，跳过每个进程第一次查询时的补齐检查
+
+用法：
+    python serverless.py --build-snapshot          # 部署前生成汇总表并标记为快照
+    python serverless.py --profile                 # 输出冷启动导入耗时报告
+    python serverless.py --profile --output cold_start.jsonl --label v1.3.0   # 追加一条记录，按版本跟踪冷启动耗时
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+
+# 部署包中的数据库快照
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stock_data.db')
+
+# 运行时可写的数据目录（Vercel中只有临时目录可写）
+RUNTIME_DIR = os.environ.get('SERVERLESS_DATA_DIR', tempfile.gettempdir())
+
+# 冷启动时不应导入的较重模块，导入耗时报告中单独列出
+HEAVY_MODULES = ('pypinyin', 'apscheduler', 'crawler', 'huoli', 'pandas', 'numpy', 'chip_analytics', 'bitmap_index')
+
+# 导入耗时报告默认列出的模块数
+PROFILE_TOP = 15
+
+
+def is_snapshot(path):
+    """数据库是否已由--build-snapshot生成全部汇总表"""
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            return conn.execute("SELECT 1 FROM snapshot_info WHERE key='built_at'").fetchone() is not None
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+
+def prepare_environment():
+    """在导入应用前设置Serverless环境：复制数据库快照到临时目录，关闭定时任务"""
+    os.environ.setdefault('SERVERLESS', '1')
+    db_path = os.path.join(RUNTIME_DIR, 'stock_data.db')
+    if not os.path.exists(db_path) and os.path.exists(SNAPSHOT_PATH):
+        # 同一个实例的后续调用复用已复制的数据库（包括之后定时抓取写入的数据）
+        shutil.copyfile(SNAPSHOT_PATH, db_path)
+    if os.path.exists(db_path):
+        os.environ.setdefault('STOCK_DB_PATH', db_path)
+        if is_snapshot(db_path):
+            os.environ.setdefault('DB_SNAPSHOT', '1')
+    os.environ.setdefault('KLINE_DB_PATH', os.path.join(RUNTIME_DIR, 'kline_data.db'))
+
+
+def build_snapshot():
+    """补齐全部汇总表，并在数据库中记录快照生成时间"""
+    import datetime
+    import db
+    import plate_stats
+    import stock_index
+    import bitmap_index
+
+    plate_stats.sync()
+    stock_index.sync()
+    bitmap_index.sync()
+    if not db.get_data_version():
+        db._bump_data_version()
+
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS snapshot_info (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT OR REPLACE INTO snapshot_info (key, value) VALUES ('built_at', ?)",
+                     (datetime.datetime.now().isoformat(timespec='seconds'),))
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"已生成数据库快照: {db.DB_PATH}，共{len(db.get_available_dates())}个交易日")
+
+
+def profile_imports(module='serverless', repeat=3):
+    """
+    在新的解释器中用-X importtime测量导入module的耗时，取repeat次中总耗时最少的一次
+
+    Returns:
+        dict: module、total_ms、modules（耗时最多的模块名到累计耗时毫秒的映射）、heavy（导入了的较重模块）
+    """
+    import subprocess
+    import sys
+
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as data_dir:
+            env = dict(os.environ, SERVERLESS_DATA_DIR=data_dir, SERVERLESS='1')
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                    cwd=os.path.dirname(SNAPSHOT_PATH), env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"导入{module}失败: {result.stderr.strip().splitlines()[-1]}")
+        timings = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            timings.setdefault(name.strip(), int(cumulative) / 1000)
+        if best is None or timings.get(module, 0) < best.get(module, 0):
+            best = timings
+
+    top = sorted(((name, ms) for name, ms in best.items() if name != module), key=lambda item: -item[1])
+    return {
+        'module': module,
+        'total_ms': round(best.get(module, 0), 1),
+        'modules': {name: round(ms, 1) for name, ms in top[:PROFILE_TOP]},
+        'heavy': sorted(name for name in best if name in HEAVY_MODULES)
+    }
+
+
+def main():
+    import argparse
+    import datetime
+    import json
+
+    parser = argparse.ArgumentParser(description='Serverless入口：生成数据库快照、输出冷启动导入耗时报告')
+    parser.add_argument('--build-snapshot', action='store_true', help='补齐全部汇总表并标记为快照')
+    parser.add_argument('--profile', action='store_true', help='输出冷启动导入耗时报告')
+    parser.add_argument('--module', default='serverless', help='测量的入口模块（app为完整应用）')
+    parser.add_argument('--repeat', type=int, default=3, help='测量次数，取最快的一次')
+    parser.add_argument('--output', help='把报告作为一行JSON追加到该文件')
+    parser.add_argument('--label', help='报告的版本标记，默认为当天日期')
+    args = parser.parse_args()
+
+    if args.build_snapshot:
+        build_snapshot()
+    if args.profile:
+        report = profile_imports(args.module, args.repeat)
+        report['label'] = args.label or datetime.date.today().isoformat()
+        print(f"导入{report['module']}共{report['total_ms']}ms")
+        for name, ms in report['modules'].items():
+            print(f"  {ms:8.1f}ms  {name}")
+        print(f"冷启动导入的较重模块: {', '.join(report['heavy']) or '无'}")
+        if args.output:
+            with open(args.output, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(report, ensure_ascii=False) + '\n')
+            print(f"报告已追加到{args.output}")
+    if not (args.build_snapshot or args.profile):
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
+else:
+    prepare_environment()
+    from app import app
@@ -60,7 +60,7 @@ function fetchKLineData(stockCode, stockName) {
                  today.getDate().toString().padStart(2, '0');
     
     // 优化API请求参数，使用后端代理API
-    var proxyUrl = `/api/proxy-eastmoney-kline-data?secid=${secid}&klt=101&fqt=1&lmt=250&end=${endDate}`;
+    var proxyUrl = `/api/proxy-eastmoney-kline-data?secid=${secid}&klt=101&fqt=1&lmt=250&end=${endDate}&format=columnar`;
     
     // 发送API请求获取数据
     return fetch(proxyUrl)
@@ -617,6 +617,21 @@ window.addEventListener('load', function() {
 
 // 添加解析K线数据的工具函数
 function parseKLineData(data) {
+    // 按列格式（format=columnar）的数值已在服务端解码，直接使用
+    if (data.columns) {
+        var columns = data.columns;
+        return {
+            dates: columns.date,
+            klineData: columns.date.map(function(date, i) {
+                // 数据顺序为 [开盘, 收盘, 最高, 最低] 符合ECharts的K线图要求
+                return [columns.open[i], columns.close[i], columns.high[i], columns.low[i]];
+            }),
+            volumeData: columns.volume,
+            turnoverData: columns.amount,
+            changePercentData: columns.change_pct
+        };
+    }
+    
     var dates = data.klines.map(function(kline) {
         var parts = kline.split(',');
         return parts[0]; // f51: 日期
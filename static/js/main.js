@@ -58,58 +58,14 @@ function filterByDate(dateValue) {
         return;
     }
     
-    // 统一日期格式：将YYYY-MM-DD转换为YYYYMMDD
-    var normalizedDate = dateValue.replace(/-/g, '');
-    
-    // 发送AJAX请求获取指定日期的数据
-    fetch('/get-data-by-date?date=' + encodeURIComponent(normalizedDate))
-        .then(function(response) { return response.json(); })
-        .then(function(data) {
-            var tbody = document.getElementById('stockTableBody');
-            tbody.innerHTML = '';
-            
-            if (data.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="9" class="no-data">该日期暂无数据</td></tr>';
-                return;
-            }
-            
-            // 渲染数据
-            Array.prototype.forEach.call(data, function(stock) {
-                    var row = document.createElement('tr');
-                    var link = 'https://xuangutong.com.cn/stock/' + stock.code_part + '.' + stock.market.toUpperCase();
-                    var codeClass = stock.code_part.startsWith('3') ? 'orange-code' : '';
-                    var nameClass = stock.code_part.startsWith('688') ? 'stock-name-link blue-text' : (stock.code_part.startsWith('3') || stock.code_part.startsWith('68')) ? 'stock-name-link orange-text' : 'stock-name-link';
-                    row.innerHTML = 
-                        '<td><a href="' + link + '" target="_blank" class="' + nameClass + '">' + stock.name + '</a></td>' +
-                        '<td><div class="time-chart" data-code="' + stock.code_part + '"></div></td>' +
-                        '<td class="price"></td>' +
-                        '<td class="change-percentage"></td>' +
-                        '<td class="' + codeClass + '">' + stock.code_part + '</td>' +
-                        '<td>' + stock.market + '</td>' +
-                        '<td>' + (stock.m_days_n_boards ? '<span class="days-boards-tag">' + stock.m_days_n_boards + '</span>' : stock.m_days_n_boards) + '</td>' +
-                        '<td>' + (stock.description ? stock.description.substring(0, 100) + (stock.description.length > 100 ? '...' : '') : '') + '</td>' +
-                        '<td>' + stock.plates + '</td>' +
-                        '<td>' + stock.date + '</td>';
-                    tbody.appendChild(row);
-                });
-            
-            // 渲染完历史数据后，重置分时图状态并重新渲染
-            visibleStockCodes = {}; // 重置可见股票代码集合
-    timeChartInstances = {}; // 重置图表实例
-            setTimeout(function() {
-                renderVisibleCharts(); // 重新渲染可见区域内的分时图
-                fetchRealTimeStockData(); // 获取实时股票数据
-                // 更新题材统计
-                updatePlateStats();
-                // 重新绑定K线图事件
-                if (typeof initStockNameEvents === 'function') {
-                    initStockNameEvents();
-                }
-            }, 100);
-        })
-        .catch(function(error) {
-            console.error('获取指定日期数据失败:', error);
-        });
+    // 统一日期格式：将YYYY-MM-DD转换为YYYYMMDD，保留表头的题材筛选条件
+    stockTable.query = {
+        date: dateValue.replace(/-/g, ''),
+        keyword: '',
+        plate: document.getElementById('plateFilter').value.trim(),
+        latest: ''
+    };
+    loadStockPage(1, '该日期暂无数据');
 }
 
 // 重置过滤条件
@@ -242,18 +198,18 @@ document.addEventListener('DOMContentLoaded', function() {
                         
                         // 直接调用API检查日期是否有数据，而仅依赖缓存列表
                         console.log('检查日期是否有数据:', selectedDate);
-                        fetch('/get-data-by-date?date=' + encodeURIComponent(selectedDate))
+                        fetch('/api/stocks?date=' + encodeURIComponent(selectedDate) + '&page_size=1')
                             .then(function(response) {
                                 return response.json();
                             })
                             .then(function(data) {
-                                // 如果返回的数据为空数组，说明该日期没有数据
-                                if (!data || data.length === 0) {
+                                // 如果总行数为0，说明该日期没有数据
+                                if (!data || !data.total) {
                                     console.log('日期无数据:', selectedDate, data);
                                     alert('该日期无数据');
                                     e.target.value = '';
                                 } else {
-                                    console.log('日期有数据:', selectedDate, '数据条数:', data.length);
+                                    console.log('日期有数据:', selectedDate, '数据条数:', data.total);
                                 }
                             })
                             .catch(function(error) {
@@ -281,18 +237,8 @@ document.addEventListener('DOMContentLoaded', function() {
         renderVisibleCharts();
     }, 100));
     
-    // 启动定时刷新控制
-    controlRefreshTimer();
-    
-    // 启动分时图定时刷新控制
-    controlTimeChartRefreshTimer();
-    
-    // 每5分钟检查一次交易时间状态，确保在交易时间开始时自动启动刷新
-    setInterval(controlRefreshTimer, 5 * 60 * 1000);
-    setInterval(controlTimeChartRefreshTimer, 5 * 60 * 1000);
-    
-    // 页面加载完成后自动获取和显示实时股票数据
-    fetchRealTimeStockData();
+    // 订阅页面上股票的实时行情推送（同时驱动分时图刷新）
+    subscribeQuoteStream();
 });
 // 刷新状态控制变量
 var refreshTimer = null;
@@ -301,6 +247,12 @@ var retryCount = 0;
 var MAX_RETRIES = 3;
 var REFRESH_INTERVAL = 60000; // 60秒
 
+// 实时行情推送连接
+var quoteEventSource = null;
+var lastTimeChartRefresh = 0;
+// 不支持SSE时退回定时轮询，检查交易时间的定时器只注册一次
+var quoteFallbackStarted = false;
+
 // 分时图相关变量
 var timeChartInstances = {}; // 存储图表实例，使用对象替代Map
 var visibleStockCodes = {}; // 存储可见的股票代码，使用对象替代Set
@@ -312,24 +264,28 @@ var dataCache = {
     cacheDuration: 30000 // 缓存30秒
 };
 
-// 根据股票代码获取分时数据的API调用函数，暂时禁用缓存以解决数据显示问题
-function fetchTimeSharingData(stockCode) {
-    // 直接获取最新数据，不使用缓存
+// 批量获取多只股票的分时数据，一次请求返回所有股票的紧凑数据
+function fetchTimeSharingBatch(stockCodes) {
+    if (!stockCodes || stockCodes.length === 0) {
+        return Promise.resolve({});
+    }
+    
     // 使用后端代理API避免CORS问题
-    var proxyUrl = '/api/time-sharing-data?code=' + encodeURIComponent(stockCode);
+    var proxyUrl = '/api/time-sharing-batch?codes=' + encodeURIComponent(stockCodes.join(','));
     
-    // 返回Promise对象
     return fetch(proxyUrl)
         .then(function(response) {
             if (!response.ok) {
                 throw new Error('HTTP error! status: ' + response.status);
             }
-            // 解析JSON响应
             return response.json();
         })
+        .then(function(result) {
+            return (result && result.data) || {};
+        })
         .catch(function(error) {
-            console.error(`获取股票 ${stockCode} 的分时数据失败:`, error);
-            return null;
+            console.error('批量获取分时数据失败:', error);
+            return {};
         });
 }
 
@@ -356,84 +312,32 @@ function generateSecid(stockCode) {
     return market + '.' + stockCode;
 }
 
-// 解析分时数据的函数
-function parseTimeSharingData(data) {
-    if (!data || data.rc !== 0 || !data.data) {
+// 解析批量接口返回的单只股票分时数据
+function parseCompactTimeSharingData(item) {
+    if (!item || item.error || !item.preClose || !Array.isArray(item.times)) {
         return null;
     }
     
-    var preClose = data.data.preClose;
-    var trends = data.data.trends;
-    
-    if (!preClose || !Array.isArray(trends)) {
-        return null;
-    }
-    
-    // 解析trends数组
     var parsedData = {
-        preClose: parseFloat(preClose),
+        preClose: parseFloat(item.preClose),
         dataPoints: []
     };
     
-    trends.forEach(function(trendItem) {
-        var parts = trendItem.split(',');
-        var time = parts[0];
-        var price = parts[1];
-        if (time && price) {
-            // 使用更兼容的方式解析日期时间
-            // 假设time格式为："2024-10-15 09:30:00"
-            var dateTime = parseDateTime(time);
-            parsedData.dataPoints.push({
-                time: dateTime,
-                price: parseFloat(price)
-            });
-            
-            // 调试：检查13:00-13:01的数据点
-            if (time.includes('13:00') || time.includes('13:01')) {
-                console.log('原始数据中的13:00-13:01数据点:', time, '价格:', price);
-            }
-        }
-    });
-    
-    console.log('过滤前的数据点数量:', parsedData.dataPoints.length);
-    
-    // 过滤数据，排除11:31~12:59的时间段
-    parsedData.dataPoints = parsedData.dataPoints.filter(function(point) {
-        var hours = point.time.getHours();
-        var minutes = point.time.getMinutes();
-        
-        // 明确的过滤条件：排除11:31-12:59之间的所有时间
-        var shouldFilter = (hours === 11 && minutes >= 31) || (hours === 12);
+    for (var i = 0; i < item.times.length; i++) {
+        // 假设time格式为："2024-10-15 09:30"
+        var dateTime = parseDateTime(item.times[i]);
+        var hours = dateTime.getHours();
+        var minutes = dateTime.getMinutes();
         
-        // 调试：检查关键时间点
-        if ((hours === 11 && minutes >= 29) || (hours === 13 && minutes <= 2)) {
-            console.log('检查关键数据点:', hours + ':' + minutes, '是否被过滤:', shouldFilter);
+        // 排除11:31-12:59之间的午休时间
+        if ((hours === 11 && minutes >= 31) || hours === 12) {
+            continue;
         }
         
-        return !shouldFilter;
-    });
-    
-    console.log('过滤后的数据点数量:', parsedData.dataPoints.length);
-    
-    // 调试：查看过滤后的13:00-13:02数据点
-    var afternoonDataPoints = parsedData.dataPoints.filter(function(point) {
-        var hours = point.time.getHours();
-        var minutes = point.time.getMinutes();
-        return hours === 13 && minutes <= 2;
-    });
-    console.log('过滤后的13:00-13:02数据点:', afternoonDataPoints);
-    
-    // 调试：查看过滤后的最后10个数据点
-    console.log('过滤后的最后10个数据点:', parsedData.dataPoints.slice(-10));
-    
-    // 调试：查看过滤后的前10个下午数据点
-    var afternoonStartIndex = parsedData.dataPoints.findIndex(function(point) {
-        var hours = point.time.getHours();
-        return hours >= 13;
-    });
-    if (afternoonStartIndex !== -1) {
-        console.log('下午数据点开始位置:', afternoonStartIndex);
-        console.log('前10个下午数据点:', parsedData.dataPoints.slice(afternoonStartIndex, afternoonStartIndex + 10));
+        parsedData.dataPoints.push({
+            time: dateTime,
+            price: item.prices[i]
+        });
     }
     
     return parsedData;
@@ -642,9 +546,9 @@ function updateTimeChart(chart, parsedData) {
     });
 }
 
-// 绘制分时图的主函数
-function drawTimeChart(container, stockCode) {
-    if (!container || !stockCode) {
+// 绘制分时图的主函数，parsedData为已解析的分时数据
+function drawTimeChart(container, stockCode, parsedData) {
+    if (!container || !stockCode || !parsedData) {
         return;
     }
     
@@ -654,53 +558,13 @@ function drawTimeChart(container, stockCode) {
         return;
     }
     
-    // 如果已经存在图表实例，直接更新数据
-    if (timeChartInstances[stockCode]) {
-        fetchTimeSharingData(stockCode)
-            .then(function(rawData) {
-                if (!rawData) {
-                    return;
-                }
-                
-                // 解析数据
-                var parsedData = parseTimeSharingData(rawData);
-                if (!parsedData) {
-                    return;
-                }
-                
-                // 更新图表
-                updateTimeChart(timeChartInstances[stockCode], parsedData);
-            })
-            .catch(function(error) {
-                console.error('更新股票 ' + stockCode + ' 分时图失败:', error);
-            });
-    } else {
-        // 获取分时数据
-        fetchTimeSharingData(stockCode)
-            .then(function(rawData) {
-                if (!rawData) {
-                    return;
-                }
-                
-                // 解析数据
-                var parsedData = parseTimeSharingData(rawData);
-                if (!parsedData) {
-                    return;
-                }
-                
-                // 初始化图表
-                var chart = initTimeChart(container, stockCode);
-                if (!chart) {
-                    return;
-                }
-                
-                // 更新图表
-                updateTimeChart(chart, parsedData);
-            })
-            .catch(function(error) {
-                console.error('绘制股票 ' + stockCode + ' 分时图失败:', error);
-            });
+    // 如果已经存在图表实例，直接更新数据，否则初始化图表
+    var chart = timeChartInstances[stockCode] || initTimeChart(container, stockCode);
+    if (!chart) {
+        return;
     }
+    
+    updateTimeChart(chart, parsedData);
 }
 
 // 检查元素是否在可视区域内（兼容跨浏览器）
@@ -741,52 +605,56 @@ function renderVisibleCharts() {
         return;
     }
     
+    // 收集新进入可视区域的分时图，合并为一次批量请求
+    var pendingContainers = {};
     Array.prototype.forEach.call(chartContainers, function(container) {
         var stockCode = container.getAttribute('data-code');
         
         if (stockCode && isElementInViewport(container) && !visibleStockCodes[stockCode]) {
             // 元素在可视区域内且未渲染过
             visibleStockCodes[stockCode] = true;
-            drawTimeChart(container, stockCode);
+            pendingContainers[stockCode] = container;
         }
     });
+    
+    var stockCodes = Object.keys(pendingContainers);
+    if (stockCodes.length === 0) {
+        return;
+    }
+    
+    fetchTimeSharingBatch(stockCodes)
+        .then(function(batchData) {
+            stockCodes.forEach(function(stockCode) {
+                var parsedData = parseCompactTimeSharingData(batchData[stockCode]);
+                if (parsedData) {
+                    drawTimeChart(pendingContainers[stockCode], stockCode, parsedData);
+                }
+            });
+        })
+        .catch(function(error) {
+            console.error('绘制分时图失败:', error);
+        });
 }
 
 // 刷新所有已渲染的分时图
 function refreshTimeCharts() {
-    if (Object.keys(visibleStockCodes).length === 0) {
-        return;
-    }
-    
     // 获取所有可见的股票代码
     var stockCodes = Object.keys(visibleStockCodes);
+    if (stockCodes.length === 0) {
+        return;
+    }
     
-    // 使用Promise.all并发处理所有请求
-    var promises = Array.prototype.map.call(stockCodes, function(stockCode) {
-        // 获取最新的分时数据
-        return fetchTimeSharingData(stockCode)
-            .then(function(rawData) {
-                if (!rawData) {
-                    return;
-                }
-                
-                // 解析数据
-                var parsedData = parseTimeSharingData(rawData);
-                if (!parsedData) {
-                    return;
-                }
-                
-                // 获取对应的图表实例
+    // 一次批量请求获取所有可见股票的最新分时数据
+    fetchTimeSharingBatch(stockCodes)
+        .then(function(batchData) {
+            stockCodes.forEach(function(stockCode) {
+                var parsedData = parseCompactTimeSharingData(batchData[stockCode]);
                 var chart = timeChartInstances[stockCode];
-                if (chart) {
-                    // 更新图表
+                if (parsedData && chart) {
                     updateTimeChart(chart, parsedData);
                 }
             });
-    });
-    
-    // 处理所有Promise完成后的情况
-    Promise.all(promises)
+        })
         .catch(function(error) {
             console.error('刷新分时图失败:', error);
         });
@@ -837,7 +705,7 @@ function isInTradingHours() {
         return false;
     }
     
-    // 判断是否在9:25-15:00之间
+    // 判断是否在9:25-11:30、13:00-15:00之间
     if (hours < 9 || hours > 14) {
         return false;
     }
@@ -846,29 +714,22 @@ function isInTradingHours() {
         return false;
     }
     
+    // 午间休市（11:30-13:00）
+    if ((hours === 11 && minutes > 30) || hours === 12) {
+        return false;
+    }
+    
     return true;
 }
 
-// 获取实时股票数据
-function fetchRealTimeStockData() {
-    // 如果正在刷新中，直接返回
-    if (isRefreshing) {
-        return;
-    }
-    
+// 收集表格中的股票行，生成去重后的secid列表和行映射
+function collectQuoteTargets() {
     var tbody = document.getElementById('stockTableBody');
     // 使用更兼容的方式选择行
     var rows = Array.prototype.slice.call(tbody.getElementsByTagName('tr')).filter(function(row) {
         return !row.querySelector('td[colspan]');
     });
     
-    if (rows.length === 0) {
-        return;
-    }
-    
-    isRefreshing = true;
-    retryCount = 0;
-    
     // 收集所有股票代码并生成secid
     var secids = [];
     var codeMap = {}; // 用于存储股票代码和对应的行
@@ -898,10 +759,73 @@ function fetchRealTimeStockData() {
         }
     });
     
+    return { rows: rows, secids: secids, codeMap: codeMap };
+}
+
+// 订阅当前页面股票的实时行情推送，替代每个页面各自的定时轮询
+function subscribeQuoteStream() {
+    // 关闭之前的订阅
+    if (quoteEventSource) {
+        quoteEventSource.close();
+        quoteEventSource = null;
+    }
+    
+    // 浏览器不支持SSE时退回定时轮询：每次翻页、筛选或排序都立即按当前页面的股票刷新，
+    // 轮询定时器每次重建，检查交易时间的定时器只在第一次调用时注册
+    if (typeof EventSource === 'undefined') {
+        controlRefreshTimer();
+        controlTimeChartRefreshTimer();
+        if (!quoteFallbackStarted) {
+            quoteFallbackStarted = true;
+            setInterval(controlRefreshTimer, 5 * 60 * 1000);
+            setInterval(controlTimeChartRefreshTimer, 5 * 60 * 1000);
+        }
+        return;
+    }
+    
+    var targets = collectQuoteTargets();
+    if (targets.secids.length === 0) {
+        return;
+    }
+    
+    quoteEventSource = new EventSource('/api/quote-stream?secids=' + targets.secids.join(','));
+    quoteEventSource.onmessage = function(event) {
+        var message = JSON.parse(event.data);
+        if (message && message.diff) {
+            updateStockTable(message.diff, targets.rows, targets.codeMap);
+        }
+        
+        // 服务端只在交易时间推送行情，借此按刷新间隔刷新分时图
+        if (isInTradingHours() && Date.now() - lastTimeChartRefresh >= REFRESH_INTERVAL) {
+            lastTimeChartRefresh = Date.now();
+            refreshTimeCharts();
+        }
+    };
+    quoteEventSource.onerror = function() {
+        // EventSource会自动重连，这里只记录日志
+        console.warn('实时行情推送连接中断，等待自动重连');
+    };
+}
+
+// 获取实时股票数据
+function fetchRealTimeStockData() {
+    // 如果正在刷新中，直接返回
+    if (isRefreshing) {
+        return;
+    }
+    
+    var targets = collectQuoteTargets();
+    var rows = targets.rows;
+    var secids = targets.secids;
+    var codeMap = targets.codeMap;
+    
     if (secids.length === 0) {
         return;
     }
     
+    isRefreshing = true;
+    retryCount = 0;
+    
     // 构建API URL
     // 使用后端代理API避免CORS问题
     var apiUrl = '/api/proxy-eastmoney-stock-data?secids=' + secids.join(',');
@@ -1036,185 +960,192 @@ function updateStockTable(data, rows, codeMap) {
     });
 }
 
-// 排序状态变量（全局）
-var isSortedDesc = false; // 几天几板排序状态
-var isChangeSortedDesc = false; // 涨跌幅排序状态
-
-// 排序函数
-function sortTable(columnIndex) {
-    // ... 现有排序逻辑不变 ...
-}
+// 表格查询状态：筛选、排序和分页都由/api/stocks在服务端完成，浏览器只保存当前一页
+var stockTable = {
+    query: { date: '', keyword: '', plate: '', latest: '' },
+    sort: 'default',
+    order: 'desc',
+    page: 1,
+    pageSize: 50,
+    total: 0,
+    serial: 0, // 每次查询递增，用于忽略过期的响应
+    plateCounts: null // 不是某一天的完整列表时，符合条件的全部行的题材统计
+};
 
-function sortByDaysBoards() {
+// 从服务端渲染的第一页初始化查询状态
+function initStockTable() {
     var tbody = document.getElementById('stockTableBody');
-    var rows = Array.prototype.slice.call(tbody.getElementsByTagName('tr')).filter(function(row) {
-        return !row.querySelector('td[colspan]');
-    });
-    var header = document.querySelector('th.sortable:nth-child(7)');
-    
-    // 解析几天几板中的数字
-    function getBoardCount(text) {
-        if (!text) return 0;
-        // 匹配天数和板数，例如 "3天3板" 会匹配到两个数字 [3, 3]
-        var matches = text.match(/\d+/g);
-        if (matches) {
-            // 优先使用板数（第二个数字），如果没有则使用天数（第一个数字）
-            return parseInt(matches[matches.length - 1]);
-        }
-        return 0;
+    if (!tbody) {
+        return;
+    }
+    stockTable.query.date = tbody.dataset.day || '';
+    stockTable.query.keyword = tbody.dataset.keyword || '';
+    stockTable.total = parseInt(tbody.dataset.total || '0', 10);
+    stockTable.pageSize = parseInt(tbody.dataset.pageSize || '50', 10);
+    renderPager();
+    
+    // 搜索结果的题材统计需要覆盖全部页
+    if (!isFullDayQuery() && stockTable.total > 0) {
+        var serial = stockTable.serial;
+        fetch('/api/stocks?' + buildStockQueryParams(1, 1, true))
+            .then(function(response) { return response.json(); })
+            .then(function(result) {
+                if (serial === stockTable.serial && result.plate_counts) {
+                    stockTable.plateCounts = result.plate_counts;
+                    updatePlateStats();
+                }
+            })
+            .catch(function(error) {
+                console.error('获取题材统计失败:', error);
+            });
     }
-    
-    // 排序
-    rows.sort(function(a, b) {
-        var aCount = getBoardCount(a.cells[6].textContent);
-        var bCount = getBoardCount(b.cells[6].textContent);
-        
-        if (isSortedDesc) {
-            return aCount - bCount; // 升序
-        } else {
-            return bCount - aCount; // 降序
-        }
-    });
-    
-    // 重新添加行
-    Array.prototype.forEach.call(rows, function(row) {
-        tbody.appendChild(row);
-    });
-    
-    // 更新排序状态
-    isSortedDesc = !isSortedDesc;
-    
-    // 更新表头样式
-    header.classList.toggle('sorted', !isSortedDesc);
 }
 
-function sortByChangePercentage() {
-    console.log('开始涨跌幅排序...');
-    var tbody = document.getElementById('stockTableBody');
-    var rows = Array.prototype.slice.call(tbody.getElementsByTagName('tr')).filter(function(row) {
-        return !row.querySelector('td[colspan]');
-    });
-    var header = document.querySelector('th.sortable:nth-child(4)');
-    
-    // 解析涨跌幅百分比数值
-    function getChangePercentage(element) {
-        if (!element) {
-            console.log('元素不存在');
-            return 0;
-        }
-        // 直接从td元素获取文本（td本身就有change-percentage类）
-        var text = element.textContent || '';
-        console.log('涨跌幅文本:', text);
-        if (!text) return 0;
-        // 移除%符号并转换为数字
-        var matches = text.match(/[-+]?\d+(?:\.\d+)?/);
-        if (matches) {
-            var value = parseFloat(matches[0]);
-            console.log('解析的数值:', value);
-            return value;
-        }
-        console.log('未找到匹配的数值');
-        return 0;
-    }
-    
-    // 排序前记录一些数据
-    console.log('排序前的前5行数据:');
-    for (var i = 0; i < Math.min(5, rows.length); i++) {
-        var cell = rows[i].cells[3];
-        var text = cell.textContent || '';
-        console.log('行' + (i+1) + ': ' + text);
-    }
-    
-    // 排序
-    rows.sort(function(a, b) {
-        var aChange = getChangePercentage(a.cells[3]); // 涨跌幅是第4列，索引为3
-        var bChange = getChangePercentage(b.cells[3]);
-        
-        console.log('比较:', aChange, 'vs', bChange);
-        
-        if (isChangeSortedDesc) {
-            return aChange - bChange; // 升序
-        } else {
-            return bChange - aChange; // 降序
+// 表格是否为某一天的完整涨停列表（题材统计读取服务端的每日汇总）
+function isFullDayQuery() {
+    return Boolean(stockTable.query.date && !stockTable.query.keyword && !stockTable.query.plate);
+}
+
+// 生成/api/stocks的查询参数
+function buildStockQueryParams(page, pageSize, withPlateCounts) {
+    var params = new URLSearchParams();
+    Object.keys(stockTable.query).forEach(function(key) {
+        if (stockTable.query[key]) {
+            params.set(key, stockTable.query[key]);
         }
     });
-    
-    // 排序后记录一些数据
-    console.log('排序后的前5行数据:');
-    for (var i = 0; i < Math.min(5, rows.length); i++) {
-        var cell = rows[i].cells[3];
-        var text = cell.textContent || '';
-        console.log('行' + (i+1) + ': ' + text);
+    params.set('sort', stockTable.sort);
+    params.set('order', stockTable.order);
+    params.set('page', page);
+    params.set('page_size', pageSize);
+    if (withPlateCounts) {
+        params.set('plate_counts', '1');
     }
-    
-    // 重新添加行
-    Array.prototype.forEach.call(rows, function(row) {
-        tbody.appendChild(row);
-    });
-    
-    // 更新排序状态
-    isChangeSortedDesc = !isChangeSortedDesc;
-    console.log('更新排序状态为:', isChangeSortedDesc);
-    
-    // 更新表头样式
-    header.classList.toggle('sorted', !isChangeSortedDesc);
+    return params.toString();
 }
 
-// 题材筛选功能
-function filterByPlate(plateValue) {
-    const tbody = document.getElementById('stockTableBody');
-    // 使用更兼容的方式选择行
-    const rows = Array.prototype.slice.call(tbody.getElementsByTagName('tr')).filter(function(row) {
-        const cells = row.getElementsByTagName('td');
-        return cells.length > 0 && cells[0].getAttribute('colspan') === null;
-    });
-    
-    // 使用display属性来控制行的显示和隐藏，而不是visibility
-    const updateRowVisibility = (showAll) => {
-        rows.forEach(row => {
-            // 使用display属性控制显示/隐藏
-            row.style.display = showAll ? '' : 'none';
-            // 移除visibility属性设置
-        });
-    };
-    
-    if (!plateValue || plateValue.trim() === '') {
-        // 如果没有输入筛选条件，显示所有行
-        updateRowVisibility(true);
-        return;
-    }
-    
-    // 先将所有行设置为隐藏，然后显示匹配的行
-    updateRowVisibility(false);
+// 生成一行股票数据
+function createStockRow(stock) {
+    var row = document.createElement('tr');
+    var link = 'https://xuangutong.com.cn/stock/' + stock.code_part + '.' + stock.market.toUpperCase();
+    var codeClass = stock.code_part.startsWith('3') ? 'orange-code' : '';
+    var nameClass = stock.code_part.startsWith('688') ? 'stock-name-link blue-text' : (stock.code_part.startsWith('3') || stock.code_part.startsWith('68')) ? 'stock-name-link orange-text' : 'stock-name-link';
+    row.innerHTML = 
+        '<td><a href="' + link + '" target="_blank" class="' + nameClass + '">' + stock.name + '</a></td>' +
+        '<td><div class="time-chart" data-code="' + stock.code_part + '"></div></td>' +
+        '<td class="price"></td>' +
+        '<td class="change-percentage"></td>' +
+        '<td class="' + codeClass + '">' + stock.code_part + '</td>' +
+        '<td>' + stock.market + '</td>' +
+        '<td>' + (stock.m_days_n_boards ? '<span class="days-boards-tag">' + stock.m_days_n_boards + '</span>' : stock.m_days_n_boards) + '</td>' +
+        '<td>' + (stock.description ? stock.description.substring(0, 100) + (stock.description.length > 100 ? '...' : '') : '') + '</td>' +
+        '<td>' + stock.plates + '</td>' +
+        '<td>' + stock.date + '</td>';
+    return row;
+}
+
+// 查询并渲染表格的某一页
+function loadStockPage(page, emptyMessage) {
+    var serial = ++stockTable.serial;
+    // 筛选条件变化时（第一页）一起获取全部行的题材统计，某一天的完整列表由题材热度接口提供
+    var withPlateCounts = page === 1 && !isFullDayQuery();
     
-    // 发送AJAX请求到后端API进行筛选
-    fetch(`/filter-by-plate?plate=${encodeURIComponent(plateValue)}`)
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('Network response was not ok');
+    fetch('/api/stocks?' + buildStockQueryParams(page, stockTable.pageSize, withPlateCounts))
+        .then(function(response) { return response.json(); })
+        .then(function(result) {
+            // 请求返回前已经发起了新的查询
+            if (serial !== stockTable.serial) {
+                return;
             }
-            return response.json();
-        })
-        .then(filteredStocks => {
-            // 显示匹配的行，隐藏不匹配的行
-            rows.forEach(row => {
-                // 正确选择股票代码列（第五列，索引4）
-                const codeElement = row.getElementsByTagName('td')[4];
-                if (codeElement) {
-                    const code = codeElement.textContent.trim();
-                    const isMatch = filteredStocks.some(stock => stock.code_part === code);
-                    // 使用display而不是visibility来控制显示/隐藏
-                    row.style.display = isMatch ? '' : 'none';
+            if (result.error) {
+                throw new Error(result.error);
+            }
+            stockTable.page = result.page;
+            stockTable.total = result.total;
+            if (withPlateCounts) {
+                stockTable.plateCounts = result.plate_counts;
+            } else if (isFullDayQuery()) {
+                stockTable.plateCounts = null;
+            }
+            
+            var tbody = document.getElementById('stockTableBody');
+            // 表格为某一天的完整涨停列表时，题材统计读取服务端汇总结果
+            tbody.dataset.day = isFullDayQuery() ? stockTable.query.date : '';
+            tbody.innerHTML = '';
+            if (result.data.length === 0) {
+                tbody.innerHTML = '<tr><td colspan="10" class="no-data">' + (emptyMessage || '没有符合条件的股票数据') + '</td></tr>';
+            } else {
+                result.data.forEach(function(stock) {
+                    tbody.appendChild(createStockRow(stock));
+                });
+            }
+            renderPager();
+            
+            // 重置分时图状态并重新渲染
+            visibleStockCodes = {}; // 重置可见股票代码集合
+            timeChartInstances = {}; // 重置图表实例
+            setTimeout(function() {
+                renderVisibleCharts(); // 重新渲染可见区域内的分时图
+                subscribeQuoteStream(); // 重新订阅当前表格股票的实时行情
+                // 更新题材统计
+                updatePlateStats();
+                // 重新绑定K线图事件
+                if (typeof initStockNameEvents === 'function') {
+                    initStockNameEvents();
                 }
-            });
+            }, 100);
         })
-        .catch(error => {
-            console.error('筛选题材失败:', error);
-            // 出错时显示所有行
-            updateRowVisibility(true);
+        .catch(function(error) {
+            console.error('查询股票数据失败:', error);
+            if (serial === stockTable.serial) {
+                var tbody = document.getElementById('stockTableBody');
+                tbody.dataset.day = '';
+                tbody.innerHTML = '<tr><td colspan="10" class="no-data">查询股票数据时发生错误</td></tr>';
+            }
         });
 }
 
+// 更新分页信息和排序状态
+function renderPager() {
+    var pages = Math.max(1, Math.ceil(stockTable.total / stockTable.pageSize));
+    var info = document.getElementById('pagerInfo');
+    if (!info) {
+        return;
+    }
+    info.textContent = '第' + stockTable.page + '/' + pages + '页，共' + stockTable.total + '条';
+    document.getElementById('pagerPrev').disabled = stockTable.page <= 1;
+    document.getElementById('pagerNext').disabled = stockTable.page >= pages;
+    document.getElementById('sortSelect').value = stockTable.sort;
+    
+    // 当前排序字段的表头显示为已排序，升序时箭头向上
+    document.querySelectorAll('th.sortable').forEach(function(header) {
+        header.classList.toggle('sorted', header.dataset.sort === stockTable.sort && stockTable.order === 'asc');
+    });
+}
+
+// 翻页
+function changePage(delta) {
+    loadStockPage(stockTable.page + delta);
+}
+
+// 排序：再次选择同一字段时切换降序和升序
+function sortStocks(sortKey) {
+    if (stockTable.sort === sortKey) {
+        stockTable.order = stockTable.order === 'desc' ? 'asc' : 'desc';
+    } else {
+        stockTable.sort = sortKey;
+        stockTable.order = 'desc';
+    }
+    loadStockPage(1);
+}
+
+// 题材筛选功能：在当前日期或搜索条件下筛选题材包含输入文字的股票
+function filterByPlate(plateValue) {
+    stockTable.query.plate = (plateValue || '').trim();
+    stockTable.query.latest = '';
+    loadStockPage(1, '没有找到匹配的题材数据');
+}
+
 // 为DOM加载完成后，为搜索框添加防抖处理
 document.addEventListener('DOMContentLoaded', function() {
     const plateFilter = document.getElementById('plateFilter');
@@ -1230,7 +1161,63 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 // 题材统计功能
+// 表格是某一天的完整涨停列表时（tbody的data-day为该日期），读取服务端写入数据时汇总的题材统计；
+// 其他筛选条件下使用查询第一页时返回的全部行的题材统计，都没有时按表格中的行统计
+var plateStatsKey = null;
+
 function updatePlateStats() {
+    var tableBody = document.getElementById('stockTableBody');
+    var day = tableBody ? tableBody.dataset.day : '';
+    
+    if (day) {
+        // 同一份统计只渲染一次（表格中价格等内容变化也会触发更新）
+        var dayKey = 'day:' + day;
+        if (plateStatsKey === dayKey) {
+            return;
+        }
+        plateStatsKey = dayKey;
+        fetch('/api/plate-heat?date=' + encodeURIComponent(day) + '&top=0')
+            .then(function(response) { return response.json(); })
+            .then(function(data) {
+                // 请求返回前表格已切换到其他数据时忽略结果
+                if (plateStatsKey !== dayKey) {
+                    return;
+                }
+                if (!data.plates || data.dates.length === 0 || data.dates[data.dates.length - 1] !== day) {
+                    throw new Error('没有' + day + '的题材统计');
+                }
+                renderPlateStats(data.plates.map(function(item) {
+                    return {
+                        plate: item.plate,
+                        count: item.count[0],
+                        title: '排名' + item.rank[0] + '，占当天' + item.share[0] + '%，连续' + item.streak[0] + '天'
+                    };
+                }));
+            })
+            .catch(function(error) {
+                console.error('获取题材统计失败，改为按表格统计:', error);
+                if (plateStatsKey === dayKey) {
+                    renderPlateStats(countPlatesFromTable());
+                }
+            });
+        return;
+    }
+    
+    if (stockTable.plateCounts) {
+        var queryKey = 'query:' + stockTable.serial;
+        if (plateStatsKey !== queryKey) {
+            plateStatsKey = queryKey;
+            renderPlateStats(stockTable.plateCounts);
+        }
+        return;
+    }
+    
+    plateStatsKey = null;
+    renderPlateStats(countPlatesFromTable());
+}
+
+// 按表格中的行统计题材数量
+function countPlatesFromTable() {
     // 统计结果对象
     var plateCounts = {};
     
@@ -1276,7 +1263,11 @@ function updatePlateStats() {
             return b.count - a.count;
         });
     
-    // 更新右侧统计表
+    return sortedPlates;
+}
+
+// 更新右侧统计表
+function renderPlateStats(sortedPlates) {
     var statsTableBody = document.getElementById('plateStatsBody');
     if (statsTableBody) {
         // 清空现有内容
@@ -1302,6 +1293,11 @@ function updatePlateStats() {
                 row.appendChild(plateCell);
                 row.appendChild(countCell);
                 
+                // 服务端统计包含排名、占比和连续上榜天数
+                if (item.title) {
+                    row.title = item.title;
+                }
+                
                 // 添加行到表格
                 statsTableBody.appendChild(row);
             });
@@ -1340,7 +1336,7 @@ function setupPlateStatsListener() {
     }
 }
 
-// 题材搜索功能
+// 题材搜索功能：搜索所有日期中题材包含输入文字的股票，每只股票只保留最新一天
 function searchPlate() {
     // 获取搜索框输入值
     const searchInput = document.getElementById('plateSearchInput');
@@ -1351,57 +1347,9 @@ function searchPlate() {
         return;
     }
     
-    // 调用后端API搜索所有日期的题材数据
-    fetch(`/filter-by-plate?plate=${encodeURIComponent(searchTerm)}`)
-        .then(response => response.json())
-        .then(data => {
-            const tbody = document.getElementById('stockTableBody');
-            tbody.innerHTML = '';
-            
-            if (data.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="10" class="no-data">没有找到匹配的题材数据</td></tr>';
-                return;
-            }
-            
-            // 渲染搜索结果到左侧表格
-            Array.prototype.forEach.call(data, function(stock) {
-                var row = document.createElement('tr');
-                var link = 'https://xuangutong.com.cn/stock/' + stock.code_part + '.' + stock.market.toUpperCase();
-                var codeClass = stock.code_part.startsWith('3') ? 'orange-code' : '';
-                var nameClass = stock.code_part.startsWith('688') ? 'stock-name-link blue-text' : (stock.code_part.startsWith('3') || stock.code_part.startsWith('68')) ? 'stock-name-link orange-text' : 'stock-name-link';
-                row.innerHTML = 
-                    '<td><a href="' + link + '" target="_blank" class="' + nameClass + '">' + stock.name + '</a></td>' +
-                    '<td><div class="time-chart" data-code="' + stock.code_part + '"></div></td>' +
-                    '<td class="price"></td>' +
-                    '<td class="change-percentage"></td>' +
-                    '<td class="' + codeClass + '">' + stock.code_part + '</td>' +
-                    '<td>' + stock.market + '</td>' +
-                    '<td>' + (stock.m_days_n_boards ? '<span class="days-boards-tag">' + stock.m_days_n_boards + '</span>' : stock.m_days_n_boards) + '</td>' +
-                    '<td>' + (stock.description ? stock.description.substring(0, 100) + (stock.description.length > 100 ? '...' : '') : '') + '</td>' +
-                    '<td>' + stock.plates + '</td>' +
-                    '<td>' + stock.date + '</td>';
-                tbody.appendChild(row);
-            });
-            
-            // 重置分时图状态并重新渲染
-            visibleStockCodes = {}; // 重置可见股票代码集合
-            timeChartInstances = {}; // 重置图表实例
-            setTimeout(function() {
-                renderVisibleCharts(); // 重新渲染可见区域内的分时图
-                fetchRealTimeStockData(); // 获取实时股票数据
-                // 更新题材统计
-                updatePlateStats();
-                // 重新绑定K线图事件
-                if (typeof initStockNameEvents === 'function') {
-                    initStockNameEvents();
-                }
-            }, 100);
-        })
-        .catch(function(error) {
-            console.error('搜索题材数据失败:', error);
-            const tbody = document.getElementById('stockTableBody');
-            tbody.innerHTML = '<tr><td colspan="10" class="no-data">搜索题材数据时发生错误</td></tr>';
-        });
+    document.getElementById('plateFilter').value = '';
+    stockTable.query = { date: '', keyword: '', plate: searchTerm, latest: '1' };
+    loadStockPage(1, '没有找到匹配的题材数据');
 }
 
 // 为搜索框添加回车键事件
@@ -1415,6 +1363,9 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // 初始化表格查询状态（第一页由服务端渲染）
+    initStockTable();
+    
     // 检查filterByDate函数，在其末尾添加更新统计的代码
     // 如果是通过API加载的数据，需要在数据加载完成后更新统计
     setupPlateStatsListener();
@@ -1,6 +1,9 @@
 // stock_detail.js - 股票详情页的JS功能
 
-// 获取实时股票数据
+// 实时行情推送连接
+let quoteEventSource = null;
+
+// 订阅实时股票数据（服务端交易时间内推送行情变化，替代带时间戳的轮询请求）
 function fetchRealTimeStockData() {
     const tbody = document.getElementById('stockHistoryTableBody');
     const rows = tbody.querySelectorAll('tr:not(:has(td[colspan]))');
@@ -9,65 +12,59 @@ function fetchRealTimeStockData() {
         return;
     }
     
-    // 收集股票代码并格式化
-    const code = '{{ stock_code }}';
+    // 生成secid：6开头的股票代码使用1.前缀，0或3开头的使用0.前缀
+    const code = window.STOCK_CODE || '';
     let market = '';
     if (code.startsWith('6')) {
-        market = 'SH';
+        market = '1';
     } else if (code.startsWith('0') || code.startsWith('3')) {
-        market = 'SZ';
+        market = '0';
     }
     
     if (!market) {
         return;
     }
     
-    const formattedCode = `${market}${code}`;
-    const stockCodes = [formattedCode]; // 只添加一次股票代码
-    
-    // 构建API URL（使用后端代理）
-    const apiUrl = `/api/realtime-stock-data?symbols=${stockCodes.join(',')}&_=${Date.now()}`;
+    const secid = `${market}.${code}`;
     
-    // 发送API请求获取实时数据
-    fetch(apiUrl)
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('网络响应错误');
+    if (quoteEventSource) {
+        quoteEventSource.close();
+    }
+    quoteEventSource = new EventSource(`/api/quote-stream?secids=${secid}`);
+    quoteEventSource.onmessage = event => {
+        const message = JSON.parse(event.data);
+        const stock = message && message.diff && message.diff.find(item => item.f12 === code);
+        if (!stock) {
+            return;
+        }
+        
+        // f2为最新价，f3为涨跌幅
+        const current = stock.f2;
+        const percent = typeof stock.f3 === 'number' ? stock.f3 : 0;
+        
+        // 确定颜色（红色上涨，绿色下跌，黑色不变）
+        const color = percent > 0 ? '#e33232' : (percent < 0 ? '#00a854' : '');
+        
+        // 将数据应用到所有行
+        rows.forEach(row => {
+            // 更新价格
+            const priceElement = row.querySelector('.price');
+            if (priceElement) {
+                priceElement.textContent = current || '-';
+                priceElement.style.color = color;
             }
-            return response.json();
-        })
-        .then(data => {
-            // 检查返回数据是否有效
-            if (data && data.data && data.data.length > 0) {
-                // 获取股票数据
-                const stock = data.data[0];
-                
-                // 确定颜色（红色上涨，绿色下跌，黑色不变）
-                const color = stock.percent > 0 ? '#e33232' : (stock.percent < 0 ? '#00a854' : '');
-                
-                // 将数据应用到所有行
-                rows.forEach(row => {
-                    // 更新价格
-                    const priceElement = row.querySelector('.price');
-                    if (priceElement) {
-                        priceElement.textContent = stock.current || '-';
-                        priceElement.style.color = color;
-                    }
-                    
-                    // 更新涨跌幅
-                    const changeElement = row.querySelector('.change-percentage');
-                    if (changeElement) {
-                        changeElement.textContent = (stock.percent || 0).toFixed(2) + '%';
-                        changeElement.style.color = color;
-                    }
-                });
+            
+            // 更新涨跌幅
+            const changeElement = row.querySelector('.change-percentage');
+            if (changeElement) {
+                changeElement.textContent = percent.toFixed(2) + '%';
+                changeElement.style.color = color;
             }
-        })
-        .catch(error => {
-            console.error('获取实时股票数据失败:', error);
-            console.error('API请求URL:', apiUrl);
-            console.error('股票代码:', formattedCode);
         });
+    };
+    quoteEventSource.onerror = () => {
+        console.error('实时行情推送连接中断，等待自动重连，股票代码:', secid);
+    };
 }
 
 // 显示大图分时图
@@ -131,7 +128,7 @@ function showFullChart(code) {
 
 // 绘制分时图
 function drawTimeSharingChart() {
-    const stockCode = '{{ stock_code }}';
+    const stockCode = window.STOCK_CODE || '';
     console.log('开始绘制分时图，股票代码:', stockCode);
     
     // 检查图表容器
@@ -153,7 +150,7 @@ function drawTimeSharingChart() {
     console.log('图表实例已初始化');
     
     // 获取分时数据
-    const apiUrl = `/api/time-sharing-data?code=${stockCode}`;
+    const apiUrl = `/api/time-sharing-data?code=${stockCode}&format=columnar`;
     console.log('请求分时数据，URL:', apiUrl);
     
     fetch(apiUrl)
@@ -176,36 +173,27 @@ function drawTimeSharingChart() {
                 throw new Error('数据格式不正确: 缺少data字段');
             }
             
-            if (!Array.isArray(data.data.trends)) {
-                throw new Error('数据格式不正确: trends不是数组');
+            if (!Array.isArray(data.data.times) || !Array.isArray(data.data.prices)) {
+                throw new Error('数据格式不正确: times或prices不是数组');
             }
             
-            if (data.data.trends.length === 0) {
+            if (data.data.times.length === 0) {
                 console.warn('分时数据为空');
                 return;
             }
             
-            const trends = data.data.trends;
+            const times = data.data.times;
+            const prices = data.data.prices;
             const preClose = parseFloat(data.data.preClose); // 前收盘价
             
-            console.log('trends数据长度:', trends.length);
+            console.log('分时数据长度:', times.length);
             console.log('前收盘价:', preClose);
-            console.log('第一条数据:', trends[0]);
-            console.log('最后一条数据:', trends[trends.length - 1]);
             
-            // 解析数据
-            const processedData = [];
-            for (let i = 0; i < trends.length; i++) {
-                const items = trends[i].split(',');
-                if (items.length >= 4) {
-                    const time = items[0];
-                    const price = parseFloat(items[1]);
-                    processedData.push({
-                        time: time,
-                        price: price
-                    });
-                }
-            }
+            // 服务端已按列解码，直接组合时间和价格
+            const processedData = times.map((time, i) => ({
+                time: time,
+                price: prices[i]
+            }));
             
             console.log('处理后的数据长度:', processedData.length);
             
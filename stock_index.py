@@ -0,0 +1,507 @@
+"""
+每日股票索引模块
+在数据写入时把每天的涨停列表整理到一张按(日期, 股票代码)索引的表中，几天几板解析为整数天数和板数，
+题材拆分到单独的成员表，并预先计算题材数量、题材热度和名称拼音等排序、搜索键，
+连板天梯和首页表格的排序、筛选、分页都通过索引查询完成，浏览器只保存当前一页
+"""
+import re
+import sqlite3
+import logging
+import threading
+import time
+import db
+import upstream
+import plate_stats
+import quote_stream
+
+# 与股票数据共用数据库文件
+INDEX_DB_PATH = db.DB_PATH
+
+# 连板天梯单次查询最多返回的交易日数
+MAX_LADDER_DAYS = 30
+
+# 几天几板的格式，如"3天2板"
+DAYS_BOARDS_PATTERN = re.compile(r'(\d+)天(\d+)板')
+
+# 题材热度统计最近多少个交易日（与db.sort_stocks_by_plates一致）
+POPULARITY_DAYS = 10
+
+# 表格查询的默认和最大每页行数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 表格查询的排序字段（change为实时涨跌幅，不在索引表中），{order}为升序或降序
+SORT_KEYS = {
+    'default': 'plate_count {order}, popularity {order}, date DESC, code',
+    'plate_count': 'plate_count {order}, popularity DESC, date DESC, code',
+    'popularity': 'popularity {order}, plate_count DESC, date DESC, code',
+    'boards': 'boards {order}, days, date DESC, code',
+    'date': 'date {order}, plate_count DESC, popularity DESC, code',
+    'change': None
+}
+
+# 按涨跌幅排序时行情的缓存时间（秒），与行情推送的轮询间隔一致
+QUOTE_CACHE_SECONDS = quote_stream.POLL_INTERVAL
+
+# 每次请求行情的最大股票数
+QUOTE_BATCH_SIZE = 200
+
+# 行情缓存：secid到(获取时间, 涨跌幅)的映射
+_quote_cache = {}
+_quote_lock = threading.Lock()
+
+# 每个进程第一次查询时补齐尚未索引的日期，之后由写入数据时的钩子保持最新
+_sync_state = {'done': db.SNAPSHOT_MODE, 'lock': threading.Lock()}
+
+
+def _connect():
+    """连接数据库并确保索引表结构存在"""
+    conn = sqlite3.connect(INDEX_DB_PATH, timeout=30)
+    # 索引表是可随时重建的派生数据，缺少排序键的旧结构直接删除，由sync重新索引
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(daily_stocks)")}
+    if columns and 'popularity' not in columns:
+        conn.execute("DROP TABLE daily_stocks")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS daily_stocks (
+        date TEXT NOT NULL,
+        code TEXT NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        plates TEXT,
+        m_days_n_boards TEXT,
+        days INTEGER NOT NULL,
+        boards INTEGER NOT NULL,
+        plate_count INTEGER NOT NULL,
+        popularity INTEGER NOT NULL DEFAULT 0,
+        name_pinyin TEXT,
+        name_abbr TEXT,
+        PRIMARY KEY (date, code)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_stocks_boards ON daily_stocks(date, boards, days)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_stocks_code ON daily_stocks(code, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_stocks_sort ON daily_stocks(plate_count, popularity, date)")
+    # 股票当天所属的题材，每个题材一行
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS daily_stock_plates (
+        date TEXT NOT NULL,
+        plate TEXT NOT NULL,
+        code TEXT NOT NULL,
+        PRIMARY KEY (date, plate, code)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_stock_plates_plate ON daily_stock_plates(plate, date)")
+    return conn
+
+
+def parse_days_boards(text):
+    """
+    解析几天几板
+
+    Returns:
+        (天数, 板数)，为空表示首板(1, 1)，无法解析时为(0, 0)
+    """
+    if not text:
+        return 1, 1
+    match = DAYS_BOARDS_PATTERN.search(text)
+    if not match:
+        return 0, 0
+    return int(match.group(1)), int(match.group(2))
+
+
+# 与db.sort_stocks_by_plates使用同一个题材拆分函数，题材数量和题材热度的口径一致
+split_plates = db.split_plates
+
+
+def _index_date(conn, date_str, stocks):
+    """把某一天（YYYYMMDD）的股票数据写入索引表（不含题材热度）"""
+    # 拼音库加载较慢，只在写入索引时导入
+    from pypinyin import lazy_pinyin, Style
+
+    rows = []
+    plate_rows = []
+    for stock in stocks:
+        days, boards = parse_days_boards(stock['m_days_n_boards'])
+        plates = split_plates(stock['plates'])
+        rows.append((
+            date_str, stock['code'], stock['name'], stock['description'], stock['plates'], stock['m_days_n_boards'],
+            days, boards, len(plates),
+            ''.join(lazy_pinyin(stock['name'])).lower(), ''.join(lazy_pinyin(stock['name'], style=Style.FIRST_LETTER)).lower()
+        ))
+        plate_rows.extend((date_str, plate, stock['code']) for plate in plates)
+
+    conn.execute("DELETE FROM daily_stocks WHERE date=?", (date_str,))
+    conn.execute("DELETE FROM daily_stock_plates WHERE date=?", (date_str,))
+    conn.executemany('''
+    INSERT OR REPLACE INTO daily_stocks
+    (date, code, name, description, plates, m_days_n_boards, days, boards, plate_count, name_pinyin, name_abbr)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.executemany("INSERT OR IGNORE INTO daily_stock_plates (date, plate, code) VALUES (?, ?, ?)", plate_rows)
+    return len(rows)
+
+
+def _update_popularity(conn, counts):
+    """按题材出现次数重新计算所有行的题材热度（所属题材出现次数之和）"""
+    popularity = {}
+    for date, code, plate in conn.execute("SELECT date, code, plate FROM daily_stock_plates"):
+        popularity[(date, code)] = popularity.get((date, code), 0) + counts.get(plate, 0)
+    conn.execute("UPDATE daily_stocks SET popularity=0")
+    conn.executemany("UPDATE daily_stocks SET popularity=? WHERE date=? AND code=?",
+                     [(value, date, code) for (date, code), value in popularity.items()])
+
+
+def refresh_date(date_str):
+    """重新索引某一天（YYYYMMDD）的股票数据，并更新所有行的题材热度（题材统计需要先更新）"""
+    # 在写入事务开始前读取股票数据和题材统计（写入事务进行中其他连接无法读取同一个数据库）
+    stocks = db.get_stock_data_by_date(date_str)
+    counts = plate_stats.recent_plate_counts(POPULARITY_DAYS)
+    conn = _connect()
+    try:
+        count = _index_date(conn, date_str, stocks)
+        _update_popularity(conn, counts)
+        conn.commit()
+    finally:
+        conn.close()
+    logging.info(f"成功索引{date_str}的{count}条股票数据")
+
+
+def sync():
+    """索引库中有数据但尚未索引的日期，每个进程只执行一次"""
+    with _sync_state['lock']:
+        if _sync_state['done']:
+            return
+        conn = _connect()
+        try:
+            done = {row[0] for row in conn.execute("SELECT DISTINCT date FROM daily_stocks")}
+        finally:
+            conn.close()
+        missing = {date_str: db.get_stock_data_by_date(date_str) for date_str in sorted(set(db.get_available_dates()) - done)}
+        # 题材热度依赖题材统计
+        counts = plate_stats.recent_plate_counts(POPULARITY_DAYS)
+
+        conn = _connect()
+        try:
+            for date_str, stocks in missing.items():
+                _index_date(conn, date_str, stocks)
+            if missing:
+                _update_popularity(conn, counts)
+                conn.commit()
+                logging.info(f"成功索引{len(missing)}个日期的股票数据")
+        finally:
+            conn.close()
+        _sync_state['done'] = True
+
+
+def latest_date():
+    """索引中最新的日期，没有数据时返回None"""
+    sync()
+    conn = _connect()
+    try:
+        return conn.execute("SELECT MAX(date) FROM daily_stocks").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _stock_item(row):
+    """daily_stocks的(code, name, m_days_n_boards, days, boards, plates)转换为天梯中的股票字典"""
+    code, name, m_days_n_boards, days, boards, plates = row
+    return {
+        'code': code,
+        'name': name,
+        'm_days_n_boards': m_days_n_boards,
+        'days': days,
+        'boards': boards,
+        'plates': plates
+    }
+
+
+def get_ladder(date_str=None, start=None, end=None, min_boards=1, plate=None):
+    """
+    查询连板天梯：每天的股票按板数分组，以及每个题材板数最高的龙头
+
+    Args:
+        date_str: 单日（YYYYMMDD），与start/end都为空时使用最新一天
+        start, end: 日期区间（YYYYMMDD），最多返回最近MAX_LADDER_DAYS个交易日
+        min_boards: 只返回板数不低于该值的股票
+        plate: 只返回属于该题材的股票
+
+    Returns:
+        list: 按日期降序的每天天梯，包含date、levels（按板数降序，每级包含boards和stocks）
+              和leaders（每个题材的股票数和龙头，按龙头板数降序）
+    """
+    sync()
+    conn = _connect()
+    try:
+        if date_str:
+            start = end = date_str
+        if not end:
+            end = conn.execute("SELECT MAX(date) FROM daily_stocks").fetchone()[0]
+        start = start or end
+        dates = [row[0] for row in conn.execute(
+            "SELECT DISTINCT date FROM daily_stocks WHERE date BETWEEN ? AND ? ORDER BY date DESC LIMIT ?",
+            (start, end, MAX_LADDER_DAYS)
+        )]
+
+        result = []
+        for date in dates:
+            # 按(date, boards, days)索引倒序读取：板数高的在前，同板数天数少的在前
+            if plate:
+                rows = conn.execute('''
+                SELECT s.code, s.name, s.m_days_n_boards, s.days, s.boards, s.plates
+                FROM daily_stock_plates p JOIN daily_stocks s ON s.date = p.date AND s.code = p.code
+                WHERE p.plate = ? AND p.date = ? AND s.boards >= ?
+                ORDER BY s.boards DESC, s.days, s.code
+                ''', (plate, date, min_boards))
+            else:
+                rows = conn.execute('''
+                SELECT code, name, m_days_n_boards, days, boards, plates FROM daily_stocks
+                WHERE date = ? AND boards >= ?
+                ORDER BY boards DESC, days, code
+                ''', (date, min_boards))
+            levels = []
+            for row in rows:
+                item = _stock_item(row)
+                if not levels or levels[-1]['boards'] != item['boards']:
+                    levels.append({'boards': item['boards'], 'stocks': []})
+                levels[-1]['stocks'].append(item)
+
+            # 每个题材第一行即为板数最高（同板数天数最少）的龙头
+            leaders = {}
+            for plate_name, count, code, name, days, boards in conn.execute('''
+            SELECT p.plate, COUNT(*) OVER (PARTITION BY p.plate), s.code, s.name, s.days, s.boards
+            FROM daily_stock_plates p JOIN daily_stocks s ON s.date = p.date AND s.code = p.code
+            WHERE p.date = ?
+            ORDER BY p.plate, s.boards DESC, s.days, s.code
+            ''', (date,)):
+                if plate_name not in leaders and (not plate or plate_name == plate):
+                    leaders[plate_name] = {'plate': plate_name, 'count': count, 'code': code, 'name': name,
+                                           'days': days, 'boards': boards}
+            result.append({
+                'date': date,
+                'levels': levels,
+                'leaders': sorted(leaders.values(), key=lambda x: (-x['boards'], -x['count'], x['plate']))
+            })
+    finally:
+        conn.close()
+    return result
+
+
+# 表格查询返回的列
+STOCK_COLUMNS = 'date, code, name, description, plates, m_days_n_boards, days, boards, plate_count, popularity'
+
+
+def _row_to_stock(row):
+    """STOCK_COLUMNS的查询行转换为与db模块相同格式的股票字典（另含天数、板数和排序键）"""
+    date, code, name, description, plates, m_days_n_boards, days, boards, plate_count, popularity = row
+    code_part, market = code.split('.', 1) if '.' in code else (code, '')
+    return {
+        'code': code,
+        'code_part': code_part,
+        'market': market,
+        'name': name,
+        'description': description,
+        'plates': plates,
+        'm_days_n_boards': m_days_n_boards,
+        'date': date,
+        'days': days,
+        'boards': boards,
+        'plate_count': plate_count,
+        'popularity': popularity
+    }
+
+
+def load_stocks(conn, keys):
+    """按(日期, 股票代码)列表一次查询读取多行股票，按keys的顺序返回股票字典列表
+
+    键列表作为VALUES表与daily_stocks连接，每个键按主键查找（(date, code) IN (VALUES ...)会扫描全表）
+    """
+    if not keys:
+        return []
+    values = ', '.join(['(?, ?)'] * len(keys))
+    rows = conn.execute(
+        f"SELECT {STOCK_COLUMNS} FROM (VALUES {values}) AS k "
+        f"JOIN daily_stocks ON daily_stocks.date = k.column1 AND daily_stocks.code = k.column2",
+        [value for key in keys for value in key]
+    ).fetchall()
+    by_key = {(row[0], row[1]): row for row in rows}
+    return [_row_to_stock(by_key[key]) for key in keys if key in by_key]
+
+
+def get_change_percentages(codes):
+    """
+    获取一组股票的实时涨跌幅，QUOTE_CACHE_SECONDS内重复查询使用缓存
+
+    Returns:
+        dict: 股票代码到涨跌幅的映射，停牌、不支持的代码或获取失败时为None
+    """
+    secids = {}
+    for code in codes:
+        try:
+            secids[code] = upstream.get_secid(code)
+        except ValueError:
+            secids[code] = None
+
+    now = time.time()
+    with _quote_lock:
+        stale = sorted({secid for secid in secids.values()
+                        if secid and now - _quote_cache.get(secid, (0, None))[0] > QUOTE_CACHE_SECONDS})
+    for i in range(0, len(stale), QUOTE_BATCH_SIZE):
+        batch = stale[i:i + QUOTE_BATCH_SIZE]
+        try:
+            quotes = quote_stream.fetch_quotes(batch)
+        except Exception as e:
+            # 获取失败的股票不写入缓存，下次查询重试
+            logging.warning(f"获取{len(batch)}只股票的行情失败: {e}")
+            continue
+        with _quote_lock:
+            for secid in batch:
+                value = quotes.get(secid.split('.', 1)[1], {}).get('f3')
+                _quote_cache[secid] = (now, value if isinstance(value, (int, float)) else None)
+
+    with _quote_lock:
+        return {code: _quote_cache.get(secid, (0, None))[1] if secid else None for code, secid in secids.items()}
+
+
+def query_stocks(date_str=None, start=None, end=None, plate=None, keyword=None, min_boards=None, latest_only=False,
+                 sort='default', order='desc', page=1, page_size=DEFAULT_PAGE_SIZE, with_plate_counts=False):
+    """
+    分页查询股票数据，筛选和排序都在索引表上完成
+
+    Args:
+        date_str: 单日（YYYYMMDD），与start/end都为空时查询所有日期
+        start, end: 日期区间（YYYYMMDD）
+        plate: 题材包含该文字
+        keyword: 名称、代码、解读或题材包含该文字，都不匹配时按名称的拼音和拼音首字母匹配（与搜索页一致）
+        min_boards: 板数不低于该值
+        latest_only: 每只股票只保留最新日期的一行（与db.search_stocks_by_plate一致）
+        sort: SORT_KEYS中的排序字段，default为题材数量、题材热度（与db.sort_stocks_by_plates一致）
+        order: desc或asc
+        page: 页码，从1开始
+        page_size: 每页行数，不超过MAX_PAGE_SIZE
+        with_plate_counts: 是否同时返回符合条件的全部行中每个题材的股票数
+
+    Returns:
+        dict: total为符合条件的总行数，page和page_size为实际使用的分页参数，data为当前页的股票字典列表，
+              with_plate_counts时plate_counts为按数量降序的plate、count列表
+
+    Raises:
+        ValueError: 不支持的排序字段
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f'不支持的排序字段: {sort}')
+    page = max(1, page)
+    page_size = max(1, min(MAX_PAGE_SIZE, page_size))
+    direction = 'ASC' if order == 'asc' else 'DESC'
+    sync()
+
+    conditions = []
+    params = []
+    if date_str:
+        start = end = date_str
+    if start:
+        conditions.append('date >= ?')
+        params.append(start)
+    if end:
+        conditions.append('date <= ?')
+        params.append(end)
+    if plate:
+        conditions.append('plates LIKE ?')
+        params.append(f'%{plate}%')
+    if min_boards:
+        conditions.append('boards >= ?')
+        params.append(min_boards)
+
+    conn = _connect()
+    try:
+        if keyword:
+            like = f'%{keyword}%'
+            keyword_condition = '(name LIKE ? OR code LIKE ? OR description LIKE ? OR plates LIKE ?)'
+            keyword_params = [like] * 4
+            where = ' AND '.join(conditions + [keyword_condition])
+            if not conn.execute(f"SELECT 1 FROM daily_stocks WHERE {where} LIMIT 1", params + keyword_params).fetchone():
+                keyword_condition = '(name_pinyin LIKE ? OR name_abbr LIKE ?)'
+                keyword_params = [like.lower()] * 2
+            conditions.append(keyword_condition)
+            params.extend(keyword_params)
+
+        where = ' AND '.join(conditions) or '1'
+        if latest_only:
+            where = f"{where} AND (code, date) IN (SELECT code, MAX(date) FROM daily_stocks WHERE {where} GROUP BY code)"
+            params = params * 2
+
+        total = conn.execute(f"SELECT COUNT(*) FROM daily_stocks WHERE {where}", params).fetchone()[0]
+        offset = (page - 1) * page_size
+        if sort == 'change':
+            # 实时涨跌幅不在索引表中：取出符合条件的全部(日期, 代码)排序后只读取当前页，没有涨跌幅的排在最后
+            keys = conn.execute(f"SELECT date, code FROM daily_stocks WHERE {where}", params).fetchall()
+            changes = get_change_percentages({code for _, code in keys})
+            quoted = sorted(((changes[code], date, code) for date, code in keys if changes[code] is not None),
+                            reverse=direction == 'DESC')
+            unquoted = sorted(((None, date, code) for date, code in keys if changes[code] is None), reverse=True)
+            data = load_stocks(conn, [(date, code) for _, date, code in (quoted + unquoted)[offset:offset + page_size]])
+        else:
+            data = [_row_to_stock(row) for row in conn.execute(f'''
+            SELECT {STOCK_COLUMNS} FROM daily_stocks WHERE {where}
+            ORDER BY {SORT_KEYS[sort].format(order=direction)} LIMIT ? OFFSET ?
+            ''', params + [page_size, offset])]
+
+        result = {
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'data': data
+        }
+        if with_plate_counts:
+            result['plate_counts'] = [{'plate': plate_name, 'count': count} for plate_name, count in conn.execute(f'''
+            SELECT plate, COUNT(*) FROM daily_stock_plates
+            WHERE (date, code) IN (SELECT date, code FROM daily_stocks WHERE {where})
+            GROUP BY plate ORDER BY COUNT(*) DESC, plate
+            ''', params)]
+    finally:
+        conn.close()
+    return result
+
+
+def iter_range(start, end=None, code=None, plate=None, unique=False, order='desc'):
+    """
+    按日期顺序逐行读取一段日期内的股票，整个区间只查询一次、排序一次
+
+    Args:
+        start、end: 日期区间（YYYYMMDD），end默认最新一天
+        code: 股票代码，可以带或不带市场后缀（300191或300191.SZ）
+        plate: 题材包含该文字
+        unique: 每只股票只保留区间内最新的一行
+        order: 日期顺序，desc或asc；同一天内按题材数量、题材热度降序（与db.sort_stocks_by_plates一致）
+
+    Yields:
+        与query_stocks相同格式的股票字典
+    """
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"不支持的排序方向: {order}")
+    sync()
+    conditions = ['date BETWEEN ? AND ?']
+    params = [start, end or '99999999']
+    if code:
+        conditions.append('(code = ? OR code LIKE ?)')
+        params += [code, f'{code}.%']
+    if plate:
+        conditions.append('plates LIKE ?')
+        params.append(f'%{plate}%')
+    where = ' AND '.join(conditions)
+    if unique:
+        source = f'''(SELECT *, ROW_NUMBER() OVER (PARTITION BY code ORDER BY date DESC) AS occurrence
+                      FROM daily_stocks WHERE {where}) WHERE occurrence = 1'''
+    else:
+        source = f'daily_stocks WHERE {where}'
+
+    conn = _connect()
+    try:
+        cursor = conn.execute(f'''
+        SELECT {STOCK_COLUMNS} FROM {source}
+        ORDER BY date {order.upper()}, plate_count DESC, popularity DESC, code
+        ''', params)
+        for row in cursor:
+            yield _row_to_stock(row)
+    finally:
+        conn.close()
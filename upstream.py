@@ -0,0 +1,370 @@
+"""
+上游请求公共模块
+提供上游服务地址配置、股票代码到secid的转换、同参数上游请求合并（single-flight）以及分时数据的获取与缓存，
+供各代理接口共用
+"""
+import asyncio
+import os
+import threading
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+def _base_url(env_name, default):
+    """读取上游服务地址：优先使用单独的环境变量，其次是统一的UPSTREAM_BASE_URL（指向本地替身服务器mock_upstream.py）"""
+    return (os.environ.get(env_name) or os.environ.get('UPSTREAM_BASE_URL') or default).rstrip('/')
+
+
+# 上游服务地址，可通过环境变量修改，用于离线压测
+EASTMONEY_PUSH2_BASE = _base_url('EASTMONEY_PUSH2_BASE', 'https://push2.eastmoney.com')
+EASTMONEY_PUSH2HIS_BASE = _base_url('EASTMONEY_PUSH2HIS_BASE', 'https://push2his.eastmoney.com')
+XUANGUBAO_BASE = _base_url('XUANGUBAO_BASE', 'https://flash-api.xuangubao.com.cn')
+XUEQIU_BASE = _base_url('XUEQIU_BASE', 'https://stock.xueqiu.com')
+
+# 东方财富分时数据API
+TIME_SHARING_API_URL = f"{EASTMONEY_PUSH2_BASE}/api/qt/stock/trends2/get"
+
+# 东方财富批量行情API
+QUOTE_API_URL = f"{EASTMONEY_PUSH2_BASE}/api/qt/ulist.np/get"
+
+# 东方财富K线API
+KLINE_API_URL = f"{EASTMONEY_PUSH2HIS_BASE}/api/qt/stock/kline/get"
+
+# 选股通涨停股票API
+SURGE_STOCK_API_URL = f"{XUANGUBAO_BASE}/api/surge_stock/stocks"
+
+# 雪球实时行情API
+XUEQIU_QUOTE_API_URL = f"{XUEQIU_BASE}/v5/stock/realtime/quotec.json"
+
+# 批量获取分时数据时的最大并发上游请求数
+TIME_SHARING_MAX_WORKERS = 8
+
+# 分时数据请求头，模拟浏览器请求
+TIME_SHARING_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Referer': 'https://quote.eastmoney.com/'
+}
+
+# 分时数据内存缓存
+time_sharing_cache = {
+    'data': {},  # secid -> (timestamp, 原始响应, 解码后的按列数据)
+    'cache_duration': 30000  # 缓存30秒
+}
+
+
+def get_secid(code):
+    """根据股票代码生成东方财富secid参数（6开头为沪市1，0或3开头为深市0）
+
+    Args:
+        code: 股票代码，支持600000、600000.SH、SZ.000001等格式
+
+    Returns:
+        str: secid，如1.600000
+
+    Raises:
+        ValueError: 不支持的股票代码前缀
+    """
+    code = code.strip()
+    if '.' in code:
+        # 去除交易所前缀或后缀，保留数字部分
+        code = next((part for part in code.split('.') if part.isdigit()), code)
+
+    if code.startswith('6'):
+        market = '1'  # 沪市
+    elif code.startswith('0') or code.startswith('3'):
+        market = '0'  # 深市
+    else:
+        raise ValueError(f"不支持的股票代码前缀: {code[:1]}")
+    return f"{market}.{code}"
+
+
+class _InFlightCall:
+    """一次正在进行中的上游调用"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同参数请求合并器
+
+    相同key的并发调用只会真正执行一次上游请求，
+    其余调用等待该请求完成后共享同一个解析结果（或同一个异常）。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        # 统计信息：leaders为实际发出的上游请求数，coalesced为被合并的请求数
+        self.stats = {
+            'leaders': 0,
+            'coalesced': 0
+        }
+
+    def do(self, key, fn):
+        """执行fn并返回结果，相同key正在执行时直接等待其结果
+
+        Args:
+            key: 请求参数组成的可哈希键
+            fn: 无参数的上游请求函数，返回解析后的结果
+
+        Returns:
+            fn的返回值（并发调用方共享同一对象，调用方不应修改）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self.stats['leaders'] += 1
+                is_leader = True
+            else:
+                self.stats['coalesced'] += 1
+                is_leader = False
+
+        if not is_leader:
+            logging.debug(f"[{self.name}] 合并相同的上游请求: {key}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def get_stats(self):
+        """获取合并统计信息"""
+        with self._lock:
+            return {
+                'leaders': self.stats['leaders'],
+                'coalesced': self.stats['coalesced'],
+                'in_flight': len(self._calls)
+            }
+
+
+class _LeaderCancelled(Exception):
+    """异步请求合并器中发起请求的协程被取消，等待方需要重新发起请求"""
+
+
+class AsyncSingleFlight:
+    """协程版的同参数请求合并器，供异步网关在事件循环内使用
+
+    相同key的并发协程只会真正等待一次上游请求，其余协程共享同一个结果（或同一个异常）。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self.stats = {
+            'leaders': 0,
+            'coalesced': 0
+        }
+
+    async def do(self, key, fn):
+        """执行协程函数fn并返回结果，相同key正在执行时直接等待其结果
+
+        Args:
+            key: 请求参数组成的可哈希键
+            fn: 无参数的协程函数，返回解析后的结果
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            logging.debug(f"[{self.name}] 合并相同的上游请求: {key}")
+            try:
+                # shield防止某个等待方被取消时连带取消共享的请求
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # 发起请求的协程被取消（如客户端断开），等待方没有被取消：第一个等待方重新发起请求，其余的合并到它
+                return await self.do(key, fn)
+
+        self.stats['leaders'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # 取消只属于发起请求的协程，不传递给等待方
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待方时避免出现"异常未被获取"的警告
+            future.exception()
+            raise
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def get_stats(self):
+        """获取合并统计信息"""
+        return {
+            'leaders': self.stats['leaders'],
+            'coalesced': self.stats['coalesced'],
+            'in_flight': len(self._calls)
+        }
+
+
+# 各上游接口的请求合并器
+time_sharing_flight = SingleFlight('time-sharing')
+kline_flight = SingleFlight('kline')
+
+# 异步网关使用的请求合并器
+async_time_sharing_flight = AsyncSingleFlight('time-sharing-async')
+async_kline_flight = AsyncSingleFlight('kline-async')
+
+
+def time_sharing_params(secid):
+    """构建东方财富分时数据API的请求参数"""
+    return {
+        'fields1': 'f1,f2,f8,f10',
+        'fields2': 'f51,f53,f56,f58',
+        'secid': secid,
+        'ndays': '1',
+        'iscr': '0',
+        'iscca': '0'
+    }
+
+
+def _request_time_sharing(secid):
+    """向东方财富请求一只股票的当日分时数据"""
+    response = requests.get(TIME_SHARING_API_URL, headers=TIME_SHARING_HEADERS, params=time_sharing_params(secid), timeout=10)
+    response.raise_for_status()  # 抛出HTTP错误
+    return response.json()
+
+
+def get_cached_time_sharing(secid, columnar=False):
+    """获取未过期的分时数据缓存，没有时返回None
+
+    Args:
+        columnar: 为True时返回解码后的按列数据，否则返回原始响应
+    """
+    cached = time_sharing_cache['data'].get(secid)
+    if cached and time.time() * 1000 - cached[0] < time_sharing_cache['cache_duration']:
+        return cached[2] if columnar else cached[1]
+    return None
+
+
+def cache_time_sharing(secid, result):
+    """写入分时数据缓存，原始响应只在写入时解码一次，应在single-flight的leader中调用
+
+    Returns:
+        缓存条目(timestamp, 原始响应, 解码后的按列数据)，用time_sharing_entry_data取出数据
+    """
+    entry = (time.time() * 1000, result, compact_time_sharing(result))
+    time_sharing_cache['data'][secid] = entry
+    return entry
+
+
+def time_sharing_entry_data(entry, columnar=False):
+    """从缓存条目中取出与get_cached_time_sharing相同格式的数据"""
+    return entry[2] if columnar else entry[1]
+
+
+def fetch_time_sharing(secid, use_cache=True, columnar=False):
+    """获取分时数据，优先使用内存缓存，相同secid的并发请求只请求一次上游
+
+    请求、解码和写入缓存都在leader中完成，被合并的请求直接共享同一个缓存条目
+
+    Args:
+        columnar: 为True时返回解码后的按列数据（数据无效时为None），否则返回东方财富原始响应
+    """
+    if use_cache:
+        cached = get_cached_time_sharing(secid, columnar)
+        if cached is not None:
+            return cached
+
+    entry = time_sharing_flight.do(secid, lambda: cache_time_sharing(secid, _request_time_sharing(secid)))
+    return time_sharing_entry_data(entry, columnar)
+
+
+def compact_time_sharing(result):
+    """把分时数据原始响应转换为紧凑的按列数组
+
+    Returns:
+        dict: preClose和times/prices/volumes/avg_prices数组，数据无效时返回None
+    """
+    data = result.get('data') if result else None
+    if not data or not isinstance(data.get('trends'), list):
+        return None
+
+    times, prices, volumes, avg_prices = [], [], [], []
+    for trend in data['trends']:
+        # 字段顺序：f51时间,f53价格,f56成交量,f58均价
+        parts = trend.split(',')
+        if len(parts) < 4:
+            continue
+        times.append(parts[0])
+        prices.append(float(parts[1]))
+        volumes.append(float(parts[2]))
+        avg_prices.append(float(parts[3]))
+
+    return {
+        'preClose': data.get('preClose'),
+        'times': times,
+        'prices': prices,
+        'volumes': volumes,
+        'avg_prices': avg_prices
+    }
+
+
+def fetch_time_sharing_batch(codes):
+    """批量获取多只股票的紧凑分时数据
+
+    已缓存的股票直接从内存返回，缺失的以有限并发向上游请求
+
+    Returns:
+        dict: 股票代码到紧凑分时数据（失败时为包含error的字典）的映射
+    """
+    results = {}
+    secids = {}
+    for code in codes:
+        try:
+            secid = get_secid(code)
+        except ValueError as e:
+            results[code] = {'error': str(e)}
+            continue
+
+        cached = get_cached_time_sharing(secid, columnar=True)
+        if cached is not None:
+            results[code] = cached
+        else:
+            secids[code] = secid
+
+    def fetch_one(code):
+        try:
+            compact = fetch_time_sharing(secids[code], columnar=True)
+            return code, compact if compact else {'error': '分时数据为空'}
+        except Exception as e:
+            logging.warning(f"获取{code}的分时数据失败: {e}")
+            return code, {'error': f'请求失败: {str(e)}'}
+
+    if secids:
+        with ThreadPoolExecutor(max_workers=min(TIME_SHARING_MAX_WORKERS, len(secids))) as executor:
+            for code, compact in executor.map(fetch_one, secids):
+                results[code] = compact
+    return results
+
+
+def get_single_flight_stats():
+    """获取所有请求合并器的统计信息"""
+    return {
+        flight.name: flight.get_stats()
+        for flight in (time_sharing_flight, kline_flight, async_time_sharing_flight, async_kline_flight)
+    }